@@ -1,1842 +1,2355 @@
-#!/usr/bin/env python3
-
-"""
- *****************************************
-	Flask Script
- *****************************************
-
- Description: WebUI for the project.  
-
- *****************************************
-"""
-
-"""
-Imports
-"""
-import os
-import threading
-import uuid
-import re
-import subprocess
-import json
-import shutil
-import signal
-import platform
-
-from flask import Flask, request, render_template, make_response, redirect, jsonify, abort, send_from_directory, Response, send_file
-from common import *
-from exif.exif import *
-from typing import Dict
-from datetime import datetime, timezone
-import time
-
-class ProcessRunningError(Exception):
-	"""Raised when attempting to start a script while another is running"""
-	pass
-
-"""
-Globals
-"""
-app = Flask(__name__)
-settings = read_settings(init=True)
-folder_status = read_folder_status(originals_path=settings['folders']['originals'])
-import_data = []
-
-IMPORT_FOLDER = settings['folders']['import']
-EXPORT_FOLDER = settings['folders']['export']
-
-# Track background processes
-class ProcessTracker:
-	def __init__(self):
-		self._processes = {}  # Dictionary of process_id -> process object
-		self._lock = threading.Lock()
-		self._active_scripts = {}  # Dictionary to track scripts by type: "preprocess" or "postprocess"
-		self._log_dir = 'logs/process_logs'
-		self._max_log_size = 50 * 1024 * 1024  # 50MB max size per log file
-		self._max_backups = 10  # Keep up to 10 backup log files
-		# Create log directory if it doesn't exist
-		try:
-			os.makedirs(self._log_dir, exist_ok=True)
-			if 'logger' in globals():
-				logger.info(f"Process log directory: {self._log_dir}")
-		except Exception as e:
-			if 'logger' in globals():
-				logger.error(f"Failed to create log directory {self._log_dir}: {e}")
-			# Try to create it anyway if it doesn't exist
-			if not os.path.exists(self._log_dir):
-				raise
-	
-	def _rotate_log_if_needed(self, log_file):
-		"""Rotate log file if it exceeds max size"""
-		try:
-			if os.path.exists(log_file):
-				file_size = os.path.getsize(log_file)
-				if file_size > self._max_log_size:
-					# Rotate existing backups
-					for i in range(self._max_backups - 1, 0, -1):
-						backup_file = f"{log_file}.{i}"
-						next_backup_file = f"{log_file}.{i+1}"
-						if os.path.exists(backup_file):
-							if os.path.exists(next_backup_file):
-								os.remove(next_backup_file)
-							os.rename(backup_file, next_backup_file)
-					
-					# Rename current log to .1
-					backup_file = f"{log_file}.1"
-					if os.path.exists(backup_file):
-						os.remove(backup_file)
-					os.rename(log_file, backup_file)
-					
-					if 'logger' in globals():
-						logger.info(f"Rotated log file {log_file} (was {file_size} bytes)")
-		except Exception as e:
-			if 'logger' in globals():
-				logger.warning(f"Error rotating log file {log_file}: {e}")
-		
-	def add_process(self, process, script_type=None, log_file=None):
-		with self._lock:
-			# Rotate log file if needed before adding new process
-			if log_file:
-				self._rotate_log_if_needed(log_file)
-			
-			process_id = str(uuid.uuid4())
-			self._processes[process_id] = {
-				"process": process,
-				"pid": process.pid if hasattr(process, "pid") else None,
-				"start_time": datetime.now(),
-				"type": script_type,
-				"log_file": log_file,
-				"status": "running",
-				"return_code": None
-			}
-			
-			# If this is a pre or post processing script, track it specifically
-			if script_type in ["preprocess", "postprocess"]:
-				self._active_scripts[script_type] = process_id
-				
-			logger.info(f"Added new process {process.pid} with ID {process_id} - Total processes: {len(self._processes)}")
-			return process_id
-			
-	def remove_process(self, process_id):
-		with self._lock:
-			if process_id in self._processes:
-				process_info = self._processes[process_id]
-				# Remove from active scripts if it was one
-				for script_type, active_id in list(self._active_scripts.items()):
-					if active_id == process_id:
-						del self._active_scripts[script_type]
-						
-				pid = process_info["pid"] if process_info["pid"] else "unknown"
-				del self._processes[process_id]
-				logger.info(f"Removed process {pid} with ID {process_id} - Total processes: {len(self._processes)}")
-				return True
-			return False
-
-	def get_process_id_by_pid(self, pid):
-		"""Get internal process ID from OS process ID"""
-		with self._lock:
-			for process_id, process_info in self._processes.items():
-				if process_info["pid"] == pid:
-					return process_id
-			return None
-	
-	def get_process_info(self, process_id):
-		"""Get detailed information about a process"""
-		with self._lock:
-			if process_id in self._processes:
-				process_info = self._processes[process_id].copy()
-				# Don't return the actual process object
-				if "process" in process_info:
-					del process_info["process"]
-				return process_info
-			return None
-	
-	def terminate_process(self, script_type):
-		"""Terminate a running process by script type (preprocess or postprocess)"""
-		import signal
-		import platform
-		with self._lock:
-			if script_type not in self._active_scripts:
-				logger.warning(f"No active {script_type} process to terminate")
-				return False, f"No active {script_type} process found"
-			
-			process_id = self._active_scripts[script_type]
-			process_info = self._processes.get(process_id)
-			
-			if not process_info:
-				logger.warning(f"Process info not found for {script_type} with ID {process_id}")
-				del self._active_scripts[script_type]
-				return False, "Process info not found"
-			
-			process = process_info["process"]
-			pid = process_info["pid"]
-			
-			try:
-				logger.info(f"Attempting to terminate {script_type} process with PID {pid}")
-				
-				# Check if process is still running
-				if process.poll() is not None:
-					logger.info(f"Process {pid} is not running (already terminated)")
-					# Update status
-					self._processes[process_id]["status"] = "completed"
-					self._processes[process_id]["return_code"] = process.poll()
-					del self._active_scripts[script_type]
-					return True, f"Process {pid} already terminated"
-				
-				# Since the process was started with start_new_session=True, it's in its own process group
-				# We need to kill the entire process group to ensure all child processes are killed
-				
-				if platform.system() == "Windows":
-					# On Windows, use TASKKILL to kill the process tree
-					logger.info(f"Terminating process tree on Windows for PID {pid}")
-					os.system(f"taskkill /PID {pid} /T /F")
-					process.wait(timeout=5)
-				else:
-					# On Unix/Linux, kill the entire process group
-					try:
-						# The process was started with start_new_session=True, so it's the session leader
-						# We can send a signal to the entire process group using -pid
-						logger.info(f"Sending SIGTERM to process group {pid}")
-						os.killpg(os.getpgid(pid), signal.SIGTERM)
-						
-						# Wait up to 3 seconds for graceful shutdown
-						time.sleep(0.1)
-						start_time = time.time()
-						while process.poll() is None and time.time() - start_time < 3:
-							time.sleep(0.1)
-						
-						# Check if process is still running
-						if process.poll() is None:
-							logger.warning(f"Process group {pid} did not terminate gracefully, sending SIGKILL")
-							os.killpg(os.getpgid(pid), signal.SIGKILL)
-							time.sleep(0.2)
-						
-						process.poll()  # Update return code
-						logger.info(f"Process group {pid} terminated")
-					except ProcessLookupError:
-						# Process group already terminated
-						logger.info(f"Process group {pid} already terminated")
-						process.poll()
-					except Exception as e:
-						logger.warning(f"Error killing process group {pid}: {e}, trying direct kill")
-						# Fallback: try to kill just the process
-						try:
-							process.terminate()
-							time.sleep(0.5)
-							if process.poll() is None:
-								process.kill()
-							process.wait(timeout=2)
-						except Exception as e2:
-							logger.error(f"Failed to kill process {pid}: {e2}")
-				
-				# Update process status
-				self._processes[process_id]["status"] = "cancelled"
-				self._processes[process_id]["return_code"] = -1
-				
-				# Remove from active scripts
-				del self._active_scripts[script_type]
-				
-				logger.info(f"Successfully terminated {script_type} process (PID: {pid}, ID: {process_id})")
-				return True, f"Process {pid} terminated successfully"
-				
-			except Exception as e:
-				logger.error(f"Error terminating process {pid}: {e}", exc_info=True)
-				return False, f"Error terminating process: {str(e)}"
-
-	def _cleanup_finished_processes(self):
-		"""Helper method to mark finished processes and remove them from active tracking
-		NOTE: This should only be called while holding self._lock"""
-		finished_ids = []
-		for process_id, process_info in self._processes.items():
-			process = process_info["process"]
-			try:
-				if hasattr(process, "poll") and process.poll() is not None:  # Process has finished
-					# Update status but keep in tracker for frontend to see completion
-					self._processes[process_id]["status"] = "completed"
-					self._processes[process_id]["return_code"] = process.poll()
-					finished_ids.append(process_id)
-					logger.info(f"Found finished process {process_info['pid']} with ID {process_id} - Return code: {process.poll()}")
-			except Exception as e:
-				logger.error(f"Error checking process {process_info['pid']} with ID {process_id}: {e}")
-				self._processes[process_id]["status"] = "error"
-				finished_ids.append(process_id)  # Mark problematic processes as error
-		
-		# Remove from active scripts tracking, keep process info for frontend
-		for process_id in finished_ids:
-			process_info = self._processes[process_id]
-			# Remove from active scripts if it was one
-			for script_type, active_id in list(self._active_scripts.items()):
-				if active_id == process_id:
-					del self._active_scripts[script_type]
-					pid = process_info["pid"] if process_info["pid"] else "unknown"
-					logger.info(f"Removed {script_type} script from active tracking - PID: {pid}, ID: {process_id}")
-				
-	def has_running_processes(self, script_type=None):
-		with self._lock:
-			# Clean up any finished processes first
-			self._cleanup_finished_processes()
-			
-			# If script_type specified, only check that type
-			if script_type:
-				return script_type in self._active_scripts
-				
-			# Check if any processes are still running (status == "running")
-			return any(p["status"] == "running" for p in self._processes.values())
-
-	def get_active_process_id(self, script_type):
-		"""Return the active process_id for a given script type, or None"""
-		with self._lock:
-			# Clean up any finished processes first
-			self._cleanup_finished_processes()
-			return self._active_scripts.get(script_type)
-	
-	def cleanup_old_logs(self):
-		"""Remove old rotated log files older than 30 days"""
-		import glob
-		from time import time
-		
-		max_age_seconds = 30 * 24 * 60 * 60  # 30 days in seconds
-		current_time = time()
-		
-		try:
-			# Find all log files (including rotated ones)
-			log_pattern = os.path.join(self._log_dir, '*.log*')
-			for log_file in glob.glob(log_pattern):
-				# Skip current logs (those without a number suffix)
-				if log_file.endswith('.log'):
-					continue
-				
-				# Check if file is old enough to delete
-				file_age = current_time - os.path.getmtime(log_file)
-				if file_age > max_age_seconds:
-					try:
-						os.remove(log_file)
-						if 'logger' in globals():
-							logger.info(f"Deleted old log file: {log_file}")
-					except Exception as e:
-						if 'logger' in globals():
-							logger.warning(f"Could not delete log file {log_file}: {e}")
-		except Exception as e:
-			if 'logger' in globals():
-				logger.warning(f"Error during log cleanup: {e}")
-			
-	def get_status(self):
-		with self._lock:
-			# Clean up any finished processes first
-			self._cleanup_finished_processes()
-			
-			# Count only processes that are still running (not completed or error)
-			running_count = sum(1 for p in self._processes.values() if p["status"] == "running")
-			
-			# Get counts for different script types
-			status = {
-				"running_processes": running_count,
-				"preprocess_running": "preprocess" in self._active_scripts,
-				"postprocess_running": "postprocess" in self._active_scripts,
-				"active_pids": [],
-				"timestamp": datetime.now().isoformat()
-			}
-			
-			# Add active PIDs for detailed info (only running processes)
-			for process_id, process_info in self._processes.items():
-				if process_info["status"] == "running" and process_info["pid"]:
-					status["active_pids"].append({
-						"pid": process_info["pid"],
-						"type": process_info["type"],
-						"running_time": (datetime.now() - process_info["start_time"]).total_seconds()
-					})
-			
-			# Log status if there are running processes
-			if running_count > 0:
-				logger.info(f"Process status check:")
-				logger.info(f"- Running processes: {running_count}")
-				logger.info(f"- Active scripts: {list(self._active_scripts.keys())}")
-				logger.info(f"- Active PIDs: {[p['pid'] for p in status['active_pids']]}")
-			
-			return status
-
-process_tracker = ProcessTracker()
-
-# Thread-safe progress tracking
-class ProgressTracker:
-	def __init__(self):
-		self._tasks: Dict[str, dict] = {}
-		self._lock = threading.Lock()
-
-	def flush_tasks(self) -> None:
-		with self._lock:
-			self._tasks = {}
-
-	def create_task(self, task_id: str) -> None:
-		with self._lock:
-			self._tasks[task_id] = {
-				'progress': 0,
-				'status': 'running',
-				'total_files': 0,
-				'processed_files': 0,
-				'data': {}
-			}
-
-	def update_progress(self, task_id: str, progress: float, 
-						processed_files: int, total_files: int) -> bool:
-		with self._lock:
-			if task_id in self._tasks:
-				self._tasks[task_id].update({
-					'progress': progress,
-					'processed_files': processed_files,
-					'total_files': total_files
-				})
-				return True
-			else:
-				return False
-   
-	def complete_task(self, task_id: str, data={}) -> None:
-		with self._lock:
-			if task_id in self._tasks:
-				self._tasks[task_id]['status'] = 'completed'
-				self._tasks[task_id]['progress'] = 100
-				self._tasks[task_id]['data'] = data
-   
-	def fail_task(self, task_id: str, error_message: str) -> None:
-		with self._lock:
-			if task_id in self._tasks:
-				self._tasks[task_id]['status'] = 'error'
-				self._tasks[task_id]['data'] = {'error': error_message}
-   
-	def get_progress(self, task_id: str) -> dict:
-		with self._lock:
-			return self._tasks.get(task_id, {
-				'status': 'not_found',
-				'progress': 0,
-				'processed_files': 0,
-				'total_files': 0,
-				'data': {}
-			})
-
-progress_tracker = ProgressTracker()
-
-"""
-App Route Functions Begin
-"""
-@app.route('/', methods=['POST','GET'])
-def index():
-	global settings
-	global folder_status
-
-	# Create Alert Structure for Alert Notification
-	alert = { 
-		'type' : '', 
-		'text' : ''
-		}
-
-	# Flush the progress tracker
-	progress_tracker.flush_tasks()
-
-	return render_template('index.html', settings=settings, alert=alert)
-
-@app.route('/settings', methods=['POST','GET'])
-def settings_base(action=None):
-	global settings
-	global secrets
-
-	# Create Alert Structure for Alert Notification
-	alert = { 
-		'type' : '', 
-		'text' : ''
-		}
-	
-	if(request.method == 'POST') and ('form' in request.content_type):
-		# Update the system theme
-		if('theme' in request.form):
-			for theme in settings['globals']['themelist']:
-				if theme['name'] == request.form['theme']:
-					settings['globals']['theme'] = theme['filename']
-					write_settings(settings)
-					alert['type'] = 'success'
-					alert['text'] = 'Theme updated to ' + theme['name'] + "."
-
-		if('show_all_thumbnails' in request.form):
-			settings['ui']['show_all_thumbnails'] = True
-		else:
-			settings['ui']['show_all_thumbnails'] = False
-
-		if('auto_flag_processed' in request.form):
-			settings['ui']['auto_flag_processed'] = True
-		else:
-			settings['ui']['auto_flag_processed'] = False
-
-		if('immich_api_key' in request.form):
-			secrets['api_key'] = request.form['immich_api_key']
-			write_generic_yaml(secrets, 'config/secrets.yaml')
-
-		if('immich_base_url' in request.form):
-			secrets['base_url'] = request.form['immich_base_url']
-			write_generic_yaml(secrets, 'config/secrets.yaml')
-
-		write_settings(settings)
-		alert['type'] = 'success'
-		alert['text'] = f'UI Settings Updated.'
-
-	return render_template('settings.html', settings=settings, alert=alert, secrets=secrets)
-
-@app.route('/admin/<action>', methods=['POST','GET'])
-@app.route('/admin', methods=['POST','GET'])
-def admin(action=None):
-	global settings
-	global folder_status
-
-	# Create Alert Structure for Alert Notification
-	alert = { 
-		'type' : '', 
-		'text' : ''
-		}
-
-	if action == 'reset_folders':
-		folder_status = read_folder_status(reset=True)	
-		logger.info('Resetting folders.json')
-		alert['type'] = 'success'
-		alert['text'] = 'Folders reset.'
-
-	uptime = os.popen('uptime').readline()
-
-	cpuinfo = os.popen('cat /proc/cpuinfo').readlines()
-
-	return render_template('admin.html', alert=alert, uptime=uptime, cpuinfo=cpuinfo, settings=settings)
-
-@app.route('/admin/backup_folders', methods=['GET'])
-def backup_folders():
-	"""Download the current folders.json file as a backup"""
-	try:
-		folders_path = 'config/folders.json'
-		
-		if not os.path.exists(folders_path):
-			logger.error(f"Backup failed: {folders_path} not found")
-			abort(404)
-		
-		logger.info('Backing up folders.json')
-		
-		# Create a timestamped filename
-		timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-		filename = f'folders_backup_{timestamp}.json'
-		
-		return send_file(
-			folders_path,
-			as_attachment=True,
-			download_name=filename,
-			mimetype='application/json'
-		)
-	except Exception as e:
-		logger.error(f"Error during backup: {str(e)}")
-		abort(500)
-
-@app.route('/admin/restore_folders', methods=['POST'])
-def restore_folders():
-	"""Upload and restore a folders.json file"""
-	try:
-		# Check if file was uploaded
-		if 'file' not in request.files:
-			return jsonify({'success': False, 'message': 'No file provided'}), 400
-		
-		file = request.files['file']
-		
-		if file.filename == '' or file.filename is None:
-			return jsonify({'success': False, 'message': 'No file selected'}), 400
-		
-		# Validate file type
-		if not file.filename.endswith('.json'):
-			return jsonify({'success': False, 'message': 'File must be a JSON file'}), 400
-		
-		# Read and validate JSON
-		try:
-			file_content = file.read().decode('utf-8')
-			json.loads(file_content)  # Validate JSON format
-		except json.JSONDecodeError:
-			return jsonify({'success': False, 'message': 'Invalid JSON file format'}), 400
-		except Exception as e:
-			return jsonify({'success': False, 'message': f'Error reading file: {str(e)}'}), 400
-		
-		# Backup current folders.json before restoring
-		folders_path = 'config/folders.json'
-		if os.path.exists(folders_path):
-			timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-			backup_path = f'{folders_path}.{timestamp}.restore_backup'
-			try:
-				shutil.copy2(folders_path, backup_path)
-				logger.info(f'Current folders.json backed up to {backup_path}')
-			except Exception as e:
-				logger.warning(f'Could not backup current folders.json: {str(e)}')
-		
-		# Write the restored file
-		try:
-			with open(folders_path, 'w') as f:
-				f.write(file_content)
-			
-			logger.info('Folders.json successfully restored from backup')
-			
-			# Reload the folder status
-			global folder_status
-			folder_status = read_folder_status(originals_path=settings['folders']['originals'])
-			
-			return jsonify({'success': True, 'message': 'Restore successful'}), 200
-		except Exception as e:
-			logger.error(f'Error writing folders.json: {str(e)}')
-			return jsonify({'success': False, 'message': f'Error saving file: {str(e)}'}), 500
-	
-	except Exception as e:
-		logger.error(f'Error during restore: {str(e)}')
-		return jsonify({'success': False, 'message': f'Restore failed: {str(e)}'}), 500
-
-@app.route('/manifest')
-def manifest():
-	res = make_response(render_template('manifest.json'), 200)
-	res.headers["Content-Type"] = "text/cache-manifest"
-	return res
-
-@app.route('/selectfolder', methods=['POST', 'GET'])
-def select_folder():
-	global settings
-	global folder_status 
-
-	if(request.method == 'GET'):
-		return render_template('selectfolder.html', settings=settings)
-
-	if(request.method == 'POST') and ('form' in request.content_type):
-		requestform = request.form
-		#print(f'Request FORM: {requestform}')
-		if('action' in requestform):
-			if(requestform['action'] == 'init'):
-				''' Initial Folder Selection'''
-				folder_path = settings['folders']['originals']
-				folder_data = get_folder_data(folder_path)
-				return render_template('selectfolder.html', settings=settings, folder_data=folder_data, current_path=folder_path)
-			if(requestform['action']) == 'refresh':
-				''' Refresh Folder Selection from Originals Folder '''
-				folder_path = settings['folders']['originals']
-				try:
-					# Update the folder status
-					new_folder_data = {
-						folder_path : scan_directory(path=folder_path)
-						}
-					folder_status = update_folder_status(new_folder_data, folder_status)
-					write_folder_status(folder_status, path='config/folders.json')
-					folder_data = get_folder_data(folder_path)
-				except Exception as e:
-					logger.error(f"Error updating folder status: {e}")
-				return render_template('selectfolder.html', settings=settings, folder_data=folder_data, current_path=folder_path)
-			if(requestform['action'] == 'open_folder'):
-				''' Open Folder '''
-				folder_path = requestform['current_path'] + '/' + requestform['folder_name']
-				folder_data = get_folder_data(folder_path)
-				return render_template('selectfolder.html', settings=settings, folder_data=folder_data, current_path=folder_path)
-			if(requestform['action'] == 'back_folder'):
-				''' Back to Parent Folder '''
-				if requestform['current_path'] == '' or requestform['current_path'] == settings['folders']['originals']:
-					folder_path = settings['folders']['originals']
-				else:
-					folder_path = requestform['current_path'].split('/')
-					folder_path.pop()
-					folder_path = '/'.join(folder_path)
-				folder_data = get_folder_data(folder_path)
-				return render_template('selectfolder.html', settings=settings, folder_data=folder_data, current_path=folder_path)
-				
-		return render_template('selectfolder.html', settings=settings)
-
-	alert = { 
-		'type' : 'error', 
-		'text' : 'An error occurred. Please return to the home page and try again.'
-		}
-	
-	return render_template('selectfolder.html', settings=settings, alert=alert)
-
-@app.route('/importfolder', methods=['POST', 'GET'])
-def import_folder():
-	global settings
-	global progress_tracker
-
-	if(request.method == 'GET'):
-		return render_template('importfolder.html', settings=settings)
-
-	if(request.method == 'POST') and ('form' in request.content_type):
-		requestform = request.form
-		if('action' in requestform):
-			action = requestform['action']
-
-			''' Copy Task '''
-			if(action == 'copy'):
-				originals_path = requestform['import_folder']
-				import_folder = settings['folders']['import']
-				# First delete all files and folders in the import folder
-				os.system(f"rm -rf {import_folder}/*")
-				# Copy file and folder structure from originals to import
-				task_id = get_unique_id()
-				progress_tracker.create_task(task_id)
-				copy_thread = threading.Thread(target=copy_folder_structure, args=(originals_path, import_folder, task_id))
-				copy_thread.start()
-				progress_data = progress_tracker.get_progress(task_id)
-				return render_template('importfolder.html', settings=settings, action=action, percent_complete=int(progress_data['progress']), task_id=task_id, originals_path=originals_path, import_folder=import_folder)
-			if(action == 'copy_progress'):
-				task_id = requestform['task_id']
-				progress = progress_tracker.get_progress(task_id)
-				return jsonify(progress)
-			
-			''' Range Selection '''
-			if(action == 'range'):
-				originals_path = requestform['import_folder']
-				import_folder = settings['folders']['import']
-				#print(f'\n ** Range Page Got Originals Path: {originals_path} ** \n')
-				return render_template('importfolder.html', settings=settings, action=action, originals_path=originals_path, import_folder=import_folder)
-
-			''' Analyze Task '''
-			if(action == 'analyze'):
-				originals_path = requestform['import_folder']
-				import_folder = settings['folders']['import']
-				# Analyze the import folder
-				start_date = requestform.get('start_date', None)
-				end_date = requestform.get('end_date', None)
-				if start_date in ['', None]:
-					start_date = None 
-				else:
-					start_date = fixup_date_time(start_date)
-				if end_date in ['', None]:
-					end_date = None 
-				else:
-					end_date = fixup_date_time(end_date)
-				#print(f'start_date = {start_date}\nend_date = {end_date}')
-				task_id = get_unique_id()
-				progress_tracker.create_task(task_id)
-				logger.info(f"Analyze request accepted. Task ID: {task_id}, import_folder: {import_folder}, originals_path: {originals_path}, start_date: {start_date}, end_date: {end_date}")
-				analyze_thread = threading.Thread(target=analyze_import_folder, args=(settings['folders']['import'], task_id, originals_path, start_date, end_date))
-				analyze_thread.daemon = True
-				analyze_thread.start()
-				logger.info(f"Analyze thread started. Task ID: {task_id}")
-				progress_data = progress_tracker.get_progress(task_id)
-				#print(f'originals_path: {originals_path}') # DEBUG
-				#print(f'settings[folders][import]: {settings["folders"]["import"]}') # DEBUG
-				return render_template('importfolder.html', settings=settings, action=action, percent_complete=int(progress_data['progress']), task_id=task_id, originals_path=originals_path, import_folder=import_folder)
-			if(action == 'analyze_progress'):
-				task_id = requestform['task_id']
-				progress = progress_tracker.get_progress(task_id)
-				if progress.get('status') == 'error':
-					logger.warning(f"Analyze progress polled in error state. Task ID: {task_id}, error: {progress.get('data', {}).get('error')}")
-				return jsonify(progress)
-			
-			if(action == 'cancel'):
-				return redirect('/')
-		return render_template('importfolder.html', settings=settings)
-
-	alert = { 
-		'type' : 'error', 
-		'text' : 'An error occurred. Please return to the home page and try again.'
-		}
-	
-	return render_template('importfolder.html', settings=settings, alert=alert)
-
-@app.route('/fixfiles', methods=['POST', 'GET'])
-def fix_files():
-	global settings
-	global progress_tracker
-
-	if(request.method == 'GET'):
-		return render_template('fixfiles.html', settings=settings)
-
-	if(request.method == 'POST') and ('form' in request.content_type):
-		requestform = request.form
-		if('action' in requestform):
-			action = requestform['action']
-			if(action == 'results'):
-				task_id = requestform['task_id']
-				#print(f'Task ID: {task_id}')
-				progress = progress_tracker.get_progress(task_id)
-				import_data = progress['data']
-				#print(f'Import Data: {import_data}')
-				return render_template('fixfiles.html', settings=settings, action=action, task_id=task_id, import_data=import_data)
-
-	alert = { 
-		'type' : 'error', 
-		'text' : 'An error occurred. Please return to the home page and try again.'
-		}
-
-	return render_template('fixfiles.html', settings=settings, alert=alert)
-
-@app.route('/finish', methods=['POST', 'GET'])
-def finish_process():
-	global settings
-	global progress_tracker
-
-	if(request.method == 'GET'):
-		return render_template('finish.html', settings=settings)
-
-	if(request.method == 'POST') and ('form' in request.content_type):
-		requestform = request.form
-		if('action' in requestform):
-			action = requestform['action']
-			if(action == 'process'):
-				previous_task_id = requestform['task_id']
-				import_data = progress_tracker.get_progress(previous_task_id)['data']
-				#print(f'\n ** Import Data Original_Path: {import_data['original_path']} ** \n')
-				# convert task_list json string to dictionary
-				task_list = json.loads(requestform['radio_values'])
-				task_id = get_unique_id()
-				"""
-				print(f'task_id: {task_id}\n')
-				for key, value in task_list.items():
-					print(f'key: {key} value: {value}')
-				"""
-				progress_tracker.create_task(task_id)
-				# Process the import data
-				process_thread = threading.Thread(target=process_files, args=(task_id, task_list, import_data))
-				process_thread.start()
-				progress_data = progress_tracker.get_progress(task_id)
-				return render_template('finish.html', settings=settings, action=action, task_id=task_id)
-			if(action == 'process_progress'):
-				task_id = requestform['task_id']
-				progress = progress_tracker.get_progress(task_id)
-				return jsonify(progress)
-			if(action == 'results'):
-				task_id = requestform['task_id']
-				#print(f'Files Processed Successfully! \nTask ID: {task_id}')
-				progress = progress_tracker.get_progress(task_id)
-				results = progress['data']
-				return render_template('finish.html', settings=settings, action=action, task_id=task_id, results=results)
-
-	alert = { 
-		'type' : 'error', 
-		'text' : 'An error occurred. Please return to the home page and try again.'
-		}
-
-	return render_template('finish.html', settings=settings, alert=alert)
-
-@app.route('/preproc', methods=['POST', 'GET'])
-def pre_process():
-	global settings
-
-	import_folder = settings['folders']['import']
-
-	folder_path = 'originals'
-
-	if(request.method == 'POST') and ('form' in request.content_type):
-		requestform = request.form
-		if('folder_path' in requestform):
-			folder_path = requestform['folder_path']
-
-	return render_template('pre_proc.html', settings=settings, folder_path=folder_path, import_folder=import_folder)
-
-@app.route('/postproc', methods=['POST', 'GET'])
-def post_process():
-	global settings
-
-	return render_template('post_proc.html', settings=settings)
-
-def start_script(action, path='originals'):
-	"""Start a script process that runs independently and writes to a log file"""
-	global settings
-	global process_tracker
-
-	# Check if there are any running processes before starting a new one
-	if process_tracker.has_running_processes(script_type=action):
-		raise ProcessRunningError(f"A {action} script is already running. Please wait for it to complete.")
-	
-	logger.info(f"====== Starting new {action} script execution ======")
-	
-	# Create log file for this process - use a temporary UUID for the log filename
-	log_id = str(uuid.uuid4())
-	log_file = os.path.join('logs/process_logs', f'{action}_{log_id}.log')
-	
-	if action == 'preprocess':
-		command = settings['scripts']['pre_proc']['type']
-		script_path = os.path.join(settings['scripts']['pre_proc']['path'], settings['scripts']['pre_proc']['script'])
-		arguments = path
-		logger.info(f"Command: {command} {script_path} {arguments}")
-		# Try to use stdbuf to disable output buffering, but make it work without it too
-		if shutil.which('stdbuf'):
-			cmd_list = ['stdbuf', '-oL', '-eL', command, script_path, arguments] if arguments else ['stdbuf', '-oL', '-eL', command, script_path]
-		else:
-			# Fallback without stdbuf (e.g., in minimal Docker containers)
-			cmd_list = [command, script_path, arguments] if arguments else [command, script_path]
-	else:
-		command = settings['scripts']['post_proc']['type']
-		script_path = os.path.join(settings['scripts']['post_proc']['path'], settings['scripts']['post_proc']['script']) 
-		logger.info(f"Command: {command} {script_path}")
-		# Try to use stdbuf to disable output buffering, but make it work without it too
-		if shutil.which('stdbuf'):
-			cmd_list = ['stdbuf', '-oL', '-eL', command, script_path]
-		else:
-			# Fallback without stdbuf (e.g., in minimal Docker containers)
-			cmd_list = [command, script_path]
-
-	try:
-		# Open log file for writing with unbuffered mode
-		log_handle = open(log_file, 'w', buffering=1)  # Line buffering
-		
-		# Start process with output redirected to log file
-		# Set PYTHONUNBUFFERED for Python scripts and ensure bash scripts output immediately
-		env = os.environ.copy()
-		env['PYTHONUNBUFFERED'] = '1'
-		
-		process = subprocess.Popen(
-			cmd_list,
-			stdout=log_handle,
-			stderr=subprocess.STDOUT,
-			universal_newlines=True,
-			bufsize=1,  # Line buffering
-			env=env,
-			start_new_session=True  # Runs in its own session, won't be killed if parent dies
-		)
-		
-		# Track this process with its log file and capture the returned process_id
-		process_id = process_tracker.add_process(process, script_type=action, log_file=log_file)
-		logger.info(f"Started {action} process with PID: {process.pid}, ID: {process_id}, Log: {log_file}")
-		
-		# Start background thread to monitor process completion
-		def monitor_process():
-			logger.info(f"Monitor thread started for process {process.pid}")
-			try:
-				return_code = process.wait()  # Wait for process to complete
-				logger.info(f"Process {process.pid} completed with return code {return_code}")
-			except Exception as e:
-				logger.error(f"Error in monitor_process: {e}")
-			finally:
-				# Close log file handle
-				try:
-					log_handle.close()
-				except:
-					pass
-				logger.info(f"====== Script execution completed for PID {process.pid} ======")
-		
-		monitor_thread = threading.Thread(target=monitor_process)
-		monitor_thread.daemon = True
-		monitor_thread.start()
-		
-		return process_id
-		
-	except Exception as e:
-		logger.error(f"Error starting script: {e}")
-		# Clean up log file if it was created
-		try:
-			if 'log_handle' in locals():
-				log_handle.close()
-			if os.path.exists(log_file):
-				os.remove(log_file)
-		except:
-			pass
-		raise
-
-@app.route('/start_process')
-@app.route('/start_process/<action>')
-def start_process_endpoint(action=None):
-	"""Start a background process and return its ID for polling"""
-	global process_tracker
-	
-	# Determine which action to use
-	script_action = action if action else "postprocess"
-	logger.info(f"=== START_PROCESS ENDPOINT CALLED ===")
-	logger.info(f"Action: {script_action}")
-	
-	# Check if the specific script type is already running
-	is_running = process_tracker.has_running_processes(script_type=script_action)
-	logger.info(f"Script type '{script_action}' already running: {is_running}")
-	
-	if is_running:
-		logger.warning(f"Attempted to start {script_action} but one is already running")
-		return jsonify({
-			'error': True,
-			'message': f'A {script_action} script is currently running. Please wait for it to complete.'
-		}), 409  # HTTP 409 Conflict
-	
-	path = request.args.get('script_arg', 'originals')
-	logger.info(f"Script argument (path): {path}")
-	
-	try:
-		logger.info(f"Starting {script_action} script with path: {path}")
-		process_id = start_script(script_action, path=path)
-		logger.info(f"Successfully started {script_action} with process ID: {process_id}")
-		return jsonify({
-			'success': True,
-			'process_id': process_id,
-			'message': f'{script_action} process started successfully'
-		})
-	except ProcessRunningError as e:
-		logger.warning(f"ProcessRunningError: {e}")
-		return jsonify({
-			'error': True,
-			'message': str(e)
-		}), 409
-	except Exception as e:
-		logger.error(f"Error starting process: {e}", exc_info=True)
-		return jsonify({
-			'error': True,
-			'message': f'Failed to start process: {str(e)}'
-		}), 500
-
-@app.route('/cancel_process/<script_type>', methods=['POST'])
-def cancel_process(script_type):
-	"""Cancel/terminate a running process by script type"""
-	global process_tracker
-	
-	logger.info(f"=== CANCEL_PROCESS ENDPOINT CALLED ===")
-	logger.info(f"Script type: {script_type}")
-	
-	# Validate script type
-	if script_type not in ['preprocess', 'postprocess']:
-		logger.error(f"Invalid script type: {script_type}")
-		return jsonify({
-			'error': True,
-			'message': f'Invalid script type: {script_type}'
-		}), 400
-	
-	try:
-		success, message = process_tracker.terminate_process(script_type)
-		
-		if success:
-			logger.info(f"Successfully cancelled {script_type} process: {message}")
-			return jsonify({
-				'success': True,
-				'message': message
-			})
-		else:
-			logger.warning(f"Failed to cancel {script_type} process: {message}")
-			return jsonify({
-				'error': True,
-				'message': message
-			}), 404
-	except Exception as e:
-		logger.error(f"Error cancelling {script_type} process: {e}", exc_info=True)
-		return jsonify({
-			'error': True,
-			'message': f'Failed to cancel process: {str(e)}'
-		}), 500
-
-@app.route('/process_status/<process_id>')
-def get_process_status(process_id):
-	"""Get the status and recent output of a specific process"""
-	global process_tracker
-	
-	process_info = process_tracker.get_process_info(process_id)
-	
-	if not process_info:
-		return jsonify({
-			'error': True,
-			'message': 'Process not found'
-		}), 404
-	
-	# Get recent output from log file (all lines for incremental display)
-	log_content = []
-	if process_info.get('log_file') and os.path.exists(process_info['log_file']):
-		try:
-			with open(process_info['log_file'], 'r') as f:
-				log_content = f.readlines()  # Read all lines for incremental frontend display
-		except Exception as e:
-			logger.error(f"Error reading log file: {e}")
-	
-	return jsonify({
-		'success': True,
-		'status': process_info['status'],
-		'type': process_info['type'],
-		'return_code': process_info['return_code'],
-		'start_time': process_info['start_time'].isoformat(),
-		'log_content': log_content,
-		'log_file': process_info['log_file']
-	})
-
-@app.route('/active_process/<script_type>')
-def get_active_process(script_type):
-	"""Get the active process info for a given script type"""
-	global process_tracker
-	
-	process_id = process_tracker.get_active_process_id(script_type)
-	if not process_id:
-		return jsonify({
-			'success': True,
-			'process_id': None,
-			'process_info': None
-		})
-
-	process_info = process_tracker.get_process_info(process_id)
-	return jsonify({
-		'success': True,
-		'process_id': process_id,
-		'process_info': process_info
-	})
-
-@app.route('/check_running_processes')
-def check_running_processes():
-	global process_tracker
-	
-	# Get detailed status from the process tracker
-	status = process_tracker.get_status()
-	
-	# Create response data
-	response_data = {
-		'has_running_processes': status["running_processes"] > 0,
-		'preprocess_running': status["preprocess_running"],
-		'postprocess_running': status["postprocess_running"],
-		'timestamp': status["timestamp"],
-		'process_count': status["running_processes"],
-		'active_pids': [p["pid"] for p in status["active_pids"]]
-	}
-	
-	# Detailed logging only when processes are running
-	if status["running_processes"] > 0:
-		logger.info(f"Process status check at {response_data['timestamp']}")
-		logger.info(f"Total tracked processes: {response_data['process_count']}")
-		logger.info(f"Running processes: {response_data['has_running_processes']}")
-		logger.info(f"Pre-process running: {response_data['preprocess_running']}")
-		logger.info(f"Post-process running: {response_data['postprocess_running']}")
-		logger.info("---") # Separator for readability
-	
-	return jsonify(response_data)
-
-@app.route('/test_process_tracker')
-def test_process_tracker():
-	"""Test endpoint to verify process tracking"""
-	global process_tracker
-	
-	# Specify a script type for testing
-	script_type = request.args.get('type', 'test')
-	
-	# Start a long-running process (sleep for 30 seconds)
-	process = subprocess.Popen(
-		['sleep', '30'],
-		stdout=subprocess.PIPE,
-		stderr=subprocess.STDOUT,
-		universal_newlines=True
-	)
-	
-	process_id = process_tracker.add_process(process, script_type=script_type)
-	logger.info(f"Started test process with PID: {process.pid}, ID: {process_id}")
-	
-	return jsonify({
-		'message': f'Test {script_type} process started',
-		'pid': process.pid,
-		'process_id': process_id
-	})
-
-@app.route('/toggle_processed', methods=['POST'])
-def toggle_processed():
-	global settings
-	global folder_status
-
-	if request.method == 'POST':
-		try:
-			data = request.get_json()  # Get the JSON data from the request body
-			path = data.get('path', '')
-			flag = data.get('flag', False)
-			#print(f'Path: {path}, Flag: {flag}')
-			if path != '':
-				# loop through folder status to find the path that matches and set/clear ['processed'] flag
-				success = set_processed(path, flag)
-				return jsonify({'success': success})  # Return JSON response with a dictionary.
-
-		except Exception as e:
-			logger.error(f"Error processing request: {e}")
-			return jsonify({'success': False, 'error': str(e)}), 500 # return 500 error if failed
-
-	return jsonify({'success': False, 'error': 'Invalid request method'}), 400 # return 400 error if not a POST
-
-
-
-"""
-Supporting Functions
-"""
-
-def set_processed(path, flag, recursive=False):
-	"""
-	Walk through the nested folder structure to find the specified path
-	and update its 'processed' flag.
-
-	Parameters:
-	path (str): The path to find and update
-	flag (bool): The value to set for the 'processed' flag
-
-	Returns:
-	bool: True if the path was found and updated, False otherwise
-	"""
-	global folder_status
-
-	def update_processed(sub_dict, flag):
-		for sub_dir, data in sub_dict.items():
-			if data['subfolders'] != {}:
-				update_processed(data['subfolders'], flag)
-			else:
-				data['processed'] = flag
-
-	def search_and_update(current_dict):
-		"""Recursive helper function to search through the nested structure"""
-		for key, value in current_dict.items():
-			if isinstance(value, dict):
-				# Check if this is a folder entry with a matching path
-				if 'path' in value and value['path'] == path:
-					value['processed'] = flag
-					if recursive and value['subfolders'] != {}:
-						update_processed(value['subfolders'], flag)
-					return True
-				
-				# If it has subfolders, search those
-				if 'subfolders' in value:
-					if search_and_update(value['subfolders']):
-						return True
-				
-				# Check other dictionary entries
-				if search_and_update(value):
-					return True
-		
-		return False
-
-	success = search_and_update(folder_status)
-	write_folder_status(folder_status)
-
-	return success
-
-def get_folder_data(path='originals'):
-	global folder_status
-	global settings 
-
-	''' 
-	 Walk the folder_status dictionary to map the path, then return the following structure:
-	 folder_details = [folder_dict of each subfolder in the path]
-	 folder_dict = {
-		'name' : folder,
-		'num_folders' : number of subfolders in this folder,
-		'num_files' : number of files in this folder,
-		'processed' : True/False/None (None indicates partially processed)
-	 }
-	'''
-	def check_processed_status(folder_data):
-		"""Recursively check the processed status of a folder and all its subfolders"""
-		if not folder_data['subfolders']:
-			return folder_data['processed'], folder_data['processed']
-
-		all_processed = folder_data['processed']
-		has_processed = folder_data['processed']
-		has_unprocessed = not folder_data['processed']
-
-		for _, sub_data in folder_data['subfolders'].items():
-			sub_all_processed, sub_has_processed = check_processed_status(sub_data)
-			all_processed = all_processed and sub_all_processed
-			has_processed = has_processed or sub_has_processed
-			has_unprocessed = has_unprocessed or not sub_all_processed
-
-		return all_processed, has_processed
-
-	#print(f'path: {path}') # DEBUG
-	folder_details = []
-	try:
-		original_path = path.replace('./', '')
-
-		path_list = original_path.split('/')
-
-		path_depth = len(path_list)
-
-		#print(f'path_depth: {path_depth}') # DEBUG
-		#print(f'path_list: {path_list}') # DEBUG
-
-		subfolder_target = folder_status.copy()
-		
-		''' Traverse the folder_status dictionary to find the path, get details of the subfolders in the path, 
-			and return a list of dictionaries with the details of each subfolder. '''
-		# If path_depth is 1, then we are at the top level of the folder_status dictionary
-		if path_depth == 1:
-			subfolder_target = subfolder_target[path_list[0]]['subfolders']
-		else:
-			for index in range(0, path_depth):
-				#print(f'Path_list[{index}]: {path_list[index]} Subfolder_target: {subfolder_target[path_list[index]]['path']}') # DEBUG
-				subfolder_target = subfolder_target[path_list[index]]['subfolders']
-
-		for subfolder, data in subfolder_target.items():
-			# Check the processed status recursively through all subfolders
-			all_processed, has_processed = check_processed_status(data)
-			
-			if all_processed:
-				processed_status = True
-			elif has_processed:
-				processed_status = None  # Partially processed
-			else:
-				processed_status = False
-
-			folder_dict = {
-				'name' : subfolder,
-				'num_folders' : data['num_subfolders'],
-				'num_files' : data['num_files'],
-				'processed' : processed_status
-			}
-			folder_details.append(folder_dict)
-
-		return folder_details
-			
-	except KeyError as e:
-		logger.error(f"KeyError: {e}")
-	except Exception as e:
-		logger.error(f"An unexpected error occurred: {e}")
-
-	return []
-
-def copy_folder_structure(originals_path, import_folder, task_id):
-	""" Copy folder structure and all files from originals folder to the import folder and provide progress updates while copying. """
-	try:
-		#print(f'\n ** Copying folder structure and files from {originals_path} to {import_folder}. ** \n')
-		status = progress_tracker.update_progress(task_id, 1, 0, 1)
-		if not status:
-			return
-
-		if not os.path.exists(originals_path):
-			raise FileNotFoundError(f"Source folder not found: {originals_path}")
-
-		# Phase 1: Build file list with heartbeat progress so UI doesn't appear stuck.
-		files_to_copy = []
-		scanned_dirs = 0
-		for root, dirs, files in os.walk(originals_path):
-			scanned_dirs += 1
-			for file in files:
-				files_to_copy.append((root, file))
-			if scanned_dirs % 25 == 0:
-				heartbeat_progress = min(10, 1 + int(scanned_dirs / 25))
-				status = progress_tracker.update_progress(task_id, heartbeat_progress, scanned_dirs, scanned_dirs + 1)
-				if not status:
-					return
-				logger.info(f"Copy scan progress: scanned {scanned_dirs} directories, discovered {len(files_to_copy)} files")
-
-		total_files = len(files_to_copy)
-		if total_files == 0:
-			logger.error(f"No files found in source folder: {originals_path}")
-			progress_tracker.fail_task(task_id, f"No files found in source folder: {originals_path}")
-			return
-
-		logger.info(f"Starting copy task. Source: {originals_path}, Destination: {import_folder}, Files: {total_files}")
-		processed_files = 0
-		for root, file in files_to_copy:
-			file_path = os.path.join(root, file)
-			relative_path = os.path.relpath(file_path, originals_path)
-			import_path = os.path.join(import_folder, relative_path)
-			try:
-				if not os.path.isfile(file_path):
-					raise OSError(f"Not a regular file: {file_path}")
-				os.makedirs(os.path.dirname(import_path), exist_ok=True)
-				shutil.copyfile(file_path, import_path)
-				try:
-					shutil.copystat(file_path, import_path)
-				except OSError as stat_err:
-					# Metadata copy failures should not stop content copy.
-					logger.warning(f"copystat failed for '{file_path}': {stat_err}")
-			except (FileNotFoundError, PermissionError, OSError) as e:
-				logger.error(f"File operation error copying '{file}': {e}")
-				progress_tracker.fail_task(task_id, f"Error copying '{file}': {e}")
-				return
-			processed_files += 1
-			if processed_files % 25 == 0:
-				logger.info(f"Copy task progress: {processed_files}/{total_files}")
-			progress = 10 + ((processed_files / total_files) * 90)
-			status = progress_tracker.update_progress(task_id, progress, processed_files, total_files)
-			if not status:
-				return
-		data = {'alert': {'type': 'success', 'text': 'Folder structure and files copied successfully.'}, 'original_path': originals_path}
-		progress_tracker.complete_task(task_id, data=data)
-		logger.info(f"Copy task completed successfully. Files copied: {processed_files}/{total_files}, Task ID: {task_id}")
-	except Exception as e:
-		logger.error(f"Unexpected error in copy_folder_structure: {e}")
-		progress_tracker.fail_task(task_id, f"Unexpected error: {e}")
-
-def analyze_import_folder(import_folder, task_id, originals_path, start_date, end_date):
-	""" Recusively analyze files and folders in the import folder. Create and return a dictionary of three dictionaries: files_with_dates (image files with exif date), files_without_dates (image files without exif date), and ignored_files (all other files). Each entry into these dictionaries should have the path, filename, date (if exif data exists). """
-	#print(f'\n ** Analyzing import folder: {import_folder} from originals folder: {originals_path} ** \n')
-	logger.info(f"Analyze worker entered. Task ID: {task_id}, folder: {import_folder}")
-	files_with_dates = []
-	files_without_dates = []
-	ignored_files = []
-	try:
-		status = progress_tracker.update_progress(task_id, 1, 0, 1)
-		if not status:
-			return
-
-		if not os.path.exists(import_folder):
-			raise FileNotFoundError(f"Import folder not found: {import_folder}")
-
-		# Phase 1: Build file list with heartbeat progress while scanning directories.
-		files_to_analyze = []
-		scanned_dirs = 0
-		for root, dirs, files in os.walk(import_folder):
-			scanned_dirs += 1
-			for file in files:
-				files_to_analyze.append((root, file))
-			if scanned_dirs % 25 == 0:
-				heartbeat_progress = min(10, 1 + int(scanned_dirs / 25))
-				status = progress_tracker.update_progress(task_id, heartbeat_progress, scanned_dirs, scanned_dirs + 1)
-				if not status:
-					return
-				logger.info(f"Analyze scan progress: scanned {scanned_dirs} directories, discovered {len(files_to_analyze)} files")
-
-		total_files = len(files_to_analyze)
-		if total_files == 0:
-			raise FileNotFoundError(f"No files found in import folder: {import_folder}")
-
-		logger.info(f"Starting analyze task. Source: {import_folder}, Files: {total_files}")
-		processed_files = 0
-		image_extensions = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp'}
-		for root, file in files_to_analyze:
-			processed_files += 1
-			progress = 10 + ((processed_files / total_files) * 90)
-			status = progress_tracker.update_progress(task_id, progress, processed_files, total_files)
-			if not status:
-				return
-			if processed_files <= 3 or processed_files % 25 == 0:
-				logger.info(f"Analyze task processing file {processed_files}/{total_files}: {os.path.join(root, file)}")
-
-			file_path = os.path.join(root, file)
-			try:
-				file_ext = os.path.splitext(file)[1].lower()
-				if file_ext in image_extensions:
-					exif_data = get_exif_data(file_path)
-					date = get_exif_date(exif_data)
-					file_date = get_file_date(file_path)
-					#print(f'file_root: {root}, file: {file}, date: {date}, file_date: {file_date}')
-					image_link = root.replace('./static/', '').replace('./', '') + '/' + file 
-					#print(f'image_link: {image_link}')
-					if date:
-						guessed_dates = guess_date(file, file_date, file_path, start_date, end_date)
-						files_with_dates.append({'path': root, 'filename': file, 'date': date, 'file_date': file_date, 'image_link': image_link, 'guessed_dates': guessed_dates, 'start_date': start_date, 'end_date': end_date})
-					else:
-						guessed_dates = guess_date(file, file_date, file_path, start_date, end_date)
-						files_without_dates.append({'path': root, 'filename': file, 'file_date': file_date, 'image_link': image_link, 'guessed_dates': guessed_dates, 'start_date': start_date, 'end_date': end_date})
-				else:
-					ignored_files.append({'path': root, 'filename': file})
-			except (FileNotFoundError, PermissionError, OSError) as e:
-				logger.error(f"File operation error reading '{file_path}': {e}")
-				progress_tracker.fail_task(task_id, f"Error reading '{file}': {e}")
-				return
-			except Exception as e:
-				logger.error(f"Unexpected analyze error for '{file_path}': {e}")
-				progress_tracker.fail_task(task_id, f"Error analyzing '{file}': {e}")
-				return
-
-			if processed_files % 25 == 0:
-				logger.info(f"Analyze task progress: {processed_files}/{total_files}")
-		import_data = {'files_with_dates': files_with_dates, 'files_without_dates': files_without_dates, 'ignored_files': ignored_files, 'original_path': originals_path}
-		progress_tracker.complete_task(task_id, data=import_data)
-		logger.info(f"Analyze task completed successfully. Files analyzed: {processed_files}/{total_files}, Task ID: {task_id}")
-		#print(import_data) # DEBUG
-	except Exception as e:
-		logger.error(f"Error analyzing import folder: {e}")
-		progress_tracker.fail_task(task_id, f"Error analyzing folder: {e}")
-
-def process_files(task_id, task_list, import_data):
-	""" Process the files based on the task list. """
-	originals_path = import_data.get('original_path', 'NOT FOUND')
-	#print(f'originals_path: {originals_path}')
-	
-	processed_tasks = 0
-	report = []
-	# Get total tasks to process
-	total_tasks = len(list(task_list.keys()))
-	# Get total files to copy
-	total_files = len(import_data['files_with_dates']) + len(import_data['files_without_dates']) + len(import_data['ignored_files'])
-	# Get total items to process
-	total_items = total_files + total_tasks
-
-	# Get the current date and time
-	now = datetime.now()
-
-	# Define the format for the date and time string
-	date_time_format = "%Y-%m-%d %H:%M:%S"
-
-	# Generate the date and time string
-	date_time_str = now.strftime(date_time_format)
-
-	report.append(f'Process Images Report [{date_time_str}]')
-	report.append(f'Number of tasks: {total_tasks}')
-	report.append(f'Number of files scanned: {total_files}')
-	report.append(f'Number of items total: {total_items}')
-
-	# Process the files in place
-	results = {
-		'files_ignored' : [],
-		'files_deleted' : [],
-		'files_edited' : [],
-		'files_copied' : [],
-		'errors' : []
-	}
-	delete_files = []
-	for file, task in task_list.items():
-		#print(f'task = {task}')
-		filename = file.replace('choices_fileid_', '')
-		# if task value is 'ignore', skip the task
-		if task == 'ignore':
-			results['files_ignored'].append(f'{filename.replace(IMPORT_FOLDER, '')}')
-		elif task == 'delete':
-			delete_files.append(filename)
-		elif is_valid_date(task):
-			new_date = fixup_date_time(task)
-			if write_date_to_exif(filename, new_date):
-				results['files_edited'].append(f'{filename.replace(IMPORT_FOLDER, '')} was processed with date {new_date}.')
-			else:
-				results['errors'].append(f'{filename.replace(IMPORT_FOLDER, '')} had an error when processing with {new_date}.')
-		else:
-			results['errors'].append(f'{filename.replace(IMPORT_FOLDER, '')} was not processed.')
-		processed_tasks += 1
-		progress = int((processed_tasks / total_items) * 100)
-		status = progress_tracker.update_progress(task_id, progress, processed_tasks, total_tasks)
-		if not status:
-			return
-	# Copy the files to export folder
-	export_folder = f"{settings['folders']['export']}/"
-	# Delete files in export folder before copying files
-	try:
-		if os.path.exists(export_folder):
-			for item in os.listdir(export_folder):
-				item_path = os.path.join(export_folder, item)
-				if os.path.isdir(item_path):
-					shutil.rmtree(item_path)
-				else:
-					os.remove(item_path)
-		else:
-			os.makedirs(export_folder, exist_ok=True)
-	except Exception as e:
-		logger.error(f'Critical error clearing export folder: {e}')
-		progress_tracker.fail_task(task_id, f"Cannot clear export folder '{export_folder}': {e}")
-		return
-
-	for group in ['files_with_dates', 'files_without_dates', 'ignored_files']:
-		for file in import_data[group]:
-			file_path = os.path.join(file['path'], file['filename'])
-			if file_path in delete_files:
-				try:
-					os.remove(file_path)
-					results['files_deleted'].append(f'{file_path.replace(IMPORT_FOLDER, '')} was deleted.')
-				except Exception as e:
-					results['errors'].append(f'Error deleting {file_path.replace(IMPORT_FOLDER, '')}: {e}')
-					logger.error(f'Error deleting {file_path.replace(IMPORT_FOLDER, '')}: {e}')
-			else:
-				try:
-					dest_dir = export_folder + file['path'].replace(IMPORT_FOLDER, '')
-					os.makedirs(dest_dir, exist_ok=True)
-					shutil.copy2(file_path, dest_dir)
-					os.remove(file_path)
-					results['files_copied'].append(f'{file_path.replace(IMPORT_FOLDER, '')} was copied to export folder.')
-				except Exception as e:
-					results['errors'].append(f'Error moving {file_path.replace(IMPORT_FOLDER, '')} to export folder: {e}')
-					logger.error(f'Error moving {file_path.replace(IMPORT_FOLDER, '')} to export folder: {e}')
-			processed_tasks += 1
-			progress = int((processed_tasks / total_items) * 100)
-			status = progress_tracker.update_progress(task_id, progress, processed_tasks, total_items)
-			if not status:
-				return
-
-	progress_tracker.complete_task(task_id, data=results)
-
-	# Generate report
-	report.append('')
-	report.append('======')
-	report.append('Errors')
-	report.append('======')
-	for line in results['errors']:
-		report.append(f' - {line}')
-
-	report.append('')
-	report.append('============')
-	report.append('Files Edited')
-	report.append('============')
-	for line in results['files_edited']:
-		report.append(f' - {line}')
-
-	report.append('')
-	report.append('=============')
-	report.append('Files Deleted')
-	report.append('=============')
-	for line in results['files_deleted']:
-		report.append(f' - {line}')
-
-	report.append('')
-	report.append('=============')
-	report.append('Files Ignored')
-	report.append('=============')
-	for line in results['files_ignored']:
-		report.append(f' - {line}')
-
-	report.append('')
-	report.append('============')
-	report.append('Files Copied')
-	report.append('============')
-	for line in results['files_copied']:
-		report.append(f' - {line}')
-
-	report.append('')
-	report.append('=============')
-	report.append('End of Report')
-	report.append('=============')
-
-	report_filename = f'logs/report_{date_time_str}.log'
-
-	with open(report_filename, 'w') as file:
-		file.writelines(line + '\n' for line in report)
-
-	if settings['ui']['auto_flag_processed']:
-		set_processed(import_data['original_path'], True, recursive=True)
-
-def get_file_date(file_path):
-	""" Get the date of the file. """
-	try:
-		file_stats = os.stat(file_path)
-		file_date = file_stats.st_mtime
-		# convert file_date to a human-readable format
-		file_date = datetime.fromtimestamp(file_date, tz=timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
-		return file_date
-	except Exception as e:
-		#print(f"Error getting file date: {e}")
-		logger.error(f"Error getting file date: {e}")
-		return None
-
-def guess_date(filename, file_date, file_path, start_date, end_date):
-	""" Using the filename, file_date (should already be a date, simply append to the list), and file_path, attempt to guess the date and time of the image and return a list of possible dates. """
-	guessed_dates = {
-		'filename' : None,
-		'pathname' : None,
-		'filedate' : None
-	}
-	# start_date and end_date are already in string format and fixed up
-	# Get the date from the filename
-	filename_date = get_date_from_filename(filename)
-	if filename_date:
-		#print(f'filename_date: {filename_date}')
-		fixed_date = fixup_date_time(filename_date)
-		#print(f'fixed_data: {fixed_date}')
-		if date_in_range(start_date, end_date, fixed_date):
-			guessed_dates['filename'] = fixed_date
-	# Get the date from the file path
-	path_date = get_date_from_path(file_path)
-	if path_date:
-		#print(f'path_date: {path_date}')
-		fixed_date = fixup_date_time(path_date)
-		if date_in_range(start_date, end_date, fixed_date):
-			guessed_dates['pathname'] = fixed_date
-	# Get the date from the file date
-	if file_date:
-		if date_in_range(start_date, end_date, file_date):
-			guessed_dates['filedate'] = file_date
-	return guessed_dates
-
-def get_date_from_filename(filename):
-	""" Get the date from the filename. 
-	# Check for several different date patterns in the filename including YYYY-MM-DD, YYYYMMDD, YYYY_MM_DD, MM-DD-YYYY, MM_DD_YYYY, YYYY-MM, YYYY_MM where year would be 1900-2099
-	"""
-	search_patterns = [r'\d{4}-\d{2}-\d{2}', r'\d{4}_\d{2}_\d{2}', r'\d{2}-\d{2}-\d{4}', r'\d{2}_\d{2}_\d{4}', r'\d{4}-\d{2}', r'\d{4}_\d{2}', r'\d{8}']
-	for pattern in search_patterns:
-		date = re.search(pattern, filename)
-		if date:
-			# Check if the date is a valid date
-			if is_valid_date(date.group()):
-				return date.group()
-	return None
-
-def get_date_from_path(file_path):
-	""" Get the date from the file_path string. 
-	# Check for several different date patterns in the file_path string including YYYY-MM-DD, YYYY_MM_DD, YYYY/MM/DD, YYYY/MM, MM-DD-YYYY, MM_DD_YYYY, YYYY-MM, YYYY_MM, YYYYMMDD where year would be 1900-2099
-	"""
-	search_patterns = [r'\d{4}-\d{2}-\d{2}', r'\d{4}_\d{2}_\d{2}', r'\d{4}/\d{2}/\d{2}', r'\d{4}/\d{2}', r'\d{2}-\d{2}-\d{4}', r'\d{2}_\d{2}_\d{4}', r'\d{4}-\d{2}', r'\d{4}_\d{2}', r'\d{8}']
-	for pattern in search_patterns:
-		date = re.search(pattern, file_path)
-		if date:
-			# Check if the date is a valid date
-			if is_valid_date(date.group()):
-				return date.group()
-	return None
-
-def is_valid_date(date):
-	""" The variable date is a string that could be in various formats (is not a datetime format), check to see if it looks like a valid date based knowing the year should be between 1900-2099."""
-	year = re.search(r'\d{4}', date)
-	if year:
-		year = int(year.group())
-		if year >= 1900 and year <= 2099:
-			return True
-	return False
-
-def fixup_date_time(date_time):
-	""" 
-		Fixup date input to be in the format. 
-		Input: Possible input formats are YYYY-MM-DD, YYYY_MM_DD, YYYY/MM/DD, YYYY/MM, MM-DD-YYYY, MM_DD_YYYY, YYYY-MM, YYYY_MM, YYYYMMDD and may or may not contain the time. 
-		Output: string in the format YYYY-MM-DD HH:MM:SS (where HH:MM:SS is 00:00:00 if not present).
-	"""
-	# Check if input contains full date matching one of these patterns YYYY-MM-DD, YYYY_MM_DD, YYYY/MM/DD, MM-DD-YYYY, MM_DD_YYYY, YYYYMMDD and format to YYYY-MM-DD
-	search_patterns = [r'\d{4}-\d{2}-\d{2}', r'\d{4}_\d{2}_\d{2}', r'\d{4}/\d{2}/\d{2}', r'\d{2}-\d{2}-\d{4}', r'\d{2}_\d{2}_\d{4}', r'\d{8}']
-	patterns = ['YYYY-MM-DD', 'YYYY_MM_DD', 'YYYY/MM/DD', 'MM-DD-YYYY', 'MM_DD_YYYY', 'YYYYMMDD']
-	for index, pattern in enumerate(search_patterns):
-		date_match = re.search(pattern, date_time)
-		if date_match:
-			date = date_match.group()
-			# Convert date to YYYY-MM-DD
-			date = convert_date(date, patterns[index])
-			break
-	if not date_match:
-		patterns = ['YYYY-MM', 'YYYY_MM']
-		search_patterns	= [r'\d{4}-\d{2}', r'\d{4}_\d{2}']
-		for index, pattern in enumerate(search_patterns):
-			date_match = re.search(pattern, date_time)
-			if date_match:
-				date = date_match.group()
-				# Convert date to YYYY-MM-DD
-				date = convert_date(date, patterns[index])
-				break
-	
-	if not date_match:
-		return '0000-00-00 00:00:00'
-
-	# Check if input contains time and format to HH:MM:SS
-	time_match = re.search(r'\d{2}:\d{2}:\d{2}', date_time)
-	if time_match:
-		time = time_match.group()
-	else:
-		time = '00:00:00'
-
-	return f'{date} {time}'
-
-def convert_date(date, pattern):
-	""" Convert date to YYYY-MM-DD format. """
-	if pattern == 'YYYY-MM-DD':
-		return date
-	if pattern == 'YYYY_MM_DD':
-		return date.replace('_', '-')
-	if pattern == 'YYYY/MM/DD':
-		return date.replace('/', '-')
-	if pattern == 'MM-DD-YYYY':
-		return '-'.join(date.split('-')[::-1])
-	if pattern == 'MM_DD_YYYY':
-		return '-'.join(date.split('_')[::-1])
-	if pattern == 'YYYYMMDD':
-		return f'{date[0:4]}-{date[4:6]}-{date[6:8]}'
-	if pattern == 'YYYY-MM':
-		return date + '-01'
-	if pattern == 'YYYY_MM':
-		return date.replace('_', '-') + '-01'
-	
-	return '1900-01-01'
-
-def date_is_after(date_string1, date_string2):
-	"""
-	Compare two date strings and return True if the first date is after the second date.
-
-	Args:
-	date_string1 (str): The first date string.
-	date_string2 (str): The second date string.
-
-	Returns:
-	bool: True if the first date is after the second date, False otherwise.
-	"""
-	date_format = "%Y-%m-%d %H:%M:%S"
-
-	# Convert date strings to datetime objects
-	date1 = datetime.strptime(date_string1, date_format)
-	date2 = datetime.strptime(date_string2, date_format)
-
-	# Compare the dates
-	return date1 >= date2
-
-def date_is_before(date_string1, date_string2):
-	"""
-	Compare two date strings and return True if the first date is before the second date.
-
-	Args:
-	date_string1 (str): The first date string.
-	date_string2 (str): The second date string.
-
-	Returns:
-	bool: True if the first date is after the second date, False otherwise.
-	"""
-	date_format = "%Y-%m-%d %H:%M:%S"
-
-	# Convert date strings to datetime objects
-	date1 = datetime.strptime(date_string1, date_format)
-	date2 = datetime.strptime(date_string2, date_format)
-
-	# Compare the dates
-	return date1 <= date2
-
-def date_in_range(start_date, end_date, test_date):
-	if start_date == None and end_date == None:
-		return True 
-	
-	if start_date or end_date:
-		if start_date and end_date and date_is_after(test_date, start_date) and end_date and date_is_before(test_date, end_date):
-			return True
-		elif start_date and date_is_after(test_date, start_date):
-			return True
-		elif end_date and date_is_before(test_date, end_date):
-			return True 
-
-	return False
-
-def get_unique_id():
-	""" Generate a unique ID for a task. """
-	return str(uuid.uuid4())
-
-@app.route('/logs')
-@app.route('/logs/<filename>')
-def logs(filename=None):
-	"""View log files in the logs directory"""
-	# Get list of all .log files in the logs directory
-	log_files = []
-	for file in os.listdir('logs'):
-		if file.endswith('.log'):
-			log_files.append(file)
-	
-	# Sort log files with app.log first, then by name
-	log_files.sort(key=lambda x: (x != 'app.log', x))
-	
-	# If no filename specified, use app.log or the first log file found
-	if not filename:
-		filename = 'app.log' if 'app.log' in log_files else (log_files[0] if log_files else None)
-	
-	# Read the selected log file
-	log_content = ''
-	if filename and filename in log_files:
-		try:
-			with open(os.path.join('logs', filename), 'r') as f:
-				log_content = f.read()
-		except Exception as e:
-			logger.error(f"Error reading log file {filename}: {e}")
-			log_content = f"Error reading log file: {str(e)}"
-	
-	return render_template('logs.html', 
-						 settings=settings,
-						 log_files=log_files,
-						 current_log=filename,
-						 log_content=log_content)
-
-"""
-Run Flask App
-"""
-configured_log_level = settings['globals'].get('log_level', 40)
-effective_log_level = 20 if settings['globals'].get('debug', False) and configured_log_level > 20 else configured_log_level
-logger = create_logger('app', filename='logs/app.log', level=effective_log_level)
-
-if effective_log_level != configured_log_level:
-	logger.warning(f"Debug mode is enabled; overriding log level from {configured_log_level} to {effective_log_level} (INFO)")
-
-logger.info('Application Started.')
-
-secrets = read_generic_yaml('config/secrets.yaml')
-if secrets == {}:
-	logger.info('New config/secrets.yaml file created.')
-	secrets = {
-		'base_url': 'http://127.0.0.1:2283/api',
-		'api_key': ''
-	}
-	write_generic_yaml(secrets, 'config/secrets.yaml')
-
-# Start background thread for periodic log cleanup
-def cleanup_logs_periodically():
-	"""Periodically clean up old log files"""
-	import time
-	while True:
-		try:
-			time.sleep(24 * 60 * 60)  # Run every 24 hours
-			process_tracker.cleanup_old_logs()
-		except Exception as e:
-			logger.warning(f"Error in log cleanup thread: {e}")
-
-cleanup_thread = threading.Thread(target=cleanup_logs_periodically)
-cleanup_thread.daemon = True
-cleanup_thread.start()
-logger.info("Log cleanup thread started")
-
-if __name__ == '__main__':
-	if settings['globals']['debug'] == False:
-		app.run(host='0.0.0.0')
-	else:
-		app.run(host='0.0.0.0', debug=True)
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+	Flask Script
+ *****************************************
+
+ Description: WebUI for the project.  
+
+ *****************************************
+"""
+
+"""
+Imports
+"""
+import os
+import sys
+import threading
+import uuid
+import re
+import subprocess
+import json
+import gzip
+import shutil
+import signal
+import platform
+import concurrent.futures
+import multiprocessing
+
+from flask import Flask, request, render_template, make_response, redirect, jsonify, abort, send_from_directory, Response, send_file
+from common import *
+from exif.exif import *
+from sorter.sorter import is_valid_sort_pattern
+from typing import Dict
+from datetime import datetime, timezone
+import time
+
+class ProcessRunningError(Exception):
+	"""Raised when attempting to start a script while another is running"""
+	pass
+
+"""
+Globals
+"""
+app = Flask(__name__)
+settings = read_settings(init=True)
+folder_catalog = open_folder_catalog(originals_path=settings['folders']['originals'], scan_workers=settings['performance']['scan_workers'], retention_days=settings['backup']['retention_days'] if settings['backup']['enabled'] else 0)
+state_store = create_state_store(settings['performance']['state_backend'])
+import_data = []
+PROGRESS_MIN_INTERVAL = 0.1  # Seconds between progress writes to the state store for a task
+TASK_EVENTS_MIN_INTERVAL = 0.25  # Seconds between progress events on a task event stream
+TASK_EVENTS_KEEPALIVE = 15  # Seconds without a change before a keepalive comment is sent
+TASK_EVENTS_MAX_DURATION = 300  # Seconds before a task event stream is closed (the browser reconnects)
+PROCESS_LOG_TAIL_LINES = 500  # Lines of process output returned when attaching to a process
+PROCESS_LOG_MAX_TAIL_LINES = 5000
+PROCESS_LOG_MAX_CHUNK = 1024 * 1024  # Maximum bytes of process output returned per status request
+SCRIPT_TYPES = ['preprocess', 'postprocess', 'sort']
+SORTED_FOLDER = 'sorted'  # Folder in the export folder that the sort script sorts into
+
+IMPORT_FOLDER = settings['folders']['import']
+EXPORT_FOLDER = settings['folders']['export']
+
+# Track background processes, shared between workers through the state store.  The subprocess objects only exist
+#  in the worker that started them, other workers check on the process by its PID.
+class ProcessTracker:
+	def __init__(self, store):
+		self._store = store
+		self._local = {}  # Dictionary of process_id -> process object, for processes started by this worker
+		self._lock = threading.Lock()
+		self._log_dir = 'logs/process_logs'
+		self._max_log_size = 50 * 1024 * 1024  # 50MB max size per log file
+		self._max_backups = 10  # Keep up to 10 backup log files
+		# Create log directory if it doesn't exist
+		try:
+			os.makedirs(self._log_dir, exist_ok=True)
+			if 'logger' in globals():
+				logger.info(f"Process log directory: {self._log_dir}")
+		except Exception as e:
+			if 'logger' in globals():
+				logger.error(f"Failed to create log directory {self._log_dir}: {e}")
+			# Try to create it anyway if it doesn't exist
+			if not os.path.exists(self._log_dir):
+				raise
+	
+	def _rotate_log_if_needed(self, log_file):
+		"""Rotate log file if it exceeds max size"""
+		try:
+			if os.path.exists(log_file):
+				file_size = os.path.getsize(log_file)
+				if file_size > self._max_log_size:
+					# Rotate existing backups
+					for i in range(self._max_backups - 1, 0, -1):
+						backup_file = f"{log_file}.{i}"
+						next_backup_file = f"{log_file}.{i+1}"
+						if os.path.exists(backup_file):
+							if os.path.exists(next_backup_file):
+								os.remove(next_backup_file)
+							os.rename(backup_file, next_backup_file)
+					
+					# Rename current log to .1
+					backup_file = f"{log_file}.1"
+					if os.path.exists(backup_file):
+						os.remove(backup_file)
+					os.rename(log_file, backup_file)
+					
+					if 'logger' in globals():
+						logger.info(f"Rotated log file {log_file} (was {file_size} bytes)")
+		except Exception as e:
+			if 'logger' in globals():
+				logger.warning(f"Error rotating log file {log_file}: {e}")
+		
+	def add_process(self, process, script_type=None, log_file=None):
+		# Rotate log file if needed before adding new process
+		if log_file:
+			self._rotate_log_if_needed(log_file)
+		
+		process_id = str(uuid.uuid4())
+		with self._lock:
+			self._local[process_id] = process
+		self._store.put_process(process_id, {
+			"pid": process.pid if hasattr(process, "pid") else None,
+			"start_time": datetime.now().isoformat(),
+			"type": script_type,
+			"log_file": log_file,
+			"status": "running",
+			"return_code": None
+		})
+		logger.info(f"Added new process {process.pid} with ID {process_id} - Total processes: {len(self._store.list_processes())}")
+		return process_id
+			
+	def remove_process(self, process_id):
+		process_info = self._store.get_process(process_id)
+		if process_info and self._store.delete_process(process_id):
+			with self._lock:
+				self._local.pop(process_id, None)
+			pid = process_info["pid"] if process_info["pid"] else "unknown"
+			logger.info(f"Removed process {pid} with ID {process_id}")
+			return True
+		return False
+
+	def mark_finished(self, process_id, return_code):
+		"""Record the return code of a process started by this worker once it exits"""
+		process_info = self._store.get_process(process_id)
+		if process_info and (process_info["status"] == "running" or process_info["return_code"] is None):
+			fields = {"return_code": return_code}
+			if process_info["status"] == "running":
+				fields["status"] = "completed"
+			self._store.update_process(process_id, fields)
+
+	def get_process_id_by_pid(self, pid):
+		"""Get internal process ID from OS process ID"""
+		for process_id, process_info in self._store.list_processes().items():
+			if process_info["pid"] == pid:
+				return process_id
+		return None
+	
+	def get_process_info(self, process_id):
+		"""Get detailed information about a process"""
+		process_info = self._store.get_process(process_id)
+		if process_info is None:
+			return None
+		process_info["start_time"] = datetime.fromisoformat(process_info["start_time"])
+		return process_info
+
+	def _poll(self, process_id, process_info):
+		"""Return the return code of a process, or None if it is still running (the return code of a process started
+		by another worker isn't known here, so -1 is returned once it has exited)"""
+		with self._lock:
+			process = self._local.get(process_id)
+		if process is not None:
+			return process.poll()
+		pid = process_info["pid"]
+		if not pid or platform.system() == "Windows":
+			return None
+		try:
+			os.kill(pid, 0)
+			return None
+		except ProcessLookupError:
+			return -1
+		except PermissionError:
+			return None
+
+	def _get_active_scripts(self, processes):
+		"""Dictionary of script type -> process_id for the running pre / post processing and sort scripts"""
+		active_scripts = {}
+		for process_id, process_info in sorted(processes.items(), key=lambda item: item[1]["start_time"]):
+			if process_info["status"] == "running" and process_info["type"] in SCRIPT_TYPES:
+				active_scripts[process_info["type"]] = process_id
+		return active_scripts
+	
+	def terminate_process(self, script_type):
+		"""Terminate a running process by script type (preprocess, postprocess or sort)"""
+		with self._store.lock('processes'):
+			process_id = self._get_active_scripts(self._store.list_processes()).get(script_type)
+			if process_id is None:
+				logger.warning(f"No active {script_type} process to terminate")
+				return False, f"No active {script_type} process found"
+			
+			process_info = self._store.get_process(process_id)
+			if not process_info:
+				logger.warning(f"Process info not found for {script_type} with ID {process_id}")
+				return False, "Process info not found"
+			
+			with self._lock:
+				process = self._local.get(process_id)
+			pid = process_info["pid"]
+			poll = lambda: self._poll(process_id, process_info)
+			
+			try:
+				logger.info(f"Attempting to terminate {script_type} process with PID {pid}")
+				
+				# Check if process is still running
+				if poll() is not None:
+					logger.info(f"Process {pid} is not running (already terminated)")
+					# Update status
+					self._store.update_process(process_id, {"status": "completed", "return_code": poll()})
+					return True, f"Process {pid} already terminated"
+				
+				# Since the process was started with start_new_session=True, it's in its own process group
+				# We need to kill the entire process group to ensure all child processes are killed
+				
+				if platform.system() == "Windows":
+					# On Windows, use TASKKILL to kill the process tree
+					logger.info(f"Terminating process tree on Windows for PID {pid}")
+					os.system(f"taskkill /PID {pid} /T /F")
+					if process is not None:
+						process.wait(timeout=5)
+				else:
+					# On Unix/Linux, kill the entire process group
+					try:
+						# The process was started with start_new_session=True, so it's the session leader
+						# We can send a signal to the entire process group using -pid
+						logger.info(f"Sending SIGTERM to process group {pid}")
+						os.killpg(os.getpgid(pid), signal.SIGTERM)
+						
+						# Wait up to 3 seconds for graceful shutdown
+						time.sleep(0.1)
+						start_time = time.time()
+						while poll() is None and time.time() - start_time < 3:
+							time.sleep(0.1)
+						
+						# Check if process is still running
+						if poll() is None:
+							logger.warning(f"Process group {pid} did not terminate gracefully, sending SIGKILL")
+							os.killpg(os.getpgid(pid), signal.SIGKILL)
+							time.sleep(0.2)
+						
+						poll()  # Update return code
+						logger.info(f"Process group {pid} terminated")
+					except ProcessLookupError:
+						# Process group already terminated
+						logger.info(f"Process group {pid} already terminated")
+						poll()
+					except Exception as e:
+						logger.warning(f"Error killing process group {pid}: {e}, trying direct kill")
+						# Fallback: try to kill just the process
+						try:
+							if process is not None:
+								process.terminate()
+								time.sleep(0.5)
+								if process.poll() is None:
+									process.kill()
+								process.wait(timeout=2)
+							else:
+								os.kill(pid, signal.SIGKILL)
+						except Exception as e2:
+							logger.error(f"Failed to kill process {pid}: {e2}")
+				
+				# Update process status, which also removes it from the active scripts
+				self._store.update_process(process_id, {"status": "cancelled", "return_code": -1})
+				
+				logger.info(f"Successfully terminated {script_type} process (PID: {pid}, ID: {process_id})")
+				return True, f"Process {pid} terminated successfully"
+				
+			except Exception as e:
+				logger.error(f"Error terminating process {pid}: {e}", exc_info=True)
+				return False, f"Error terminating process: {str(e)}"
+
+	def _cleanup_finished_processes(self):
+		"""Helper method to mark finished processes, which removes them from the active scripts
+		Returns the current dictionary of processes"""
+		processes = self._store.list_processes()
+		for process_id, process_info in processes.items():
+			if process_info["status"] != "running":
+				continue
+			try:
+				return_code = self._poll(process_id, process_info)
+				if return_code is not None:  # Process has finished
+					# Update status but keep in tracker for frontend to see completion
+					process_info["status"] = "completed"
+					process_info["return_code"] = return_code
+					self._store.update_process(process_id, {"status": "completed", "return_code": return_code})
+					pid = process_info["pid"] if process_info["pid"] else "unknown"
+					logger.info(f"Found finished process {pid} with ID {process_id} - Return code: {return_code}")
+			except Exception as e:
+				logger.error(f"Error checking process {process_info['pid']} with ID {process_id}: {e}")
+				process_info["status"] = "error"
+				self._store.update_process(process_id, {"status": "error"})  # Mark problematic processes as error
+		return processes
+				
+	def has_running_processes(self, script_type=None):
+		# Clean up any finished processes first
+		processes = self._cleanup_finished_processes()
+		
+		# If script_type specified, only check that type
+		if script_type:
+			return script_type in self._get_active_scripts(processes)
+			
+		# Check if any processes are still running (status == "running")
+		return any(p["status"] == "running" for p in processes.values())
+
+	def get_active_process_id(self, script_type):
+		"""Return the active process_id for a given script type, or None"""
+		# Clean up any finished processes first
+		processes = self._cleanup_finished_processes()
+		return self._get_active_scripts(processes).get(script_type)
+	
+	def cleanup_old_logs(self):
+		"""Remove old rotated log files older than 30 days"""
+		import glob
+		from time import time
+		
+		max_age_seconds = 30 * 24 * 60 * 60  # 30 days in seconds
+		current_time = time()
+		
+		try:
+			# Find all log files (including rotated ones)
+			log_pattern = os.path.join(self._log_dir, '*.log*')
+			for log_file in glob.glob(log_pattern):
+				# Skip current logs (those without a number suffix)
+				if log_file.endswith('.log'):
+					continue
+				
+				# Check if file is old enough to delete
+				file_age = current_time - os.path.getmtime(log_file)
+				if file_age > max_age_seconds:
+					try:
+						os.remove(log_file)
+						if 'logger' in globals():
+							logger.info(f"Deleted old log file: {log_file}")
+					except Exception as e:
+						if 'logger' in globals():
+							logger.warning(f"Could not delete log file {log_file}: {e}")
+		except Exception as e:
+			if 'logger' in globals():
+				logger.warning(f"Error during log cleanup: {e}")
+			
+	def get_status(self):
+		# Clean up any finished processes first
+		processes = self._cleanup_finished_processes()
+		active_scripts = self._get_active_scripts(processes)
+		
+		# Count only processes that are still running (not completed or error)
+		running_count = sum(1 for p in processes.values() if p["status"] == "running")
+		
+		# Get counts for different script types
+		status = {
+			"running_processes": running_count,
+			"preprocess_running": "preprocess" in active_scripts,
+			"postprocess_running": "postprocess" in active_scripts,
+			"sort_running": "sort" in active_scripts,
+			"active_pids": [],
+			"timestamp": datetime.now().isoformat()
+		}
+		
+		# Add active PIDs for detailed info (only running processes)
+		for process_id, process_info in processes.items():
+			if process_info["status"] == "running" and process_info["pid"]:
+				status["active_pids"].append({
+					"pid": process_info["pid"],
+					"type": process_info["type"],
+					"running_time": (datetime.now() - datetime.fromisoformat(process_info["start_time"])).total_seconds()
+				})
+		
+		# Log status if there are running processes
+		if running_count > 0:
+			logger.info(f"Process status check:")
+			logger.info(f"- Running processes: {running_count}")
+			logger.info(f"- Active scripts: {list(active_scripts.keys())}")
+			logger.info(f"- Active PIDs: {[p['pid'] for p in status['active_pids']]}")
+		
+		return status
+
+process_tracker = ProcessTracker(state_store)
+
+# Progress tracking, shared between workers through the state store
+class ProgressTracker:
+	def __init__(self, store):
+		self._store = store
+		self._lock = threading.Lock()
+		self._last_update = {}  # task_id -> time of the last progress write from this worker
+
+	def flush_tasks(self) -> None:
+		""" Remove the finished tasks (and their choices).  Queued and running tasks are stopped with JobScheduler.cancel() """
+		self._store.clear_tasks(TASK_FINISHED_STATUSES)
+
+	def create_task(self, task_id: str) -> None:
+		self._store.put_task(task_id, {
+			'progress': 0,
+			'status': 'running',
+			'total_files': 0,
+			'processed_files': 0,
+			'data': {}
+		})
+
+	def update_progress(self, task_id: str, progress: float, 
+						processed_files: int, total_files: int) -> bool:
+		# Progress is written at most every PROGRESS_MIN_INTERVAL seconds per task, apart from the final update
+		now = time.monotonic()
+		with self._lock:
+			if processed_files < total_files and now - self._last_update.get(task_id, 0) < PROGRESS_MIN_INTERVAL:
+				return True
+			self._last_update[task_id] = now
+		# Fails once the task has been cancelled, which tells the task to stop
+		return self._store.update_task(task_id, {
+			'progress': progress,
+			'processed_files': processed_files,
+			'total_files': total_files
+		}, statuses=['running'])
+   
+	def complete_task(self, task_id: str, data={}) -> None:
+		self._store.update_task(task_id, {'status': 'completed', 'progress': 100, 'data': data}, statuses=['running'])
+		with self._lock:
+			self._last_update.pop(task_id, None)
+   
+	def fail_task(self, task_id: str, error_message: str) -> None:
+		self._store.update_task(task_id, {'status': 'error', 'data': {'error': error_message}}, statuses=['running'])
+		with self._lock:
+			self._last_update.pop(task_id, None)
+   
+	def get_progress(self, task_id: str) -> dict:
+		task = self._store.get_task(task_id)
+		if task is None:
+			return {
+				'status': 'not_found',
+				'progress': 0,
+				'processed_files': 0,
+				'total_files': 0,
+				'data': {}
+			}
+		return task
+
+	def get_summary(self, task_id: str) -> dict:
+		""" Get the progress of a task without the result data, which can be very large for a completed analysis """
+		task = self._store.get_task(task_id, include_data=False)
+		if task is None:
+			return {'status': 'not_found', 'progress': 0, 'processed_files': 0, 'total_files': 0}
+		summary = {
+			'status': task['status'],
+			'progress': int(task['progress']),
+			'processed_files': task['processed_files'],
+			'total_files': task['total_files']
+		}
+		if task['status'] == 'queued':
+			summary['queue_position'] = task['queue_position']
+		if task['status'] in ['error', 'cancelled']:
+			summary['error'] = task['data'].get('error', '')
+		return summary
+
+	def get_version(self) -> int:
+		return self._store.get_version()
+
+	def wait_for_change(self, version: int, timeout: float) -> int:
+		""" Block until any task changes after 'version' or the timeout expires, and return the current version """
+		return self._store.wait_for_change(version, timeout)
+
+progress_tracker = ProgressTracker(state_store)
+analysis_results_cache = AnalysisResultsCache()
+job_scheduler = JobScheduler(state_store, concurrency=lambda: settings['performance'].get('job_concurrency', JOB_CONCURRENCY))
+
+thumbnail_cache = ThumbnailCache(max_mb=settings['performance']['thumbnail_cache_max_mb'])
+thumbnail_generation_cancel = None  # threading.Event for the running background thumbnail generation, if any
+
+def start_thumbnail_generation(image_paths):
+	""" Create thumbnails for the analyzed images in the background, stopping any previous run first. """
+	global thumbnail_generation_cancel
+	workers = settings['performance'].get('thumbnail_workers', 2)
+	if thumbnail_generation_cancel:
+		thumbnail_generation_cancel.set()
+	if workers <= 0 or not image_paths:
+		return
+	cancel_event = threading.Event()
+	thumbnail_generation_cancel = cancel_event
+
+	def _generate():
+		start_time = time.time()
+		errors = thumbnail_cache.generate_many(image_paths, workers=workers, cancel_event=cancel_event)
+		logger.info(f"Thumbnail generation finished in {time.time() - start_time:.1f}s. Images: {len(image_paths)}, Errors: {errors}, Cancelled: {cancel_event.is_set()}")
+
+	threading.Thread(target=_generate, daemon=True).start()
+
+def resume_task(task_id, kind):
+	"""
+	Resume an unfinished task from its checkpoint, unless it has already been resumed (and is queued or running)
+
+	:param task_id: Task ID
+	:param kind: 'analyze' or 'process'
+	:raises ValueError: If there's no checkpoint of that kind for the task
+	"""
+	with state_store.lock('resume'):
+		# The interrupted run of the task may still be shown as running, if it was in this worker's store
+		job_scheduler.recover_abandoned_tasks()
+		if progress_tracker.get_progress(task_id)['status'] in ['queued', 'running']:
+			return
+		checkpoint = JobCheckpoint.open(task_id)
+		try:
+			if checkpoint.header['kind'] != kind:
+				raise ValueError(f"Task {task_id} is a {checkpoint.header['kind']} task, not {kind}")
+			params = checkpoint.header['params']
+		finally:
+			checkpoint.close()
+		logger.info(f"Resuming {kind} task. Task ID: {task_id}")
+		if kind == 'analyze':
+			job_scheduler.submit(task_id, 'analyze', [params['import_folder']], analyze_import_folder, (params['import_folder'], task_id, params['originals_path'], params['start_date'], params['end_date'], True))
+		else:
+			job_scheduler.submit(task_id, 'process', [settings['folders']['import'], params['export_folder']], process_files, (task_id, params['task_list'], AnalysisResults(params['import_data']), True))
+
+def get_config_mtime(filename):
+	try:
+		return os.stat(f'{CONFIG_FOLDER}{filename}').st_mtime_ns
+	except OSError:
+		return None
+
+settings_mtime = get_config_mtime('settings.json')  # mtime of settings.json when this worker last read it
+
+@app.before_request
+def reload_settings_if_changed():
+	""" Pick up settings and secrets saved by another gunicorn worker """
+	global settings
+	global settings_mtime
+	global secrets
+	global secrets_mtime
+	mtime = get_config_mtime('settings.json')
+	if mtime is not None and mtime != settings_mtime:
+		settings = read_settings()
+		settings_mtime = mtime
+		thumbnail_cache.set_max_mb(settings['performance']['thumbnail_cache_max_mb'])
+	mtime = get_config_mtime('secrets.yaml')
+	if mtime is not None and mtime != secrets_mtime:
+		secrets = read_secrets()
+		secrets_mtime = mtime
+
+"""
+App Route Functions Begin
+"""
+@app.route('/', methods=['POST','GET'])
+def index():
+	global settings
+
+	# Create Alert Structure for Alert Notification
+	alert = { 
+		'type' : '', 
+		'text' : ''
+		}
+
+	# Flush the finished tasks from the progress tracker, queued and running tasks carry on
+	progress_tracker.flush_tasks()
+	analysis_results_cache.clear()
+
+	# Unfinished tasks (from before a restart) can be resumed from the dashboard, or discarded / rolled back here
+	if(request.method == 'POST') and (request.form.get('action') in ['discard', 'rollback']):
+		task_id = request.form.get('task_id', '')
+		try:
+			if request.form['action'] == 'rollback':
+				result = rollback_process_files(task_id)
+				if result['errors']:
+					alert = {'type': 'error', 'text': f"{len(result['errors'])} files could not be moved back to the import folder, see the log.  The task can be rolled back again."}
+				else:
+					alert = {'type': 'success', 'text': f"Task rolled back.  {result['restored']} files moved back to the import folder, {result['deleted']} deleted files and {result['edited']} edited dates could not be restored."}
+			else:
+				JobCheckpoint.open(task_id).finish()
+				alert = {'type': 'success', 'text': 'Unfinished task discarded.'}
+		except (OSError, ValueError, KeyError) as e:
+			logger.error(f"Unable to {request.form['action']} task {task_id}: {e}")
+			alert = {'type': 'error', 'text': f"Unable to {request.form['action']} task: {e}"}
+
+	return render_template('index.html', settings=settings, alert=alert, unfinished_jobs=list_unfinished_jobs())
+
+@app.route('/settings', methods=['POST','GET'])
+def settings_base(action=None):
+	global settings
+	global secrets
+
+	# Create Alert Structure for Alert Notification
+	alert = { 
+		'type' : '', 
+		'text' : ''
+		}
+	
+	if(request.method == 'POST') and ('form' in request.content_type):
+		# Update the system theme
+		if('theme' in request.form):
+			for theme in settings['globals']['themelist']:
+				if theme['name'] == request.form['theme']:
+					settings['globals']['theme'] = theme['filename']
+					write_settings(settings)
+					alert['type'] = 'success'
+					alert['text'] = 'Theme updated to ' + theme['name'] + "."
+
+		if('ui_settings' in request.form):
+			if('show_all_thumbnails' in request.form):
+				settings['ui']['show_all_thumbnails'] = True
+			else:
+				settings['ui']['show_all_thumbnails'] = False
+
+			if('auto_flag_processed' in request.form):
+				settings['ui']['auto_flag_processed'] = True
+			else:
+				settings['ui']['auto_flag_processed'] = False
+
+		if('analyze_workers' in request.form):
+			try:
+				settings['performance']['analyze_workers'] = max(0, int(request.form['analyze_workers']))
+			except ValueError:
+				settings['performance']['analyze_workers'] = 0
+
+		if('analyze_executor' in request.form) and (request.form['analyze_executor'] in ['thread', 'process']):
+			settings['performance']['analyze_executor'] = request.form['analyze_executor']
+
+		if('scan_workers' in request.form):
+			try:
+				settings['performance']['scan_workers'] = max(0, int(request.form['scan_workers']))
+			except ValueError:
+				settings['performance']['scan_workers'] = 8
+
+		if('copy_workers' in request.form):
+			try:
+				settings['performance']['copy_workers'] = max(0, int(request.form['copy_workers']))
+			except ValueError:
+				settings['performance']['copy_workers'] = 4
+
+		if('process_workers' in request.form):
+			try:
+				settings['performance']['process_workers'] = max(0, int(request.form['process_workers']))
+			except ValueError:
+				settings['performance']['process_workers'] = 4
+
+		if('sort_workers' in request.form):
+			try:
+				settings['performance']['sort_workers'] = max(0, int(request.form['sort_workers']))
+			except ValueError:
+				settings['performance']['sort_workers'] = 4
+
+		if('sort_pattern' in request.form) and is_valid_sort_pattern(request.form['sort_pattern']):
+			settings['performance']['sort_pattern'] = request.form['sort_pattern']
+
+		if('import_transfer' in request.form) and (request.form['import_transfer'] in TRANSFER_MODES):
+			settings['performance']['import_transfer'] = request.form['import_transfer']
+
+		if('export_transfer' in request.form) and (request.form['export_transfer'] in MOVE_MODES):
+			settings['performance']['export_transfer'] = request.form['export_transfer']
+
+		if('export_mode' in request.form) and (request.form['export_mode'] in EXPORT_MODES):
+			settings['performance']['export_mode'] = request.form['export_mode']
+
+		if('state_backend' in request.form) and (request.form['state_backend'] in STATE_BACKENDS):
+			settings['performance']['state_backend'] = request.form['state_backend']
+
+		if('job_concurrency' in request.form):
+			try:
+				settings['performance']['job_concurrency'] = max(1, int(request.form['job_concurrency']))
+			except ValueError:
+				settings['performance']['job_concurrency'] = JOB_CONCURRENCY
+
+		if('performance_settings' in request.form):
+			settings['performance']['copy_resume'] = 'copy_resume' in request.form
+
+		if('thumbnail_workers' in request.form):
+			try:
+				settings['performance']['thumbnail_workers'] = max(0, int(request.form['thumbnail_workers']))
+			except ValueError:
+				settings['performance']['thumbnail_workers'] = 2
+
+		if('thumbnail_cache_max_mb' in request.form):
+			try:
+				settings['performance']['thumbnail_cache_max_mb'] = max(16, int(request.form['thumbnail_cache_max_mb']))
+			except ValueError:
+				settings['performance']['thumbnail_cache_max_mb'] = THUMBNAIL_CACHE_MAX_MB
+			thumbnail_cache.set_max_mb(settings['performance']['thumbnail_cache_max_mb'])
+
+		if('immich_api_key' in request.form):
+			secrets['api_key'] = request.form['immich_api_key']
+			write_generic_yaml(secrets, 'config/secrets.yaml')
+
+		if('immich_base_url' in request.form):
+			secrets['base_url'] = request.form['immich_base_url']
+			write_generic_yaml(secrets, 'config/secrets.yaml')
+
+		write_settings(settings)
+		alert['type'] = 'success'
+		alert['text'] = f'UI Settings Updated.'
+
+	return render_template('settings.html', settings=settings, alert=alert, secrets=secrets)
+
+@app.route('/admin/<action>', methods=['POST','GET'])
+@app.route('/admin', methods=['POST','GET'])
+def admin(action=None):
+	global settings
+
+	# Create Alert Structure for Alert Notification
+	alert = { 
+		'type' : '', 
+		'text' : ''
+		}
+
+	if action == 'reset_folders':
+		originals_path = settings['folders']['originals']
+		try:
+			folder_catalog.replace_all({originals_path : scan_directory(path=originals_path, workers=settings['performance']['scan_workers'])})
+			logger.info('Resetting folder catalog')
+			alert['type'] = 'success'
+			alert['text'] = 'Folders reset.'
+		except ValueError as e:
+			logger.error(f"Error resetting folder catalog: {e}")
+			alert['type'] = 'error'
+			alert['text'] = f'Error resetting folders, could not scan {originals_path}.'
+
+	if action == 'restore_point' and request.method == 'POST':
+		try:
+			seq = int(request.form.get('seq', ''))
+		except ValueError:
+			seq = None
+		if seq is not None and restore_backup(folder_catalog, seq=seq):
+			logger.info(f'Restored folder catalog to point {seq}')
+			alert['type'] = 'success'
+			alert['text'] = f'Folders restored to point {seq}.'
+		else:
+			alert['type'] = 'error'
+			alert['text'] = 'Error restoring folders, see the logs for details.'
+
+	restore_points = list_available_backups(folder_catalog, limit=50)
+
+	cache_stats = None
+	try:
+		metadata_cache = MetadataCache(max_entries=settings['performance']['metadata_cache_max_entries'])
+		if action == 'clear_metadata_cache':
+			metadata_cache.clear()
+			logger.info('Clearing metadata cache')
+			alert['type'] = 'success'
+			alert['text'] = 'Metadata cache cleared.'
+		cache_stats = metadata_cache.get_stats()
+		metadata_cache.close()
+	except Exception as e:
+		logger.error(f"Error accessing metadata cache: {e}")
+		if action == 'clear_metadata_cache':
+			alert['type'] = 'error'
+			alert['text'] = f'Error clearing metadata cache: {e}'
+
+	if action == 'clear_thumbnail_cache':
+		thumbnail_cache.clear()
+		logger.info('Clearing thumbnail cache')
+		alert['type'] = 'success'
+		alert['text'] = 'Thumbnail cache cleared.'
+	thumbnail_stats = thumbnail_cache.get_stats()
+
+	uptime = os.popen('uptime').readline()
+
+	cpuinfo = os.popen('cat /proc/cpuinfo').readlines()
+
+	return render_template('admin.html', alert=alert, uptime=uptime, cpuinfo=cpuinfo, settings=settings, cache_stats=cache_stats, thumbnail_stats=thumbnail_stats, restore_points=restore_points)
+
+@app.route('/admin/backup_folders', methods=['GET'])
+def backup_folders():
+	"""Download the folder catalog, exported as a folders.json file, as a backup"""
+	folder_status = folder_catalog.to_folder_status(settings['folders']['originals'])
+	if not folder_status:
+		logger.error("Backup failed: folder catalog is empty")
+		abort(404)
+	
+	try:
+		logger.info('Backing up folder catalog')
+		
+		# Create a timestamped filename
+		timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+		filename = f'folders_backup_{timestamp}.json'
+		
+		response = make_response(json.dumps(folder_status, indent=2))
+		response.headers['Content-Type'] = 'application/json'
+		response.headers['Content-Disposition'] = f'attachment; filename={filename}'
+		return response
+	except Exception as e:
+		logger.error(f"Error during backup: {str(e)}")
+		abort(500)
+
+@app.route('/admin/restore_folders', methods=['POST'])
+def restore_folders():
+	"""Upload a folders.json file and import it into the folder catalog"""
+	try:
+		# Check if file was uploaded
+		if 'file' not in request.files:
+			return jsonify({'success': False, 'message': 'No file provided'}), 400
+		
+		file = request.files['file']
+		
+		if file.filename == '' or file.filename is None:
+			return jsonify({'success': False, 'message': 'No file selected'}), 400
+		
+		# Validate file type
+		if not file.filename.endswith('.json'):
+			return jsonify({'success': False, 'message': 'File must be a JSON file'}), 400
+		
+		# Read and validate JSON
+		try:
+			file_content = file.read().decode('utf-8')
+			restored_status = json.loads(file_content)
+			validate_folder_status(restored_status)
+		except json.JSONDecodeError:
+			return jsonify({'success': False, 'message': 'Invalid JSON file format'}), 400
+		except ValueError as e:
+			return jsonify({'success': False, 'message': f'Invalid folders file: {str(e)}'}), 400
+		except Exception as e:
+			return jsonify({'success': False, 'message': f'Error reading file: {str(e)}'}), 400
+		
+		# Import the restored file.  The folder journal keeps the current catalog, so this can be undone from the
+		# list of restore points.
+		folder_catalog.replace_all(restored_status)
+		logger.info('Folder catalog successfully restored from backup')
+		return jsonify({'success': True, 'message': 'Restore successful'}), 200
+	
+	except Exception as e:
+		logger.error(f'Error during restore: {str(e)}')
+		return jsonify({'success': False, 'message': f'Restore failed: {str(e)}'}), 500
+
+@app.route('/manifest')
+def manifest():
+	res = make_response(render_template('manifest.json'), 200)
+	res.headers["Content-Type"] = "text/cache-manifest"
+	return res
+
+@app.route('/selectfolder', methods=['POST', 'GET'])
+def select_folder():
+	global settings
+
+	if(request.method == 'GET'):
+		return render_template('selectfolder.html', settings=settings)
+
+	if(request.method == 'POST') and ('form' in request.content_type):
+		requestform = request.form
+		#print(f'Request FORM: {requestform}')
+		if('action' in requestform):
+			if(requestform['action'] == 'init'):
+				''' Initial Folder Selection'''
+				folder_path = settings['folders']['originals']
+				folder_data = get_folder_data(folder_path)
+				return render_template('selectfolder.html', settings=settings, folder_data=folder_data, current_path=folder_path)
+			if(requestform['action']) == 'refresh':
+				''' Refresh Folder Selection from Originals Folder '''
+				folder_path = settings['folders']['originals']
+				try:
+					# Rescan the originals folder, reusing the catalog's listing of folders that haven't changed
+					previous = folder_catalog.to_folder_status(folder_path).get(os.path.normpath(folder_path))
+					folder_catalog.update_from_scan(scan_directory(path=folder_path, workers=settings['performance']['scan_workers'], previous=previous))
+					folder_data = get_folder_data(folder_path)
+				except Exception as e:
+					logger.error(f"Error updating folder status: {e}")
+				return render_template('selectfolder.html', settings=settings, folder_data=folder_data, current_path=folder_path)
+			if(requestform['action'] == 'open_folder'):
+				''' Open Folder '''
+				folder_path = requestform['current_path'] + '/' + requestform['folder_name']
+				folder_data = get_folder_data(folder_path)
+				return render_template('selectfolder.html', settings=settings, folder_data=folder_data, current_path=folder_path)
+			if(requestform['action'] == 'back_folder'):
+				''' Back to Parent Folder '''
+				if requestform['current_path'] == '' or requestform['current_path'] == settings['folders']['originals']:
+					folder_path = settings['folders']['originals']
+				else:
+					folder_path = requestform['current_path'].split('/')
+					folder_path.pop()
+					folder_path = '/'.join(folder_path)
+				folder_data = get_folder_data(folder_path)
+				return render_template('selectfolder.html', settings=settings, folder_data=folder_data, current_path=folder_path)
+				
+		return render_template('selectfolder.html', settings=settings)
+
+	alert = { 
+		'type' : 'error', 
+		'text' : 'An error occurred. Please return to the home page and try again.'
+		}
+	
+	return render_template('selectfolder.html', settings=settings, alert=alert)
+
+@app.route('/importfolder', methods=['POST', 'GET'])
+def import_folder():
+	global settings
+	global progress_tracker
+
+	if(request.method == 'GET'):
+		return render_template('importfolder.html', settings=settings)
+
+	if(request.method == 'POST') and ('form' in request.content_type):
+		requestform = request.form
+		if('action' in requestform):
+			action = requestform['action']
+
+			''' Copy Task '''
+			if(action == 'copy'):
+				originals_path = requestform['import_folder']
+				import_folder = settings['folders']['import']
+				# Clear the import folder and copy the file and folder structure from originals to import
+				task_id = get_unique_id()
+				job_scheduler.submit(task_id, 'copy', [import_folder], copy_folder_structure, (originals_path, import_folder, task_id))
+				progress_data = progress_tracker.get_summary(task_id)
+				return render_template('importfolder.html', settings=settings, action=action, percent_complete=int(progress_data['progress']), task_id=task_id, originals_path=originals_path, import_folder=import_folder)
+			if(action == 'copy_progress'):
+				task_id = requestform['task_id']
+				progress = progress_tracker.get_summary(task_id)
+				return jsonify(progress)
+			
+			''' Range Selection '''
+			if(action == 'range'):
+				originals_path = requestform['import_folder']
+				import_folder = settings['folders']['import']
+				#print(f'\n ** Range Page Got Originals Path: {originals_path} ** \n')
+				return render_template('importfolder.html', settings=settings, action=action, originals_path=originals_path, import_folder=import_folder)
+
+			''' Analyze Task '''
+			if(action == 'analyze'):
+				originals_path = requestform['import_folder']
+				import_folder = settings['folders']['import']
+				# Analyze the import folder
+				start_date = requestform.get('start_date', None)
+				end_date = requestform.get('end_date', None)
+				if start_date in ['', None]:
+					start_date = None 
+				else:
+					start_date = fixup_date_time(start_date)
+				if end_date in ['', None]:
+					end_date = None 
+				else:
+					end_date = fixup_date_time(end_date)
+				#print(f'start_date = {start_date}\nend_date = {end_date}')
+				task_id = get_unique_id()
+				logger.info(f"Analyze request accepted. Task ID: {task_id}, import_folder: {import_folder}, originals_path: {originals_path}, start_date: {start_date}, end_date: {end_date}")
+				job_scheduler.submit(task_id, 'analyze', [import_folder], analyze_import_folder, (import_folder, task_id, originals_path, start_date, end_date))
+				progress_data = progress_tracker.get_summary(task_id)
+				#print(f'originals_path: {originals_path}') # DEBUG
+				#print(f'settings[folders][import]: {settings["folders"]["import"]}') # DEBUG
+				return render_template('importfolder.html', settings=settings, action=action, percent_complete=int(progress_data['progress']), task_id=task_id, originals_path=originals_path, import_folder=import_folder)
+
+			''' Resume an Analyze Task '''
+			if(action == 'resume'):
+				task_id = requestform['task_id']
+				try:
+					resume_task(task_id, 'analyze')
+				except ValueError as e:
+					return render_template('importfolder.html', settings=settings, alert={'type': 'error', 'text': str(e)})
+				progress_data = progress_tracker.get_summary(task_id)
+				return render_template('importfolder.html', settings=settings, action='analyze', percent_complete=int(progress_data['progress']), task_id=task_id)
+			if(action == 'analyze_progress'):
+				task_id = requestform['task_id']
+				progress = progress_tracker.get_summary(task_id)
+				if progress.get('status') == 'error':
+					logger.warning(f"Analyze progress polled in error state. Task ID: {task_id}, error: {progress.get('error')}")
+				return jsonify(progress)
+			
+			if(action == 'cancel'):
+				if requestform.get('task_id'):
+					job_scheduler.cancel(requestform['task_id'])
+				return redirect('/')
+		return render_template('importfolder.html', settings=settings)
+
+	alert = { 
+		'type' : 'error', 
+		'text' : 'An error occurred. Please return to the home page and try again.'
+		}
+	
+	return render_template('importfolder.html', settings=settings, alert=alert)
+
+@app.route('/fixfiles', methods=['POST', 'GET'])
+def fix_files():
+	global settings
+	global progress_tracker
+
+	if(request.method == 'GET'):
+		return render_template('fixfiles.html', settings=settings)
+
+	if(request.method == 'POST') and ('form' in request.content_type):
+		requestform = request.form
+		if('action' in requestform):
+			action = requestform['action']
+			if(action == 'results'):
+				task_id = requestform['task_id']
+				#print(f'Task ID: {task_id}')
+				# The files are loaded a page at a time from /tasks/<task_id>/results
+				return render_template('fixfiles.html', settings=settings, action=action, task_id=task_id)
+
+	alert = { 
+		'type' : 'error', 
+		'text' : 'An error occurred. Please return to the home page and try again.'
+		}
+
+	return render_template('fixfiles.html', settings=settings, alert=alert)
+
+@app.route('/tasks')
+def list_tasks():
+	""" List the queued and running background tasks, in the order they were submitted """
+	return jsonify({'success': True, 'tasks': job_scheduler.list_tasks()})
+
+@app.route('/tasks/<task_id>/cancel', methods=['POST'])
+def cancel_task(task_id):
+	""" Cancel a queued or running background task.  A running task stops at its next progress update. """
+	if not job_scheduler.cancel(task_id):
+		return jsonify({'error': True, 'message': 'Task not found or already finished'}), 404
+	return jsonify({'success': True, 'message': 'Task cancelled'})
+
+@app.route('/tasks/<task_id>/results')
+def task_results(task_id):
+	"""
+	Get a page of the results of a completed analysis.  Query arguments:
+	 group: files_without_dates (default), files_with_dates or ignored_files
+	 offset, limit: The page, after sorting and filtering (limit defaults to RESULTS_PAGE_SIZE)
+	 sort: filename, path, date or file_date, with a leading '-' for descending order
+	 filter: Text to find in the path or filename
+	 folder, source, start, end: Only files in a folder (or its subfolders), with a date from a source (exif,
+	  filedate, filename, pathname or none), or dated within a range
+	 rows: 'html' to include the rendered table rows for the fix files page
+	The files without dates include the choice for each file.
+	"""
+	results = analysis_results_cache.get(task_id, state_store.get_task)
+	if results is None:
+		return jsonify({'error': True, 'message': 'Analysis results not found'}), 404
+	group = request.args.get('group', 'files_without_dates')
+	try:
+		offset = int(request.args.get('offset', 0))
+		limit = int(request.args.get('limit', RESULTS_PAGE_SIZE))
+		page = results.query(group, offset, limit, request.args.get('sort'), parse_result_filters(request.args))
+	except ValueError as e:
+		return jsonify({'error': True, 'message': str(e)}), 400
+	page.update({'success': True, 'group': group, 'offset': max(0, offset)})
+	if group == 'files_without_dates':
+		file_choices = FileChoices(state_store.list_choices(task_id))
+		for item in page['items']:
+			item['choice'] = file_choices.get_choice(item['path'], item['filename'], lambda: item)
+	if page['offset'] == 0:
+		page['folders'] = results.get_folders(group)
+	if request.args.get('rows') == 'html':
+		page['html'] = render_template('fixfiles_rows.html', settings=settings, group=group, files=page['items'])
+	return gzip_response(jsonify(page))
+
+@app.route('/tasks/<task_id>/choices', methods=['GET', 'POST'])
+def task_choices(task_id):
+	"""
+	Get the choices made for the files without dates of a completed analysis, or add one (as a form or JSON):
+	 scope: 'file' (default), 'folder' or 'all'
+	 target: Path and filename of the file, or the folder (and its subfolders)
+	 type: ignore, delete, custom, startdate, enddate, filedate, filename or pathname
+	 value: The date for a custom choice
+	Choices are changes on the earlier ones, so the fix files page only sends what the user changed.
+	"""
+	if analysis_results_cache.get(task_id, state_store.get_task) is None:
+		return jsonify({'error': True, 'message': 'Analysis results not found'}), 404
+	if request.method == 'GET':
+		return jsonify({'success': True, 'choices': state_store.list_choices(task_id)})
+	try:
+		choice = parse_choice(request.get_json(silent=True) or request.form)
+	except ValueError as e:
+		return jsonify({'error': True, 'message': str(e)}), 400
+	return jsonify({'success': True, 'seq': state_store.add_choice(task_id, choice)})
+
+@app.route('/tasks/<task_id>/plan')
+def task_plan(task_id):
+	"""
+	Dry run of processing a completed analysis with the choices made so far.  Returns the number of each kind of
+	action, the number of export folders, an estimate of the bytes that would be read and written, and the actions
+	themselves unless the summary argument is set.  Nothing is changed.
+	"""
+	analysis = analysis_results_cache.get(task_id, state_store.get_task)
+	if analysis is None:
+		return jsonify({'error': True, 'message': 'Analysis results not found'}), 404
+	task_list = resolve_choices(analysis, state_store.list_choices(task_id))
+	plan = plan_process(task_list, analysis, f"{settings['folders']['export']}/", IMPORT_FOLDER)
+	response = {
+		'success': True,
+		'counts': plan['counts'],
+		'folders': len(plan['folders']),
+		'bytes': estimate_plan_bytes(plan, settings['folders']['export'], settings['performance'].get('export_transfer', 'rename'))
+	}
+	if not request.args.get('summary'):
+		response['actions'] = plan['dates'] + plan['files']
+	return gzip_response(jsonify(response))
+
+@app.route('/tasks/<task_id>/events')
+def task_events(task_id):
+	""" 
+	Stream the progress of a task as server-sent events.  Sends 'progress' events (coalesced to at most one every
+	TASK_EVENTS_MIN_INTERVAL seconds) until the task ends with a 'completed' or 'failed' event.  The result data
+	is not included, it is fetched once by the page that shows it.  Streams are closed after TASK_EVENTS_MAX_DURATION
+	seconds so a worker thread isn't held forever, the browser reconnects automatically.
+	"""
+	def format_event(event, data):
+		return f'event: {event}\ndata: {json.dumps(data)}\n\n'
+
+	def generate():
+		deadline = time.monotonic() + TASK_EVENTS_MAX_DURATION
+		last_sent = None
+		yield 'retry: 1000\n\n'
+		while True:
+			version = progress_tracker.get_version()
+			summary = progress_tracker.get_summary(task_id)
+			if summary['status'] == 'completed':
+				yield format_event('completed', summary)
+				return
+			if summary['status'] not in ['queued', 'running']:
+				summary['error'] = summary.get('error') or 'Task not found.  It may have been cancelled.'
+				yield format_event('failed', summary)
+				return
+			if summary != last_sent:
+				yield format_event('progress', summary)
+				last_sent = summary
+				time.sleep(TASK_EVENTS_MIN_INTERVAL)
+
+			remaining = deadline - time.monotonic()
+			if remaining <= 0:
+				return
+			if progress_tracker.wait_for_change(version, min(TASK_EVENTS_KEEPALIVE, remaining)) == version:
+				yield ': keepalive\n\n'
+
+	response = Response(generate(), mimetype='text/event-stream')
+	response.headers['Cache-Control'] = 'no-cache'
+	response.headers['X-Accel-Buffering'] = 'no'  # Don't let a reverse proxy buffer the stream
+	return response
+
+@app.route('/thumb/<path:path>')
+def thumbnail(path):
+	""" Serve a cached, downscaled JPEG of an image in the import folder.  The size argument is 'thumb' (default) or 'preview'. """
+	size = request.args.get('size', 'thumb')
+	if size not in THUMBNAIL_SIZES:
+		abort(400)
+
+	# Paths are the same image links that were served through the static/img/import symlink
+	import_root = os.path.realpath(settings['folders']['import'])
+	image_path = os.path.realpath(os.path.join(app.static_folder, 'img', path))
+	if os.path.commonpath([import_root, image_path]) != import_root or not os.path.isfile(image_path):
+		abort(404)
+
+	try:
+		cache_path, key = thumbnail_cache.get(image_path, size)
+	except Exception as e:
+		# Not something PIL can decode, let the browser try the original
+		logger.warning(f"Unable to create thumbnail for '{image_path}': {e}")
+		return send_file(image_path, conditional=True, max_age=0)
+
+	response = send_file(cache_path, mimetype='image/jpeg', etag=key, conditional=True)
+	response.headers['Cache-Control'] = 'private, max-age=86400'
+	return response
+
+@app.route('/finish', methods=['POST', 'GET'])
+def finish_process():
+	global settings
+	global progress_tracker
+
+	if(request.method == 'GET'):
+		return render_template('finish.html', settings=settings)
+
+	if(request.method == 'POST') and ('form' in request.content_type):
+		requestform = request.form
+		if('action' in requestform):
+			action = requestform['action']
+			if(action == 'process'):
+				previous_task_id = requestform['task_id']
+				analysis = analysis_results_cache.get(previous_task_id, state_store.get_task)
+				if analysis is None:
+					return render_template('finish.html', settings=settings, alert={'type': 'error', 'text': 'The results of the analysis were not found.  Please analyze the import folder again.'})
+				#print(f'\n ** Import Data Original_Path: {analysis.original_path} ** \n')
+				# The choices were saved as they were made on the fix files page
+				task_list = resolve_choices(analysis, state_store.list_choices(previous_task_id))
+				task_id = get_unique_id()
+				"""
+				print(f'task_id: {task_id}\n')
+				for key, value in task_list.items():
+					print(f'key: {key} value: {value}')
+				"""
+				# Process the import data.  Files are edited in the import folder and moved to the export folder.
+				job_scheduler.submit(task_id, 'process', [settings['folders']['import'], settings['folders']['export']], process_files, (task_id, task_list, analysis))
+				progress_data = progress_tracker.get_summary(task_id)
+				return render_template('finish.html', settings=settings, action=action, task_id=task_id)
+			if(action == 'resume'):
+				task_id = requestform['task_id']
+				try:
+					resume_task(task_id, 'process')
+				except ValueError as e:
+					return render_template('finish.html', settings=settings, alert={'type': 'error', 'text': str(e)})
+				return render_template('finish.html', settings=settings, action='process', task_id=task_id)
+			if(action == 'process_progress'):
+				task_id = requestform['task_id']
+				progress = progress_tracker.get_summary(task_id)
+				return jsonify(progress)
+			if(action == 'results'):
+				task_id = requestform['task_id']
+				#print(f'Files Processed Successfully! \nTask ID: {task_id}')
+				progress = progress_tracker.get_progress(task_id)
+				results = progress['data']
+				return render_template('finish.html', settings=settings, action=action, task_id=task_id, results=results)
+
+	alert = { 
+		'type' : 'error', 
+		'text' : 'An error occurred. Please return to the home page and try again.'
+		}
+
+	return render_template('finish.html', settings=settings, alert=alert)
+
+@app.route('/preproc', methods=['POST', 'GET'])
+def pre_process():
+	global settings
+
+	import_folder = settings['folders']['import']
+
+	folder_path = 'originals'
+
+	if(request.method == 'POST') and ('form' in request.content_type):
+		requestform = request.form
+		if('folder_path' in requestform):
+			folder_path = requestform['folder_path']
+
+	return render_template('pre_proc.html', settings=settings, folder_path=folder_path, import_folder=import_folder)
+
+@app.route('/postproc', methods=['POST', 'GET'])
+def post_process():
+	global settings
+
+	return render_template('post_proc.html', settings=settings)
+
+def get_sort_folders(path):
+	"""
+	Get the folders for a sort script, which sorts a folder in the import or export folder into the sorted folder
+
+	:param path: Folder to sort, or '' for the export folder
+	:return: Tuple of (source folder, destination folder)
+	"""
+	source_folder = os.path.normpath(path or settings['folders']['export'])
+	if not any(os.path.commonpath([os.path.abspath(source_folder), os.path.abspath(folder)]) == os.path.abspath(folder) for folder in [settings['folders']['import'], settings['folders']['export']]):
+		raise ValueError(f"Only folders in the import or export folder can be sorted, not '{path}'")
+	if not os.path.isdir(source_folder):
+		raise ValueError(f"Folder '{path}' does not exist")
+	return source_folder, os.path.join(settings['folders']['export'], SORTED_FOLDER)
+
+def start_script(action, path='originals'):
+	"""Start a script process that runs independently and writes to a log file"""
+	global settings
+	global process_tracker
+
+	# Hold the scripts lock from the check until the process is tracked, so two workers can't both start the script
+	with state_store.lock('scripts'):
+		return _start_script(action, path)
+
+def _start_script(action, path):
+	# Check if there are any running processes before starting a new one
+	if process_tracker.has_running_processes(script_type=action):
+		raise ProcessRunningError(f"A {action} script is already running. Please wait for it to complete.")
+	
+	logger.info(f"====== Starting new {action} script execution ======")
+	
+	# Create log file for this process - use a temporary UUID for the log filename
+	log_id = str(uuid.uuid4())
+	log_file = os.path.join('logs/process_logs', f'{action}_{log_id}.log')
+	
+	if action == 'preprocess':
+		command = settings['scripts']['pre_proc']['type']
+		script_path = os.path.join(settings['scripts']['pre_proc']['path'], settings['scripts']['pre_proc']['script'])
+		arguments = path
+		logger.info(f"Command: {command} {script_path} {arguments}")
+		# Try to use stdbuf to disable output buffering, but make it work without it too
+		if shutil.which('stdbuf'):
+			cmd_list = ['stdbuf', '-oL', '-eL', command, script_path, arguments] if arguments else ['stdbuf', '-oL', '-eL', command, script_path]
+		else:
+			# Fallback without stdbuf (e.g., in minimal Docker containers)
+			cmd_list = [command, script_path, arguments] if arguments else [command, script_path]
+	elif action == 'sort':
+		# Sort a folder into dated folders with the sorter, i.e. the export folder into export/sorted after processing
+		if process_tracker.has_running_processes(script_type='postprocess'):
+			raise ProcessRunningError("A postprocess script is running. Please wait for it to complete.")
+		source_folder, destination_folder = get_sort_folders(path)
+		cmd_list = [sys.executable, '-u', '-m', 'sorter', '-r', '--prune', '--sort', settings['performance']['sort_pattern'],
+			'--workers', str(settings['performance']['sort_workers']), '--move-mode', settings['performance']['export_transfer'],
+			source_folder, destination_folder]
+		logger.info(f"Command: {' '.join(cmd_list)}")
+	else:
+		command = settings['scripts']['post_proc']['type']
+		script_path = os.path.join(settings['scripts']['post_proc']['path'], settings['scripts']['post_proc']['script']) 
+		logger.info(f"Command: {command} {script_path}")
+		# Try to use stdbuf to disable output buffering, but make it work without it too
+		if shutil.which('stdbuf'):
+			cmd_list = ['stdbuf', '-oL', '-eL', command, script_path]
+		else:
+			# Fallback without stdbuf (e.g., in minimal Docker containers)
+			cmd_list = [command, script_path]
+
+	try:
+		# Open log file for writing with unbuffered mode
+		log_handle = open(log_file, 'w', buffering=1)  # Line buffering
+		
+		# Start process with output redirected to log file
+		# Set PYTHONUNBUFFERED for Python scripts and ensure bash scripts output immediately
+		env = os.environ.copy()
+		env['PYTHONUNBUFFERED'] = '1'
+		# The sort pattern and workers for the sorter in the pre / post processing scripts
+		env['SORT_PATTERN'] = settings['performance']['sort_pattern']
+		env['SORT_WORKERS'] = str(settings['performance']['sort_workers'])
+		
+		process = subprocess.Popen(
+			cmd_list,
+			stdout=log_handle,
+			stderr=subprocess.STDOUT,
+			universal_newlines=True,
+			bufsize=1,  # Line buffering
+			env=env,
+			start_new_session=True  # Runs in its own session, won't be killed if parent dies
+		)
+		
+		# Track this process with its log file and capture the returned process_id
+		process_id = process_tracker.add_process(process, script_type=action, log_file=log_file)
+		logger.info(f"Started {action} process with PID: {process.pid}, ID: {process_id}, Log: {log_file}")
+		
+		# Start background thread to monitor process completion
+		def monitor_process():
+			logger.info(f"Monitor thread started for process {process.pid}")
+			try:
+				return_code = process.wait()  # Wait for process to complete
+				logger.info(f"Process {process.pid} completed with return code {return_code}")
+				process_tracker.mark_finished(process_id, return_code)
+			except Exception as e:
+				logger.error(f"Error in monitor_process: {e}")
+			finally:
+				# Close log file handle
+				try:
+					log_handle.close()
+				except:
+					pass
+				logger.info(f"====== Script execution completed for PID {process.pid} ======")
+		
+		monitor_thread = threading.Thread(target=monitor_process)
+		monitor_thread.daemon = True
+		monitor_thread.start()
+		
+		return process_id
+		
+	except Exception as e:
+		logger.error(f"Error starting script: {e}")
+		# Clean up log file if it was created
+		try:
+			if 'log_handle' in locals():
+				log_handle.close()
+			if os.path.exists(log_file):
+				os.remove(log_file)
+		except:
+			pass
+		raise
+
+@app.route('/start_process')
+@app.route('/start_process/<action>')
+def start_process_endpoint(action=None):
+	"""Start a background process and return its ID for polling"""
+	global process_tracker
+	
+	# Determine which action to use
+	script_action = action if action else "postprocess"
+	logger.info(f"=== START_PROCESS ENDPOINT CALLED ===")
+	logger.info(f"Action: {script_action}")
+	
+	# Check if the specific script type is already running
+	is_running = process_tracker.has_running_processes(script_type=script_action)
+	logger.info(f"Script type '{script_action}' already running: {is_running}")
+	
+	if is_running:
+		logger.warning(f"Attempted to start {script_action} but one is already running")
+		return jsonify({
+			'error': True,
+			'message': f'A {script_action} script is currently running. Please wait for it to complete.'
+		}), 409  # HTTP 409 Conflict
+	
+	path = request.args.get('script_arg', '' if script_action == 'sort' else 'originals')
+	logger.info(f"Script argument (path): {path}")
+	
+	try:
+		logger.info(f"Starting {script_action} script with path: {path}")
+		process_id = start_script(script_action, path=path)
+		logger.info(f"Successfully started {script_action} with process ID: {process_id}")
+		return jsonify({
+			'success': True,
+			'process_id': process_id,
+			'message': f'{script_action} process started successfully'
+		})
+	except ProcessRunningError as e:
+		logger.warning(f"ProcessRunningError: {e}")
+		return jsonify({
+			'error': True,
+			'message': str(e)
+		}), 409
+	except ValueError as e:
+		logger.warning(f"Unable to start {script_action}: {e}")
+		return jsonify({
+			'error': True,
+			'message': str(e)
+		}), 400
+	except Exception as e:
+		logger.error(f"Error starting process: {e}", exc_info=True)
+		return jsonify({
+			'error': True,
+			'message': f'Failed to start process: {str(e)}'
+		}), 500
+
+@app.route('/cancel_process/<script_type>', methods=['POST'])
+def cancel_process(script_type):
+	"""Cancel/terminate a running process by script type"""
+	global process_tracker
+	
+	logger.info(f"=== CANCEL_PROCESS ENDPOINT CALLED ===")
+	logger.info(f"Script type: {script_type}")
+	
+	# Validate script type
+	if script_type not in SCRIPT_TYPES:
+		logger.error(f"Invalid script type: {script_type}")
+		return jsonify({
+			'error': True,
+			'message': f'Invalid script type: {script_type}'
+		}), 400
+	
+	try:
+		success, message = process_tracker.terminate_process(script_type)
+		
+		if success:
+			logger.info(f"Successfully cancelled {script_type} process: {message}")
+			return jsonify({
+				'success': True,
+				'message': message
+			})
+		else:
+			logger.warning(f"Failed to cancel {script_type} process: {message}")
+			return jsonify({
+				'error': True,
+				'message': message
+			}), 404
+	except Exception as e:
+		logger.error(f"Error cancelling {script_type} process: {e}", exc_info=True)
+		return jsonify({
+			'error': True,
+			'message': f'Failed to cancel process: {str(e)}'
+		}), 500
+
+@app.route('/process_status/<process_id>')
+def get_process_status(process_id):
+	"""
+	Get the status and output of a specific process.  Output is read incrementally:
+
+	?since=<offset> returns the output written after the byte offset (up to PROCESS_LOG_MAX_CHUNK bytes)
+	?tail=<lines> returns the last lines of the output (also the default, with PROCESS_LOG_TAIL_LINES lines)
+
+	Both return next_offset, to pass as 'since' on the next request.
+	"""
+	global process_tracker
+	
+	process_info = process_tracker.get_process_info(process_id)
+	
+	if not process_info:
+		return jsonify({
+			'error': True,
+			'message': 'Process not found'
+		}), 404
+	
+	log = {'text': '', 'next_offset': 0, 'size': 0, 'more': False, 'reset': False, 'truncated': False}
+	if process_info.get('log_file') and os.path.exists(process_info['log_file']):
+		try:
+			if request.args.get('since') is not None:
+				log.update(read_log_since(process_info['log_file'], offset=request.args.get('since', 0, type=int), max_bytes=PROCESS_LOG_MAX_CHUNK))
+			else:
+				lines = min(max(request.args.get('tail', PROCESS_LOG_TAIL_LINES, type=int), 0), PROCESS_LOG_MAX_TAIL_LINES)
+				log.update(read_log_tail(process_info['log_file'], lines=lines, max_bytes=PROCESS_LOG_MAX_CHUNK))
+		except Exception as e:
+			logger.error(f"Error reading log file: {e}")
+	
+	response = jsonify({
+		'success': True,
+		'status': process_info['status'],
+		'type': process_info['type'],
+		'return_code': process_info['return_code'],
+		'start_time': process_info['start_time'].isoformat(),
+		'log_text': log['text'],
+		'next_offset': log['next_offset'],
+		'log_size': log['size'],
+		'more': log['more'],
+		'reset': log['reset'],
+		'truncated': log['truncated'],
+		'log_file': process_info['log_file']
+	})
+	return gzip_response(response)
+
+def gzip_response(response, min_size=1024):
+	""" Gzip a response if the client accepts it and it is large enough to be worth compressing """
+	if 'gzip' not in request.headers.get('Accept-Encoding', '').lower() or response.direct_passthrough:
+		return response
+	data = response.get_data()
+	if len(data) < min_size:
+		return response
+	response.set_data(gzip.compress(data, compresslevel=5))
+	response.headers['Content-Encoding'] = 'gzip'
+	response.headers['Vary'] = 'Accept-Encoding'
+	return response
+
+@app.route('/active_process/<script_type>')
+def get_active_process(script_type):
+	"""Get the active process info for a given script type"""
+	global process_tracker
+	
+	process_id = process_tracker.get_active_process_id(script_type)
+	if not process_id:
+		return jsonify({
+			'success': True,
+			'process_id': None,
+			'process_info': None
+		})
+
+	process_info = process_tracker.get_process_info(process_id)
+	return jsonify({
+		'success': True,
+		'process_id': process_id,
+		'process_info': process_info
+	})
+
+@app.route('/check_running_processes')
+def check_running_processes():
+	global process_tracker
+	
+	# Get detailed status from the process tracker
+	status = process_tracker.get_status()
+	
+	# Create response data
+	response_data = {
+		'has_running_processes': status["running_processes"] > 0,
+		'preprocess_running': status["preprocess_running"],
+		'postprocess_running': status["postprocess_running"],
+		'sort_running': status["sort_running"],
+		'timestamp': status["timestamp"],
+		'process_count': status["running_processes"],
+		'active_pids': [p["pid"] for p in status["active_pids"]]
+	}
+	
+	# Detailed logging only when processes are running
+	if status["running_processes"] > 0:
+		logger.info(f"Process status check at {response_data['timestamp']}")
+		logger.info(f"Total tracked processes: {response_data['process_count']}")
+		logger.info(f"Running processes: {response_data['has_running_processes']}")
+		logger.info(f"Pre-process running: {response_data['preprocess_running']}")
+		logger.info(f"Post-process running: {response_data['postprocess_running']}")
+		logger.info(f"Sort running: {response_data['sort_running']}")
+		logger.info("---") # Separator for readability
+	
+	return jsonify(response_data)
+
+@app.route('/test_process_tracker')
+def test_process_tracker():
+	"""Test endpoint to verify process tracking"""
+	global process_tracker
+	
+	# Specify a script type for testing
+	script_type = request.args.get('type', 'test')
+	
+	# Start a long-running process (sleep for 30 seconds)
+	process = subprocess.Popen(
+		['sleep', '30'],
+		stdout=subprocess.PIPE,
+		stderr=subprocess.STDOUT,
+		universal_newlines=True
+	)
+	
+	process_id = process_tracker.add_process(process, script_type=script_type)
+	logger.info(f"Started test process with PID: {process.pid}, ID: {process_id}")
+	
+	return jsonify({
+		'message': f'Test {script_type} process started',
+		'pid': process.pid,
+		'process_id': process_id
+	})
+
+@app.route('/toggle_processed', methods=['POST'])
+def toggle_processed():
+	global settings
+
+	if request.method == 'POST':
+		try:
+			data = request.get_json()  # Get the JSON data from the request body
+			path = data.get('path', '')
+			flag = data.get('flag', False)
+			#print(f'Path: {path}, Flag: {flag}')
+			if path != '':
+				# Set/clear the ['processed'] flag of the folder in the folder catalog
+				success = set_processed(path, flag)
+				return jsonify({'success': success})  # Return JSON response with a dictionary.
+
+		except Exception as e:
+			logger.error(f"Error processing request: {e}")
+			return jsonify({'success': False, 'error': str(e)}), 500 # return 500 error if failed
+
+	return jsonify({'success': False, 'error': 'Invalid request method'}), 400 # return 400 error if not a POST
+
+
+
+"""
+Supporting Functions
+"""
+
+def set_processed(path, flag, recursive=False):
+	"""
+	Set the 'processed' flag of a folder in the folder catalog.
+
+	Parameters:
+	path (str): The path to find and update
+	flag (bool): The value to set for the 'processed' flag
+	recursive (bool): Also set the flag on all of the folder's subfolders
+
+	Returns:
+	bool: True if the path was found and updated, False otherwise
+	"""
+	return folder_catalog.set_processed(path, flag, recursive=recursive)
+
+def get_folder_data(path='originals'):
+	global settings 
+
+	''' 
+	 Look up the subfolders of the path in the folder catalog, then return the following structure:
+	 folder_details = [folder_dict of each subfolder in the path]
+	 folder_dict = {
+		'name' : folder,
+		'num_folders' : number of subfolders in this folder,
+		'num_files' : number of files in this folder,
+		'processed' : True/False/None (None indicates partially processed)
+	 }
+	'''
+	#print(f'path: {path}') # DEBUG
+	folder_details = []
+	try:
+		for folder in folder_catalog.get_children(path):
+			# The processed status covers the folder and all of its subfolders
+			total, processed = folder_catalog.get_processed_counts(folder['path'])
+			
+			if processed == total:
+				processed_status = True
+			elif processed > 0:
+				processed_status = None  # Partially processed
+			else:
+				processed_status = False
+
+			folder_dict = {
+				'name' : folder['name'],
+				'num_folders' : folder['num_subfolders'],
+				'num_files' : folder['num_files'],
+				'processed' : processed_status
+			}
+			folder_details.append(folder_dict)
+
+		return folder_details
+			
+	except Exception as e:
+		logger.error(f"An unexpected error occurred: {e}")
+
+	return []
+
+def copy_folder_structure(originals_path, import_folder, task_id):
+	""" Copy folder structure and all files from originals folder to the import folder and provide progress updates while copying. """
+	try:
+		#print(f'\n ** Copying folder structure and files from {originals_path} to {import_folder}. ** \n')
+		status = progress_tracker.update_progress(task_id, 1, 0, 1)
+		if not status:
+			return
+
+		if not os.path.exists(originals_path):
+			raise FileNotFoundError(f"Source folder not found: {originals_path}")
+
+		# Phase 1: Build file list with heartbeat progress so UI doesn't appear stuck.
+		files_to_copy = []
+		scanned_dirs = 0
+		for root, dirs, files in os.walk(originals_path):
+			scanned_dirs += 1
+			for file in files:
+				files_to_copy.append((root, file))
+			if scanned_dirs % 25 == 0:
+				heartbeat_progress = min(10, 1 + int(scanned_dirs / 25))
+				status = progress_tracker.update_progress(task_id, heartbeat_progress, scanned_dirs, scanned_dirs + 1)
+				if not status:
+					return
+				logger.info(f"Copy scan progress: scanned {scanned_dirs} directories, discovered {len(files_to_copy)} files")
+
+		total_files = len(files_to_copy)
+		if total_files == 0:
+			logger.error(f"No files found in source folder: {originals_path}")
+			progress_tracker.fail_task(task_id, f"No files found in source folder: {originals_path}")
+			return
+
+		copy_list = []
+		for root, file in files_to_copy:
+			file_path = os.path.join(root, file)
+			copy_list.append((file_path, os.path.join(import_folder, os.path.relpath(file_path, originals_path))))
+
+		# Phase 2: Clear the import folder.  When resuming, only files that aren't part of this copy are removed.
+		resume = settings['performance'].get('copy_resume', True)
+		try:
+			removed = clear_folder(import_folder, keep_files={destination for _, destination in copy_list} if resume else None)
+			logger.info(f"Cleared {removed} files from the import folder: {import_folder}")
+			for folder in sorted({os.path.dirname(destination) for _, destination in copy_list}):
+				os.makedirs(folder, exist_ok=True)
+		except OSError as e:
+			logger.error(f"Unable to prepare import folder '{import_folder}': {e}")
+			progress_tracker.fail_task(task_id, f"Unable to prepare import folder '{import_folder}': {e}")
+			return
+
+		# Phase 3: Copy the files with a pool of workers, collecting errors rather than stopping at the first one.
+		workers = get_worker_count(settings['performance'].get('copy_workers', 4))
+		logger.info(f"Starting copy task. Source: {originals_path}, Destination: {import_folder}, Files: {total_files}, Workers: {workers}, Resume: {resume}")
+		last_logged = [0]
+
+		def copy_progress(processed_files, total_files):
+			if processed_files - last_logged[0] >= 25:
+				last_logged[0] = processed_files
+				logger.info(f"Copy task progress: {processed_files}/{total_files}")
+			progress = 10 + ((processed_files / total_files) * 90)
+			return progress_tracker.update_progress(task_id, progress, processed_files, total_files)
+
+		transfer_mode = settings['performance'].get('import_transfer', 'copy')
+		result = copy_files(copy_list, workers=workers, resume=resume, mode=transfer_mode, progress_callback=copy_progress)
+		if result['cancelled']:
+			logger.info(f"Copy task cancelled. Task ID: {task_id}")
+			return
+		for warning in result['warnings']:
+			logger.warning(warning)
+		for error in result['errors']:
+			logger.error(f"File operation error copying '{error['path']}': {error['error']}")
+
+		logger.info(f"Copy task finished. Copied: {result['copied']} {result['methods']}, Skipped (already copied): {result['skipped']}, Errors: {len(result['errors'])}, Task ID: {task_id}")
+		if result['errors']:
+			# The files that were copied stay in place, so retrying the import resumes with just the failed files
+			error_list = '; '.join(f"'{os.path.basename(error['path'])}': {error['error']}" for error in result['errors'][:10])
+			more = f" (and {len(result['errors']) - 10} more, see the log)" if len(result['errors']) > 10 else ''
+			progress_tracker.fail_task(task_id, f"{len(result['errors'])} of {total_files} files could not be copied. {error_list}{more}")
+			return
+		data = {'alert': {'type': 'success', 'text': 'Folder structure and files copied successfully.'}, 'original_path': originals_path, 'copied': result['copied'], 'skipped': result['skipped']}
+		progress_tracker.complete_task(task_id, data=data)
+	except Exception as e:
+		logger.error(f"Unexpected error in copy_folder_structure: {e}")
+		progress_tracker.fail_task(task_id, f"Unexpected error: {e}")
+
+def create_analyze_executor(workers, executor_type='thread'):
+	""" Create the worker pool used to analyze files. Threads suit I/O bound reads (i.e. NAS storage), processes suit CPU bound parsing. """
+	if executor_type == 'process':
+		# Use a clean server process to fork workers from, rather than forking this (threaded) web server process.
+		start_method = 'forkserver' if 'forkserver' in multiprocessing.get_all_start_methods() else 'spawn'
+		context = multiprocessing.get_context(start_method)
+		if start_method == 'forkserver':
+			# Only preload the analysis helpers in the workers, not the Flask app
+			context.set_forkserver_preload(['common.analysis'])
+		return concurrent.futures.ProcessPoolExecutor(max_workers=workers, mp_context=context)
+	return concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='analyze')
+
+def analyze_import_folder(import_folder, task_id, originals_path, start_date, end_date, resume=False):
+	""" Recusively analyze files and folders in the import folder. Create and return a dictionary of three dictionaries: files_with_dates (image files with exif date), files_without_dates (image files without exif date), and ignored_files (all other files). Each entry into these dictionaries should have the path, filename, date (if exif data exists). """
+	#print(f'\n ** Analyzing import folder: {import_folder} from originals folder: {originals_path} ** \n')
+	logger.info(f"Analyze worker entered. Task ID: {task_id}, folder: {import_folder}, resume: {resume}")
+	executor = None
+	cache = None
+	checkpoint = None
+	try:
+		status = progress_tracker.update_progress(task_id, 1, 0, 1)
+		if not status:
+			return
+
+		# The checkpoint lets the analysis be resumed after a restart.  Files already read are found in the metadata 
+		#  cache, or in the checkpoint itself when the cache is disabled.
+		checkpointed = {}
+		if resume:
+			checkpoint = JobCheckpoint.open(task_id)
+			checkpointed = checkpoint.get_metadata()
+		else:
+			try:
+				checkpoint = JobCheckpoint.create(task_id, 'analyze', {'import_folder': import_folder, 'originals_path': originals_path, 'start_date': start_date, 'end_date': end_date},
+					summary={'folder': originals_path})
+			except (OSError, ValueError) as e:
+				logger.warning(f"Unable to checkpoint analyze task, it can't be resumed after a restart: {e}")
+
+		if not os.path.exists(import_folder):
+			raise FileNotFoundError(f"Import folder not found: {import_folder}")
+
+		# Phase 1: Build file list with heartbeat progress while scanning directories.
+		files_to_analyze = []
+		scanned_dirs = 0
+		for root, dirs, files in os.walk(import_folder):
+			scanned_dirs += 1
+			for file in files:
+				files_to_analyze.append((root, file))
+			if scanned_dirs % 25 == 0:
+				heartbeat_progress = min(10, 1 + int(scanned_dirs / 25))
+				status = progress_tracker.update_progress(task_id, heartbeat_progress, scanned_dirs, scanned_dirs + 1)
+				if not status:
+					return
+				logger.info(f"Analyze scan progress: scanned {scanned_dirs} directories, discovered {len(files_to_analyze)} files")
+
+		total_files = len(files_to_analyze)
+		if total_files == 0:
+			raise FileNotFoundError(f"No files found in import folder: {import_folder}")
+
+		# Phase 2: Look up unchanged files in the metadata cache.  Non-image files are ignored without any I/O.
+		metadata_by_index = {}
+		files_to_read = []
+		cache_keys = {}
+		if settings['performance'].get('metadata_cache', True):
+			try:
+				cache = MetadataCache(max_entries=settings['performance'].get('metadata_cache_max_entries', METADATA_CACHE_MAX_ENTRIES))
+			except Exception as e:
+				logger.warning(f"Metadata cache unavailable, analyzing without it: {e}")
+		for index, (root, file) in enumerate(files_to_analyze):
+			if not is_image_file(file):
+				continue
+			if cache or checkpoint:
+				try:
+					cache_keys[index] = get_cache_key(os.path.join(root, file))
+				except OSError:
+					pass  # Let the worker report the error for this file
+			files_to_read.append(index)
+		if cache and cache_keys:
+			hits = cache.get_many(list(cache_keys.values()))
+			for index, key in cache_keys.items():
+				if key[0] in hits:
+					metadata_by_index[index] = hits[key[0]]
+			files_to_read = [index for index in files_to_read if index not in metadata_by_index]
+		if checkpointed:
+			for index in files_to_read:
+				key = cache_keys.get(index)
+				if key and key[0] in checkpointed and checkpointed[key[0]][0] == key:
+					metadata_by_index[index] = checkpointed[key[0]][1]
+			files_to_read = [index for index in files_to_read if index not in metadata_by_index]
+		processed_files = total_files - len(files_to_read)
+		logger.info(f"Analyze cache lookup complete. Cached: {len(metadata_by_index)}, To read: {len(files_to_read)}")
+
+		# Phase 3: Fan the remaining files out to a pool of workers in batches.  Results are stored by file index so that 
+		#  the merged output keeps the same (os.walk) order regardless of which worker finishes first.
+		executor_type = settings['performance'].get('analyze_executor', 'thread')
+		workers = get_worker_count(settings['performance'].get('analyze_workers', 0), executor_type)
+		batch_size = 64 if executor_type == 'process' else 8
+		batches = [files_to_read[index:index + batch_size] for index in range(0, len(files_to_read), batch_size)]
+		max_pending = workers * 2
+
+		logger.info(f"Starting analyze task. Source: {import_folder}, Files: {total_files}, Executor: {executor_type}, Workers: {workers}")
+		if batches:
+			executor = create_analyze_executor(workers, executor_type)
+		last_logged = 0
+		next_batch = 0
+		pending = {}
+		checkpoint_items = []
+		last_checkpoint = time.monotonic()
+		while next_batch < len(batches) or pending:
+			# Keep a bounded number of batches in flight so that cancellation is responsive
+			while next_batch < len(batches) and len(pending) < max_pending:
+				batch = [files_to_analyze[index] for index in batches[next_batch]]
+				future = executor.submit(analyze_batch, batch)
+				pending[future] = next_batch
+				next_batch += 1
+
+			done, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+			new_cache_items = []
+			for future in done:
+				batch_indexes = batches[pending.pop(future)]
+				for index, (result_type, result) in zip(batch_indexes, future.result()):
+					if result_type == 'error':
+						file_path = os.path.join(result['path'], result['filename'])
+						if result['kind'] == 'os':
+							logger.error(f"File operation error reading '{file_path}': {result['error']}")
+							progress_tracker.fail_task(task_id, f"Error reading '{result['filename']}': {result['error']}")
+						else:
+							logger.error(f"Unexpected analyze error for '{file_path}': {result['error']}")
+							progress_tracker.fail_task(task_id, f"Error analyzing '{result['filename']}': {result['error']}")
+						return
+					metadata_by_index[index] = result
+					if index in cache_keys:
+						new_cache_items.append((cache_keys[index], result))
+				processed_files += len(batch_indexes)
+			if cache and new_cache_items:
+				cache.put_many(new_cache_items)
+			if checkpoint and not cache:
+				checkpoint_items.extend(new_cache_items)
+				if time.monotonic() - last_checkpoint >= JOB_CHECKPOINT_INTERVAL:
+					checkpoint.add_metadata(checkpoint_items)
+					checkpoint_items = []
+					last_checkpoint = time.monotonic()
+
+			progress = 10 + ((processed_files / total_files) * 90)
+			status = progress_tracker.update_progress(task_id, progress, processed_files, total_files)
+			if not status:
+				logger.info(f"Analyze task cancelled. Task ID: {task_id}")
+				return
+			if processed_files - last_logged >= 25:
+				last_logged = processed_files
+				logger.info(f"Analyze task progress: {processed_files}/{total_files}")
+
+		# Phase 4: Build the results in order, applying the date range to the guessed dates.  Files that aren't images 
+		#  have no metadata and are ignored.
+		results = AnalysisResults(original_path=originals_path, start_date=start_date, end_date=end_date)
+		for index, (root, file) in enumerate(files_to_analyze):
+			results.add_file(root, file, metadata_by_index.get(index))
+
+		if cache:
+			cache.evict()
+
+		import_data = results.to_data()
+
+		# Thumbnails for the files that will be shown on the fix files page are created while the user reviews the results
+		thumbnail_groups = ['files_without_dates'] + (['files_with_dates'] if settings['ui']['show_all_thumbnails'] else [])
+		start_thumbnail_generation([os.path.join(path, filename) for group in thumbnail_groups for path, filename in results.iter_files(group)])
+
+		progress_tracker.complete_task(task_id, data=import_data)
+		logger.info(f"Analyze task completed successfully. Files analyzed: {processed_files}/{total_files}, Task ID: {task_id}")
+		#print(import_data) # DEBUG
+	except Exception as e:
+		logger.error(f"Error analyzing import folder: {e}")
+		progress_tracker.fail_task(task_id, f"Error analyzing folder: {e}")
+	finally:
+		if executor:
+			executor.shutdown(wait=False, cancel_futures=True)
+		if cache:
+			cache.close()
+		if checkpoint:
+			# Only a restart leaves the checkpoint behind, a failed or cancelled analysis is started again from scratch
+			checkpoint.finish()
+
+def process_files(task_id, task_list, analysis, resume=False):
+	""" Process the files based on the task list and the AnalysisResults of the import folder.  The task is checkpointed so that it can be resumed, or rolled back, after a restart. """
+	try:
+		if resume:
+			checkpoint = JobCheckpoint.open(task_id)
+		else:
+			checkpoint = JobCheckpoint.create(task_id, 'process', {'task_list': task_list, 'import_data': analysis.to_data(), 'export_folder': f"{settings['folders']['export']}/",
+				'export_mode': settings['performance'].get('export_mode', 'replace')}, summary={'folder': analysis.original_path, 'choices': len(task_list)})
+	except (OSError, ValueError) as e:
+		logger.error(f'Unable to checkpoint process task: {e}')
+		progress_tracker.fail_task(task_id, f'Unable to start processing: {e}')
+		return
+	try:
+		_process_files(task_id, task_list, analysis, checkpoint)
+	finally:
+		# Left in place unless the task finished, so that it can be resumed or rolled back
+		checkpoint.close()
+
+def _process_files(task_id, task_list, analysis, checkpoint):
+	originals_path = analysis.original_path or 'NOT FOUND'
+	#print(f'originals_path: {originals_path}')
+	
+	report = []
+	# Plan the work: the dates to write, then the files to delete or move to the export folder
+	export_folder = checkpoint.header['params']['export_folder']
+	export_mode = checkpoint.header['params'].get('export_mode', 'replace')
+	plan = plan_process(task_list, analysis, export_folder, IMPORT_FOLDER)
+	# Get total tasks to process
+	total_tasks = len(task_list)
+	# Get total files to copy
+	total_files = len(plan['files'])
+	# Get total items to process
+	total_items = len(plan['dates']) + total_files
+
+	# Get the current date and time
+	now = datetime.now()
+
+	# Define the format for the date and time string
+	date_time_format = "%Y-%m-%d %H:%M:%S"
+
+	# Generate the date and time string
+	date_time_str = now.strftime(date_time_format)
+
+	report.append(f'Process Images Report [{date_time_str}]')
+	report.append(f'Number of tasks: {total_tasks}')
+	report.append(f'Number of files scanned: {total_files}')
+	report.append(f'Number of items total: {total_items}')
+
+	# Process the files in place
+	results = {
+		'files_ignored' : [],
+		'files_deleted' : [],
+		'files_edited' : [],
+		'files_copied' : [],
+		'errors' : []
+	}
+
+	# Files handled before a restart, from the checkpoint.  Moves and deletes that happened after the last checkpoint 
+	#  are found by looking at the files themselves, and writing a date again gives the same result.
+	done = {}
+	exported = {}  # Files an incremental export was moving into the export folder
+	cleared = False
+	for entry in checkpoint.read_entries():
+		if entry.get('op') == 'cleared':
+			cleared = True
+		elif entry.get('op') == 'export':
+			exported[entry['file']] = entry
+		elif 'file' in entry:
+			done[(entry['op'], entry['file'])] = entry
+	resume = bool(done) or cleared
+	checkpoint_entries = []
+	last_checkpoint = time.monotonic()
+	processed_items = 0
+	move_methods = {}
+	exports = []  # Files moved to the export folder, for the manifest
+	workers = get_worker_count(settings['performance'].get('process_workers', 4))
+	move_mode = settings['performance'].get('export_transfer', 'rename')
+
+	def flush_checkpoint():
+		nonlocal checkpoint_entries, last_checkpoint
+		checkpoint.append(checkpoint_entries)
+		checkpoint_entries = []
+		last_checkpoint = time.monotonic()
+
+	def get_pending(actions):
+		# Report the actions that were done before a restart, and return the rest
+		pending = []
+		for action in actions:
+			if action['op'] == 'edit':
+				handled = done.get(('edit', action['file']))
+			else:
+				handled = done.get(('delete', action['file'])) or done.get(('move', action['file']))
+			if handled:
+				results[handled['group']].append(handled['message'])
+				if handled['op'] == 'move' and handled['group'] == 'files_copied':
+					exports.append({'file': action['file'], 'destination': handled.get('destination', action['destination']), 'outcome': handled.get('outcome', 'added')})
+			else:
+				pending.append(action)
+		return pending
+
+	def run_action(action):
+		# Runs in the worker threads
+		file_path = action['file']
+		name = file_path.replace(IMPORT_FOLDER, '')
+		if action['op'] == 'edit':
+			if write_date_to_exif(file_path, action['date']):
+				return 'files_edited', f'{name} was processed with date {action['date']}.'
+			return 'errors', f'{name} had an error when processing with {action['date']}.'
+		if action['op'] == 'delete':
+			try:
+				if not resume or os.path.exists(file_path):
+					os.remove(file_path)
+				return 'files_deleted', f'{name} was deleted.'
+			except Exception as e:
+				logger.error(f'Error deleting {name}: {e}')
+				return 'errors', f'Error deleting {name}: {e}'
+		try:
+			if export_mode == 'incremental':
+				previous = exported.get(file_path)
+				if previous and not os.path.exists(file_path):
+					# Moved before a restart
+					action['method'] = 'resumed'
+					action['outcome'], action['destination'] = previous['outcome'], previous['destination']
+				else:
+					if previous and previous['outcome'] != 'duplicate' and os.path.exists(previous['destination']):
+						# A move that didn't finish before a restart
+						os.remove(previous['destination'])
+					# The export folder may already hold this file, or a different one with the same name.  The name is
+					#  checkpointed straight away, so that a rollback only moves back this task's files.
+					action['outcome'], action['destination'], method = export_file(file_path, action['destination'], move_mode,
+						lambda outcome, destination: checkpoint.append([{'op': 'export', 'file': file_path, 'destination': destination, 'outcome': outcome}]))
+					action['method'] = method or 'duplicate'
+				if action['outcome'] == 'duplicate':
+					return 'files_copied', f'{name} is already in the export folder as {action['destination'].replace(export_folder, '')}.'
+				if action['outcome'] == 'renamed':
+					return 'files_copied', f'{name} was copied to export folder as {action['destination'].replace(export_folder, '')}, a different file had the same name.'
+			elif resume and not os.path.exists(file_path) and os.path.exists(action['destination']):
+				action['method'] = 'resumed'
+			else:
+				action['method'] = move_file(file_path, action['destination'], move_mode)
+			return 'files_copied', f'{name} was copied to export folder.'
+		except Exception as e:
+			logger.error(f'Error moving {name} to export folder: {e}')
+			return 'errors', f'Error moving {name} to export folder: {e}'
+
+	def finish_batch(completed, count):
+		nonlocal processed_items
+		for action, group, message in completed:
+			results[group].append(message)
+			entry = {'op': action['op'], 'file': action['file'], 'group': group, 'message': message}
+			if action['op'] == 'move' and group == 'files_copied':
+				exports.append({'file': action['file'], 'destination': action['destination'], 'outcome': action.get('outcome', 'added')})
+				if export_mode == 'incremental':
+					entry.update(destination=action['destination'], outcome=action.get('outcome', 'added'))
+			checkpoint_entries.append(entry)
+			if 'method' in action:
+				move_methods[action['method']] = move_methods.get(action['method'], 0) + 1
+		processed_items += len(completed)
+		if time.monotonic() - last_checkpoint >= JOB_CHECKPOINT_INTERVAL:
+			flush_checkpoint()
+		return progress_tracker.update_progress(task_id, int((processed_items / total_items) * 100), processed_items, total_items)
+
+	# Write the dates to the files in the import folder
+	edits = []
+	for action in plan['dates']:
+		if action['op'] == 'ignore':
+			results['files_ignored'].append(action['file'].replace(IMPORT_FOLDER, ''))
+		elif action['op'] == 'invalid':
+			results['errors'].append(f"{action['file'].replace(IMPORT_FOLDER, '')} was not processed.")
+		else:
+			edits.append(action)
+	edits = get_pending(edits)
+	processed_items = len(plan['dates']) - len(edits)
+	timings, cancelled = run_plan_actions(edits, run_action, workers, batch_callback=finish_batch)
+	processed_items = len(plan['dates'])
+	flush_checkpoint()
+	if cancelled or not progress_tracker.update_progress(task_id, int((processed_items / total_items) * 100), processed_items, total_items):
+		logger.info(f"Process task cancelled before any files were moved. Task ID: {task_id}")
+		return
+
+	# Delete files in export folder before copying files (unless that was done before a restart, or files are added to it)
+	try:
+		if not cleared and export_mode == 'replace':
+			clear_folder(export_folder)
+			os.makedirs(export_folder, exist_ok=True)
+		checkpoint.append([{'op': 'cleared'}])
+		for folder in plan['folders']:
+			os.makedirs(folder, exist_ok=True)
+	except Exception as e:
+		logger.error(f'Critical error clearing export folder: {e}')
+		progress_tracker.fail_task(task_id, f"Cannot clear export folder '{export_folder}': {e}")
+		checkpoint.finish()
+		return
+
+	# Delete or move each file to the export folder
+	files = get_pending(plan['files'])
+	processed_items += total_files - len(files)
+	timings, cancelled = run_plan_actions(files, run_action, workers, batch_callback=finish_batch, timings=timings)
+	if cancelled:
+		flush_checkpoint()
+		logger.info(f"Process task cancelled, {processed_items - len(plan['dates'])} of {total_files} files were handled. Task ID: {task_id}")
+		return
+
+	logger.info(f"Process timings: {format_plan_timings(timings)}")
+	try:
+		manifest_path = write_export_manifest(task_id, export_folder, export_mode, exports)
+		logger.info(f"Export manifest written to {manifest_path}")
+	except OSError as e:
+		manifest_path = None
+		logger.error(f'Unable to write the export manifest: {e}')
+	logger.info(f"Moved files to the export folder: {move_methods}")
+	progress_tracker.complete_task(task_id, data=results)
+	checkpoint.finish()
+
+	# Generate report
+	report.append('')
+	report.append('======')
+	report.append('Errors')
+	report.append('======')
+	for line in results['errors']:
+		report.append(f' - {line}')
+
+	report.append('')
+	report.append('============')
+	report.append('Files Edited')
+	report.append('============')
+	for line in results['files_edited']:
+		report.append(f' - {line}')
+
+	report.append('')
+	report.append('=============')
+	report.append('Files Deleted')
+	report.append('=============')
+	for line in results['files_deleted']:
+		report.append(f' - {line}')
+
+	report.append('')
+	report.append('=============')
+	report.append('Files Ignored')
+	report.append('=============')
+	for line in results['files_ignored']:
+		report.append(f' - {line}')
+
+	report.append('')
+	report.append('============')
+	report.append('Files Copied')
+	report.append('============')
+	for line in results['files_copied']:
+		report.append(f' - {line}')
+
+	report.append('')
+	report.append('=======')
+	report.append('Timings')
+	report.append('=======')
+	report.append(f' - {format_plan_timings(timings)}')
+
+	report.append('')
+	report.append('===============')
+	report.append('Export Manifest')
+	report.append('===============')
+	report.append(f' - {manifest_path} ({export_mode} export)')
+
+	report.append('')
+	report.append('=============')
+	report.append('End of Report')
+	report.append('=============')
+
+	report_filename = f'logs/report_{date_time_str}.log'
+
+	with open(report_filename, 'w') as file:
+		file.writelines(line + '\n' for line in report)
+
+	if settings['ui']['auto_flag_processed']:
+		set_processed(analysis.original_path, True, recursive=True)
+
+def rollback_process_files(task_id):
+	"""
+	Roll back an unfinished process task, moving the files that were moved to the export folder back to the import 
+	folder.  Deleted files and dates written to files can't be restored, they are counted in the result.  After an 
+	incremental export only the files in the checkpoint are moved back, as the export folder also holds files from 
+	earlier runs.
+
+	:param task_id: Task ID of the unfinished task
+	:return: Dictionary of the number of files restored, deleted and edited, and a list of errors
+	"""
+	checkpoint = JobCheckpoint.open(task_id)
+	try:
+		analysis = AnalysisResults(checkpoint.header['params']['import_data'])
+		export_folder = checkpoint.header['params']['export_folder']
+		entries = checkpoint.read_entries()
+		result = {'restored': 0, 'deleted': 0, 'errors': [],
+			'edited': sum(1 for entry in entries if entry.get('op') == 'edit' and entry['group'] == 'files_edited')}
+		if checkpoint.header['params'].get('export_mode', 'replace') == 'incremental':
+			exports = {entry['file']: entry for entry in entries if entry.get('op') == 'export'}
+			move_mode = settings['performance'].get('export_transfer', 'rename')
+			for group in ['files_with_dates', 'files_without_dates', 'ignored_files']:
+				for path, filename in analysis.iter_files(group):
+					file_path = os.path.join(path, filename)
+					export = exports.get(file_path)
+					try:
+						if os.path.exists(file_path):
+							if export and export['outcome'] != 'duplicate' and os.path.exists(export['destination']):
+								# A move that stopped before the original was removed
+								os.remove(export['destination'])
+						elif export and os.path.exists(export['destination']):
+							os.makedirs(os.path.dirname(file_path), exist_ok=True)
+							if export['outcome'] == 'duplicate':
+								# The file in the export folder was already there, and has the same content
+								shutil.copy2(export['destination'], file_path)
+							else:
+								move_file(export['destination'], file_path, move_mode)
+							result['restored'] += 1
+						else:
+							result['deleted'] += 1
+					except OSError as e:
+						result['errors'].append(f"Error moving {export['destination']} back to the import folder: {e}")
+						logger.error(f"Error moving {export['destination']} back to the import folder: {e}")
+		# Nothing was moved before the export folder was cleared, and the files in it may belong to an earlier task
+		elif any(entry.get('op') == 'cleared' for entry in entries):
+			move_mode = settings['performance'].get('export_transfer', 'rename')
+			for group in ['files_with_dates', 'files_without_dates', 'ignored_files']:
+				for path, filename in analysis.iter_files(group):
+					file_path = os.path.join(path, filename)
+					export_path = get_export_path(path, filename, export_folder, IMPORT_FOLDER)
+					try:
+						if os.path.exists(export_path):
+							if os.path.exists(file_path):
+								# A copy that stopped before the original was removed
+								os.remove(export_path)
+							else:
+								os.makedirs(os.path.dirname(file_path), exist_ok=True)
+								move_file(export_path, file_path, move_mode)
+								result['restored'] += 1
+						elif not os.path.exists(file_path):
+							result['deleted'] += 1
+					except OSError as e:
+						result['errors'].append(f"Error moving {export_path} back to the import folder: {e}")
+						logger.error(f"Error moving {export_path} back to the import folder: {e}")
+		if not result['errors']:
+			checkpoint.finish()
+	finally:
+		checkpoint.close()
+	logger.info(f"Rolled back process task {task_id}. Restored: {result['restored']}, Deleted: {result['deleted']}, Edited: {result['edited']}, Errors: {len(result['errors'])}")
+	return result
+
+def get_unique_id():
+	""" Generate a unique ID for a task. """
+	return str(uuid.uuid4())
+
+@app.route('/logs')
+@app.route('/logs/<filename>')
+def logs(filename=None):
+	"""View log files in the logs directory"""
+	# Get list of all .log files in the logs directory
+	log_files = []
+	for file in os.listdir('logs'):
+		if file.endswith('.log'):
+			log_files.append(file)
+	
+	# Sort log files with app.log first, then by name
+	log_files.sort(key=lambda x: (x != 'app.log', x))
+	
+	# If no filename specified, use app.log or the first log file found
+	if not filename:
+		filename = 'app.log' if 'app.log' in log_files else (log_files[0] if log_files else None)
+	
+	# Read the selected log file
+	log_content = ''
+	if filename and filename in log_files:
+		try:
+			with open(os.path.join('logs', filename), 'r') as f:
+				log_content = f.read()
+		except Exception as e:
+			logger.error(f"Error reading log file {filename}: {e}")
+			log_content = f"Error reading log file: {str(e)}"
+	
+	return render_template('logs.html', 
+						 settings=settings,
+						 log_files=log_files,
+						 current_log=filename,
+						 log_content=log_content)
+
+"""
+Run Flask App
+"""
+configured_log_level = settings['globals'].get('log_level', 40)
+effective_log_level = 20 if settings['globals'].get('debug', False) and configured_log_level > 20 else configured_log_level
+logger = create_logger('app', filename='logs/app.log', level=effective_log_level)
+
+if effective_log_level != configured_log_level:
+	logger.warning(f"Debug mode is enabled; overriding log level from {configured_log_level} to {effective_log_level} (INFO)")
+
+logger.info('Application Started.')
+
+# Tasks left unfinished by a restart (or crash) can be resumed or rolled back from the dashboard
+unfinished_jobs = list_unfinished_jobs()
+if unfinished_jobs:
+	logger.warning(f"Found {len(unfinished_jobs)} unfinished tasks in {JOB_CHECKPOINT_FOLDER}, they can be resumed or rolled back from the dashboard")
+
+def read_secrets():
+	""" Read config/secrets.yaml, creating it with the defaults if it doesn't exist """
+	secrets = read_generic_yaml('config/secrets.yaml')
+	if secrets == {}:
+		logger.info('New config/secrets.yaml file created.')
+		secrets = {
+			'base_url': 'http://127.0.0.1:2283/api',
+			'api_key': ''
+		}
+		write_generic_yaml(secrets, 'config/secrets.yaml')
+	return secrets
+
+secrets = read_secrets()
+secrets_mtime = get_config_mtime('secrets.yaml')  # mtime of secrets.yaml when this worker last read it
+
+# Start background thread for periodic log cleanup
+def cleanup_logs_periodically():
+	"""Periodically clean up old log files"""
+	import time
+	while True:
+		try:
+			time.sleep(24 * 60 * 60)  # Run every 24 hours
+			process_tracker.cleanup_old_logs()
+		except Exception as e:
+			logger.warning(f"Error in log cleanup thread: {e}")
+
+cleanup_thread = threading.Thread(target=cleanup_logs_periodically)
+cleanup_thread.daemon = True
+cleanup_thread.start()
+logger.info("Log cleanup thread started")
+
+if __name__ == '__main__':
+	if settings['globals']['debug'] == False:
+		app.run(host='0.0.0.0')
+	else:
+		app.run(host='0.0.0.0', debug=True)
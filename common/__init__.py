@@ -1 +1,12 @@
-from common.common import *
\ No newline at end of file
+from common.common import *
+from common.analysis import *
+from common.analysis_results import *
+from common.metadata_cache import *
+from common.thumbnail_cache import *
+from common.copy_engine import *
+from common.folder_journal import *
+from common.folder_catalog import *
+from common.state_store import *
+from common.job_scheduler import *
+from common.job_checkpoint import *
+from common.process_plan import *
\ No newline at end of file
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Analysis Script
+ *****************************************
+
+ Description: Per-file analysis and date guessing helpers used when 
+  analyzing the import folder.  These are kept free of any Flask / app 
+  state so that they can be run from worker threads or worker processes.
+
+ *****************************************
+"""
+
+import datetime
+import json
+import os
+import re
+from common.common import create_logger
+from exif.exif import read_exif_date
+
+"""
+Globals
+"""
+
+IMAGE_EXTENSIONS = {'.jpg', '.jpeg', '.png', '.tif', '.tiff', '.webp'}
+
+"""
+Analysis Functions
+"""
+
+def is_image_file(file):
+	""" Check the file extension to see if this is an image file that should be analyzed. """
+	return os.path.splitext(file)[1].lower() in IMAGE_EXTENSIONS
+
+def get_file_metadata(file_path):
+	"""
+	Read the metadata for an image file that does not depend on the selected date range (and so can be cached).
+
+	:param file_path: Path to the image file
+	:return: Dictionary with the exif 'date' (datetime or None), 'file_date', and the un-filtered 'filename_date' and 'path_date' guesses
+	"""
+	filename_date = get_date_from_filename(os.path.basename(file_path))
+	path_date = get_date_from_path(file_path)
+	return {
+		'date': read_exif_date(file_path),
+		'file_date': get_file_date(file_path),
+		'filename_date': fixup_date_time(filename_date) if filename_date else None,
+		'path_date': fixup_date_time(path_date) if path_date else None
+	}
+
+def metadata_to_json(metadata):
+	""" Serialize the metadata from get_file_metadata() to JSON, i.e. for the metadata cache or a job checkpoint """
+	metadata = dict(metadata)
+	if isinstance(metadata.get('date'), datetime.datetime):
+		metadata['date'] = metadata['date'].isoformat()
+	return json.dumps(metadata)
+
+def metadata_from_json(metadata_json):
+	""" Load metadata serialized by metadata_to_json() """
+	metadata = json.loads(metadata_json)
+	if metadata.get('date'):
+		metadata['date'] = datetime.datetime.fromisoformat(metadata['date'])
+	return metadata
+
+def get_image_link(root, file):
+	""" Get the link to an image file in the import folder, as served from the static folder """
+	return root.replace('./static/', '').replace('./', '') + '/' + file
+
+def build_analysis_entry(root, file, metadata, start_date, end_date):
+	"""
+	Build the analysis entry for an image file from its metadata, applying the date range to the guessed dates.
+
+	:return: Tuple of (group, entry) where group is 'files_with_dates' or 'files_without_dates'
+	"""
+	file_date = metadata['file_date']
+	image_link = get_image_link(root, file)
+	guessed_dates = filter_guessed_dates(metadata['filename_date'], metadata['path_date'], file_date, start_date, end_date)
+	if metadata['date']:
+		return 'files_with_dates', {'path': root, 'filename': file, 'date': metadata['date'], 'file_date': file_date, 'image_link': image_link, 'guessed_dates': guessed_dates, 'start_date': start_date, 'end_date': end_date}
+	return 'files_without_dates', {'path': root, 'filename': file, 'file_date': file_date, 'image_link': image_link, 'guessed_dates': guessed_dates, 'start_date': start_date, 'end_date': end_date}
+
+def analyze_file(root, file, start_date, end_date):
+	"""
+	Analyze a single file from the import folder.
+
+	:param root: Folder containing the file
+	:param file: Filename
+	:param start_date: Start of the date range (string or None)
+	:param end_date: End of the date range (string or None)
+	:return: Tuple of (group, entry) where group is one of 'files_with_dates', 'files_without_dates' or 'ignored_files'
+	"""
+	if not is_image_file(file):
+		return 'ignored_files', {'path': root, 'filename': file}
+	return build_analysis_entry(root, file, get_file_metadata(os.path.join(root, file)), start_date, end_date)
+
+def analyze_batch(batch):
+	"""
+	Read the metadata for a batch of (root, file) image tuples.  Errors are returned rather than raised so that
+	a worker process never has to pickle an arbitrary exception back to the parent.
+
+	:return: List of ('metadata', metadata) tuples in the same order as the batch. Failed files are
+		returned as ('error', {'path', 'filename', 'kind', 'error'}) where kind is 'os' or 'other'.
+	"""
+	results = []
+	for root, file in batch:
+		try:
+			results.append(('metadata', get_file_metadata(os.path.join(root, file))))
+		except (FileNotFoundError, PermissionError, OSError) as e:
+			results.append(('error', {'path': root, 'filename': file, 'kind': 'os', 'error': str(e)}))
+		except Exception as e:
+			results.append(('error', {'path': root, 'filename': file, 'kind': 'other', 'error': str(e)}))
+	return results
+
+def get_file_date(file_path):
+	""" Get the date of the file. """
+	try:
+		file_stats = os.stat(file_path)
+		file_date = file_stats.st_mtime
+		# convert file_date to a human-readable format
+		file_date = datetime.datetime.fromtimestamp(file_date, tz=datetime.timezone.utc).strftime('%Y-%m-%d %H:%M:%S')
+		return file_date
+	except Exception as e:
+		#print(f"Error getting file date: {e}")
+		create_logger('app').error(f"Error getting file date: {e}")
+		return None
+
+def guess_date(filename, file_date, file_path, start_date, end_date):
+	""" Using the filename, file_date (should already be a date, simply append to the list), and file_path, attempt to guess the date and time of the image and return a list of possible dates. """
+	# start_date and end_date are already in string format and fixed up
+	# Get the date from the filename
+	filename_date = get_date_from_filename(filename)
+	if filename_date:
+		filename_date = fixup_date_time(filename_date)
+	# Get the date from the file path
+	path_date = get_date_from_path(file_path)
+	if path_date:
+		path_date = fixup_date_time(path_date)
+	return filter_guessed_dates(filename_date, path_date, file_date, start_date, end_date)
+
+def filter_guessed_dates(filename_date, path_date, file_date, start_date, end_date):
+	""" Build the guessed dates dictionary from already fixed up dates, keeping only the dates within the start and end date range. """
+	guessed_dates = {
+		'filename' : None,
+		'pathname' : None,
+		'filedate' : None
+	}
+	if filename_date and date_in_range(start_date, end_date, filename_date):
+		guessed_dates['filename'] = filename_date
+	if path_date and date_in_range(start_date, end_date, path_date):
+		guessed_dates['pathname'] = path_date
+	if file_date and date_in_range(start_date, end_date, file_date):
+		guessed_dates['filedate'] = file_date
+	return guessed_dates
+
+def get_date_from_filename(filename):
+	""" Get the date from the filename. 
+	# Check for several different date patterns in the filename including YYYY-MM-DD, YYYYMMDD, YYYY_MM_DD, MM-DD-YYYY, MM_DD_YYYY, YYYY-MM, YYYY_MM where year would be 1900-2099
+	"""
+	search_patterns = [r'\d{4}-\d{2}-\d{2}', r'\d{4}_\d{2}_\d{2}', r'\d{2}-\d{2}-\d{4}', r'\d{2}_\d{2}_\d{4}', r'\d{4}-\d{2}', r'\d{4}_\d{2}', r'\d{8}']
+	for pattern in search_patterns:
+		date = re.search(pattern, filename)
+		if date:
+			# Check if the date is a valid date
+			if is_valid_date(date.group()):
+				return date.group()
+	return None
+
+def get_date_from_path(file_path):
+	""" Get the date from the file_path string. 
+	# Check for several different date patterns in the file_path string including YYYY-MM-DD, YYYY_MM_DD, YYYY/MM/DD, YYYY/MM, MM-DD-YYYY, MM_DD_YYYY, YYYY-MM, YYYY_MM, YYYYMMDD where year would be 1900-2099
+	"""
+	search_patterns = [r'\d{4}-\d{2}-\d{2}', r'\d{4}_\d{2}_\d{2}', r'\d{4}/\d{2}/\d{2}', r'\d{4}/\d{2}', r'\d{2}-\d{2}-\d{4}', r'\d{2}_\d{2}_\d{4}', r'\d{4}-\d{2}', r'\d{4}_\d{2}', r'\d{8}']
+	for pattern in search_patterns:
+		date = re.search(pattern, file_path)
+		if date:
+			# Check if the date is a valid date
+			if is_valid_date(date.group()):
+				return date.group()
+	return None
+
+def is_valid_date(date):
+	""" The variable date is a string that could be in various formats (is not a datetime format), check to see if it looks like a valid date based knowing the year should be between 1900-2099."""
+	year = re.search(r'\d{4}', date)
+	if year:
+		year = int(year.group())
+		if year >= 1900 and year <= 2099:
+			return True
+	return False
+
+def fixup_date_time(date_time):
+	""" 
+		Fixup date input to be in the format. 
+		Input: Possible input formats are YYYY-MM-DD, YYYY_MM_DD, YYYY/MM/DD, YYYY/MM, MM-DD-YYYY, MM_DD_YYYY, YYYY-MM, YYYY_MM, YYYYMMDD and may or may not contain the time. 
+		Output: string in the format YYYY-MM-DD HH:MM:SS (where HH:MM:SS is 00:00:00 if not present).
+	"""
+	# Check if input contains full date matching one of these patterns YYYY-MM-DD, YYYY_MM_DD, YYYY/MM/DD, MM-DD-YYYY, MM_DD_YYYY, YYYYMMDD and format to YYYY-MM-DD
+	search_patterns = [r'\d{4}-\d{2}-\d{2}', r'\d{4}_\d{2}_\d{2}', r'\d{4}/\d{2}/\d{2}', r'\d{2}-\d{2}-\d{4}', r'\d{2}_\d{2}_\d{4}', r'\d{8}']
+	patterns = ['YYYY-MM-DD', 'YYYY_MM_DD', 'YYYY/MM/DD', 'MM-DD-YYYY', 'MM_DD_YYYY', 'YYYYMMDD']
+	for index, pattern in enumerate(search_patterns):
+		date_match = re.search(pattern, date_time)
+		if date_match:
+			date = date_match.group()
+			# Convert date to YYYY-MM-DD
+			date = convert_date(date, patterns[index])
+			break
+	if not date_match:
+		patterns = ['YYYY-MM', 'YYYY_MM']
+		search_patterns	= [r'\d{4}-\d{2}', r'\d{4}_\d{2}']
+		for index, pattern in enumerate(search_patterns):
+			date_match = re.search(pattern, date_time)
+			if date_match:
+				date = date_match.group()
+				# Convert date to YYYY-MM-DD
+				date = convert_date(date, patterns[index])
+				break
+	
+	if not date_match:
+		return '0000-00-00 00:00:00'
+
+	# Check if input contains time and format to HH:MM:SS
+	time_match = re.search(r'\d{2}:\d{2}:\d{2}', date_time)
+	if time_match:
+		time = time_match.group()
+	else:
+		time = '00:00:00'
+
+	return f'{date} {time}'
+
+def convert_date(date, pattern):
+	""" Convert date to YYYY-MM-DD format. """
+	if pattern == 'YYYY-MM-DD':
+		return date
+	if pattern == 'YYYY_MM_DD':
+		return date.replace('_', '-')
+	if pattern == 'YYYY/MM/DD':
+		return date.replace('/', '-')
+	if pattern == 'MM-DD-YYYY':
+		return '-'.join(date.split('-')[::-1])
+	if pattern == 'MM_DD_YYYY':
+		return '-'.join(date.split('_')[::-1])
+	if pattern == 'YYYYMMDD':
+		return f'{date[0:4]}-{date[4:6]}-{date[6:8]}'
+	if pattern == 'YYYY-MM':
+		return date + '-01'
+	if pattern == 'YYYY_MM':
+		return date.replace('_', '-') + '-01'
+	
+	return '1900-01-01'
+
+def date_is_after(date_string1, date_string2):
+	"""
+	Compare two date strings and return True if the first date is after the second date.
+
+	Args:
+	date_string1 (str): The first date string.
+	date_string2 (str): The second date string.
+
+	Returns:
+	bool: True if the first date is after the second date, False otherwise.
+	"""
+	date_format = "%Y-%m-%d %H:%M:%S"
+
+	# Convert date strings to datetime objects
+	date1 = datetime.datetime.strptime(date_string1, date_format)
+	date2 = datetime.datetime.strptime(date_string2, date_format)
+
+	# Compare the dates
+	return date1 >= date2
+
+def date_is_before(date_string1, date_string2):
+	"""
+	Compare two date strings and return True if the first date is before the second date.
+
+	Args:
+	date_string1 (str): The first date string.
+	date_string2 (str): The second date string.
+
+	Returns:
+	bool: True if the first date is after the second date, False otherwise.
+	"""
+	date_format = "%Y-%m-%d %H:%M:%S"
+
+	# Convert date strings to datetime objects
+	date1 = datetime.datetime.strptime(date_string1, date_format)
+	date2 = datetime.datetime.strptime(date_string2, date_format)
+
+	# Compare the dates
+	return date1 <= date2
+
+def date_in_range(start_date, end_date, test_date):
+	if start_date == None and end_date == None:
+		return True 
+	
+	if start_date or end_date:
+		if start_date and end_date and date_is_after(test_date, start_date) and end_date and date_is_before(test_date, end_date):
+			return True
+		elif start_date and date_is_after(test_date, start_date):
+			return True
+		elif end_date and date_is_before(test_date, end_date):
+			return True 
+
+	return False
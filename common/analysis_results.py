@@ -0,0 +1,480 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Analysis Results Script
+ *****************************************
+
+ Description: Compact storage of the results of an analysis, and paged,
+  sorted and filtered views of them, so that the fix files page can load a
+  large import a page at a time rather than rendering every file at once.
+
+  The results are stored as columns rather than a dictionary per file:
+  the folders are kept once in a table, dates are packed into integers
+  (YYYYMMDDhhmmss) in arrays and the date range is stored once for the
+  task.  Files are only built into dictionaries when they are shown or
+  returned by the API.
+
+  The results of a completed analysis don't change, so each worker keeps
+  the last few it has served, along with the order of the files for each
+  sort and filter in use.
+
+  The choices made on the fix files page are kept in the state store as a
+  list of changes - a date for a file, or a bulk selection for a folder or
+  for all files - and are resolved for each file when the files are shown
+  and when they are processed.
+
+ *****************************************
+"""
+
+import array
+import collections
+import datetime
+import re
+import threading
+from common.analysis import build_analysis_entry, get_image_link, is_valid_date
+
+"""
+Globals
+"""
+
+RESULT_GROUPS = ['files_without_dates', 'files_with_dates', 'ignored_files']
+RESULT_SORT_KEYS = ['filename', 'path', 'date', 'file_date']
+RESULT_DATE_SOURCES = ['exif', 'filedate', 'filename', 'pathname', 'none']
+RESULTS_PAGE_SIZE = 100
+RESULTS_MAX_PAGE_SIZE = 1000
+RESULTS_CACHE_TASKS = 2  # Completed analyses kept by each worker
+RESULTS_CACHE_VIEWS = 16  # Sorted / filtered views kept for each analysis
+RESULTS_FORMAT = 'columns'
+
+IMAGE_COLUMNS = ['date', 'file_date', 'guess_filename', 'guess_pathname', 'guess_filedate']
+NO_DATE = -1  # Missing date in a packed date column
+DATE_PATTERN = re.compile(r'\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}')
+CHOICE_SCOPES = ['file', 'folder', 'all']
+CHOICE_TYPES = ['ignore', 'delete', 'custom', 'startdate', 'enddate', 'filedate', 'filename', 'pathname']
+
+"""
+Analysis Results
+"""
+
+def _to_text(value):
+	""" Dates are datetimes when they are read from a file, and strings once they have been through the state store """
+	if value is None:
+		return None
+	if isinstance(value, datetime.datetime):
+		return value.strftime('%Y-%m-%d %H:%M:%S')
+	return str(value)
+
+def _pack_date(value):
+	""" Pack a date into a YYYYMMDDhhmmss integer.  Dates that aren't in the usual format are kept as text. """
+	text = _to_text(value)
+	if text is None:
+		return None
+	if DATE_PATTERN.fullmatch(text):
+		return int(text[0:4] + text[5:7] + text[8:10] + text[11:13] + text[14:16] + text[17:19])
+	return text
+
+def _unpack_date(value):
+	if value is None or value == NO_DATE or isinstance(value, str):
+		return None if value == NO_DATE else value
+	text = f'{value:014d}'
+	return f'{text[0:4]}-{text[4:6]}-{text[6:8]} {text[8:10]}:{text[10:12]}:{text[12:14]}'
+
+def _compact_dates(values):
+	# An array of packed dates takes 8 bytes a file, a list is kept for the rare column with a date as text
+	try:
+		return array.array('q', [NO_DATE if value is None else value for value in values])
+	except TypeError:
+		return list(values)
+
+def _expand_dates(column):
+	return [None if value == NO_DATE else value for value in column]
+
+def parse_result_filters(args):
+	"""
+	Read the result filters from the arguments of a request
+
+	:param args: Request arguments (i.e. request.args)
+	:return: Dictionary of the filters that were set: 'text', 'folder', 'source', 'start' and 'end'
+	:raises ValueError: If a filter isn't valid
+	"""
+	filters = {}
+	if args.get('filter'):
+		filters['text'] = args['filter'].lower()
+	if args.get('folder'):
+		filters['folder'] = args['folder'].rstrip('/')
+	if args.get('source'):
+		if args['source'] not in RESULT_DATE_SOURCES:
+			raise ValueError(f"Unknown date source '{args['source']}'")
+		filters['source'] = args['source']
+	for name in ['start', 'end']:
+		if args.get(name):
+			try:
+				date = datetime.datetime.fromisoformat(args[name])
+			except ValueError:
+				raise ValueError(f"Invalid {name} date '{args[name]}'")
+			# A date without a time covers the whole of the end day
+			if name == 'end' and len(args[name]) <= 10:
+				date = date.replace(hour=23, minute=59, second=59)
+			filters[name] = date.strftime('%Y-%m-%d %H:%M:%S')
+	return filters
+
+class AnalysisResults:
+	def __init__(self, data=None, original_path=None, start_date=None, end_date=None):
+		"""
+		:param data: Results stored by a completed analysis (from to_data()), or None to start new results that files
+			are added to.  Results stored by earlier versions, with a dictionary per file, are converted.
+		:param original_path: Originals folder that was imported, for new results
+		:param start_date: Start of the date range of the analysis, for new results
+		:param end_date: End of the date range of the analysis, for new results
+		"""
+		self.original_path = original_path
+		self.start_date = _to_text(start_date)
+		self.end_date = _to_text(end_date)
+		self.folders = []
+		self._folder_index = {}
+		self._groups = {group: {'folder': array.array('I'), 'filename': []} for group in RESULT_GROUPS}
+		for group in ['files_with_dates', 'files_without_dates']:
+			self._groups[group].update({column: [] for column in IMAGE_COLUMNS})
+		self._views = collections.OrderedDict()
+		self._lock = threading.Lock()
+		if data is None:
+			return
+		if data.get('format') == RESULTS_FORMAT:
+			self._load(data)
+		else:
+			self._load_entries(data)
+		self._compact()
+
+	def _load(self, data):
+		self.original_path = data.get('original_path')
+		self.start_date = data.get('start_date')
+		self.end_date = data.get('end_date')
+		self.folders = list(data['folders'])
+		for group, columns in self._groups.items():
+			for column in columns:
+				columns[column] = data[group][column]
+
+	def _load_entries(self, data):
+		self.original_path = data.get('original_path')
+		for group in RESULT_GROUPS:
+			for entry in data.get(group, []):
+				if group != 'ignored_files' and self.start_date is None and self.end_date is None:
+					self.start_date = _to_text(entry.get('start_date'))
+					self.end_date = _to_text(entry.get('end_date'))
+				self._add_entry(group, entry)
+
+	def _compact(self):
+		for group, columns in self._groups.items():
+			columns['folder'] = array.array('I', columns['folder'])
+			for column in IMAGE_COLUMNS:
+				if column in columns:
+					columns[column] = _compact_dates(columns[column])
+
+	def _add_entry(self, group, entry):
+		columns = self._groups[group]
+		folder = self._folder_index.get(entry['path'])
+		if folder is None:
+			folder = self._folder_index[entry['path']] = len(self.folders)
+			self.folders.append(entry['path'])
+		columns['folder'].append(folder)
+		columns['filename'].append(entry['filename'])
+		if group == 'ignored_files':
+			return
+		guessed_dates = entry.get('guessed_dates') or {}
+		columns['date'].append(_pack_date(entry.get('date')))
+		columns['file_date'].append(_pack_date(entry.get('file_date')))
+		columns['guess_filename'].append(_pack_date(guessed_dates.get('filename')))
+		columns['guess_pathname'].append(_pack_date(guessed_dates.get('pathname')))
+		columns['guess_filedate'].append(_pack_date(guessed_dates.get('filedate')))
+
+	def add_file(self, root, file, metadata=None):
+		"""
+		Add a file to new results
+
+		:param root: Folder containing the file
+		:param file: Filename
+		:param metadata: Metadata read from the image file (from get_file_metadata()), or None for a file that was
+			ignored
+		"""
+		if metadata is None:
+			self._add_entry('ignored_files', {'path': root, 'filename': file})
+			return
+		group, entry = build_analysis_entry(root, file, metadata, self.start_date, self.end_date)
+		self._add_entry(group, entry)
+
+	def to_data(self):
+		""" Return the results as a JSON serializable dictionary, to store with the task """
+		data = {'format': RESULTS_FORMAT, 'original_path': self.original_path, 'start_date': self.start_date, 'end_date': self.end_date, 'folders': self.folders}
+		for group, columns in self._groups.items():
+			data[group] = {column: list(values) if column in ['folder', 'filename'] else _expand_dates(values) for column, values in columns.items()}
+		return data
+
+	def count(self, group):
+		""" Return the number of files in a group """
+		return len(self._groups[group]['filename'])
+
+	def iter_files(self, group):
+		""" Iterate over the (path, filename) of the files of a group, in the order they were analyzed """
+		columns = self._groups[group]
+		folders = self.folders
+		for folder, filename in zip(columns['folder'], columns['filename']):
+			yield folders[folder], filename
+
+	def get_entry(self, group, index):
+		"""
+		Build the analysis entry of a file, as it was before the results were stored
+
+		:param group: 'files_without_dates', 'files_with_dates' or 'ignored_files'
+		:param index: Index of the file in the group
+		:return: Dictionary of the path, filename, dates, image_link, guessed_dates and date range of the file
+		"""
+		columns = self._groups[group]
+		root = self.folders[columns['folder'][index]]
+		file = columns['filename'][index]
+		entry = {'path': root, 'filename': file}
+		if group == 'ignored_files':
+			return entry
+		if group == 'files_with_dates':
+			entry['date'] = _unpack_date(columns['date'][index])
+		entry.update({
+			'file_date': _unpack_date(columns['file_date'][index]),
+			'image_link': get_image_link(root, file),
+			'guessed_dates': {
+				'filename': _unpack_date(columns['guess_filename'][index]),
+				'pathname': _unpack_date(columns['guess_pathname'][index]),
+				'filedate': _unpack_date(columns['guess_filedate'][index])
+			},
+			'start_date': self.start_date,
+			'end_date': self.end_date
+		})
+		return entry
+
+	def iter_entries(self, group):
+		""" Iterate over the analysis entries of the files of a group """
+		for index in range(self.count(group)):
+			yield self.get_entry(group, index)
+
+	def get_folders(self, group):
+		""" Return the folders that contain files of a group, sorted """
+		return sorted(self.folders[folder] for folder in set(self._groups[group]['folder']))
+
+	def _get_date(self, group, index):
+		# The date of a file: its EXIF date if it has one, otherwise its file date
+		columns = self._groups[group]
+		if group == 'ignored_files':
+			return None
+		return _unpack_date(columns['date'][index]) or _unpack_date(columns['file_date'][index])
+
+	def _get_date_sources(self, group, index):
+		columns = self._groups[group]
+		if group == 'ignored_files':
+			return ['none']
+		sources = ['exif'] if columns['date'][index] not in [None, NO_DATE] else []
+		for source in ['filedate', 'filename', 'pathname']:
+			if columns[f'guess_{source}'][index] not in [None, NO_DATE]:
+				sources.append(source)
+		return sources or ['none']
+
+	def _matches(self, group, index, filters):
+		columns = self._groups[group]
+		path = self.folders[columns['folder'][index]]
+		if 'text' in filters and filters['text'] not in f"{path}/{columns['filename'][index]}".lower():
+			return False
+		if 'folder' in filters and path != filters['folder'] and not path.startswith(filters['folder'] + '/'):
+			return False
+		if 'source' in filters and filters['source'] not in self._get_date_sources(group, index):
+			return False
+		if 'start' in filters or 'end' in filters:
+			date = self._get_date(group, index)
+			if not date or date < filters.get('start', '') or ('end' in filters and date > filters['end']):
+				return False
+		return True
+
+	def _sort_key(self, group, sort):
+		columns = self._groups[group]
+		folders = [self.folders[folder] for folder in columns['folder']]
+		filenames = columns['filename']
+		if sort == 'filename':
+			return lambda index: (filenames[index].lower(), folders[index])
+		if sort == 'path':
+			return lambda index: (folders[index], filenames[index].lower())
+		if sort == 'date':
+			return lambda index: (self._get_date(group, index) or '', folders[index], filenames[index])
+		if group == 'ignored_files':
+			return lambda index: (folders[index], filenames[index])
+		return lambda index: (_unpack_date(columns['file_date'][index]) or '', folders[index], filenames[index])
+
+	def _get_view(self, group, sort, filters):
+		# The indexes of the files of the group, filtered and in order.  Paging through the results reuses them.
+		view_key = (group, sort, tuple(sorted(filters.items())))
+		with self._lock:
+			if view_key in self._views:
+				self._views.move_to_end(view_key)
+				return self._views[view_key]
+		indexes = range(self.count(group))
+		if filters:
+			indexes = [index for index in indexes if self._matches(group, index, filters)]
+		if sort:
+			indexes = sorted(indexes, key=self._sort_key(group, sort.lstrip('-')), reverse=sort.startswith('-'))
+		indexes = array.array('I', indexes)
+		with self._lock:
+			self._views[view_key] = indexes
+			while len(self._views) > RESULTS_CACHE_VIEWS:
+				self._views.popitem(last=False)
+		return indexes
+
+	def query(self, group, offset=0, limit=RESULTS_PAGE_SIZE, sort=None, filters=None):
+		"""
+		Return a page of the files of a group
+
+		:param group: 'files_without_dates', 'files_with_dates' or 'ignored_files'
+		:param offset: Index of the first file of the page, after sorting and filtering
+		:param limit: Number of files in the page
+		:param sort: Optional 'filename', 'path', 'date' or 'file_date', with a leading '-' for descending order.  The
+			files are in the order they were analyzed otherwise.
+		:param filters: Optional dictionary of filters, from parse_result_filters()
+		:return: Dictionary of 'items' (analysis entries), 'total' (number of files that match the filters) and 'count'
+			(number of files in the group)
+		:raises ValueError: If the group or sort isn't valid
+		"""
+		if group not in RESULT_GROUPS:
+			raise ValueError(f"Unknown result group '{group}'")
+		if sort and sort.lstrip('-') not in RESULT_SORT_KEYS:
+			raise ValueError(f"Unknown sort '{sort}'")
+		offset = max(0, offset)
+		limit = max(1, min(limit, RESULTS_MAX_PAGE_SIZE))
+		indexes = self._get_view(group, sort or None, filters or {})
+		return {
+			'items': [self.get_entry(group, index) for index in indexes[offset:offset + limit]],
+			'total': len(indexes),
+			'count': self.count(group)
+		}
+
+class AnalysisResultsCache:
+	def __init__(self, max_tasks=RESULTS_CACHE_TASKS):
+		self._max_tasks = max_tasks
+		self._results = collections.OrderedDict()
+		self._lock = threading.Lock()
+
+	def get(self, task_id, loader):
+		"""
+		Return the results of a completed analysis
+
+		:param task_id: Task ID of the analysis
+		:param loader: Function that returns the task from the state store, if it isn't cached
+		:return: AnalysisResults, or None if the task doesn't exist or hasn't completed
+		"""
+		with self._lock:
+			if task_id in self._results:
+				self._results.move_to_end(task_id)
+				return self._results[task_id]
+		task = loader(task_id)
+		if task is None or task['status'] != 'completed' or 'files_without_dates' not in task['data']:
+			return None
+		results = AnalysisResults(task['data'])
+		with self._lock:
+			self._results[task_id] = results
+			while len(self._results) > self._max_tasks:
+				self._results.popitem(last=False)
+		return results
+
+	def clear(self):
+		with self._lock:
+			self._results.clear()
+
+def apply_bulk_choice(entry, choice, bulk_type, bulk_value=None):
+	"""
+	Apply a bulk selection (i.e. 'Use File Date for All') to the choice for a file without a date.  Selections of a
+	date the file doesn't have leave its choice as it was.
+
+	:param entry: Analysis entry of the file
+	:param choice: Current choice for the file
+	:param bulk_type: 'ignore', 'delete', 'custom', 'startdate', 'enddate', 'filedate', 'filename' or 'pathname'
+	:param bulk_value: Date for a 'custom' selection
+	:return: New choice for the file
+	"""
+	if bulk_type in ['ignore', 'delete']:
+		return bulk_type
+	if bulk_type == 'custom':
+		return bulk_value or ''
+	if bulk_type == 'startdate':
+		return entry.get('start_date') or choice
+	if bulk_type == 'enddate':
+		return entry.get('end_date') or choice
+	if bulk_type in ['filedate', 'filename', 'pathname']:
+		return (entry.get('guessed_dates') or {}).get(bulk_type) or choice
+	return choice
+
+def parse_choice(fields):
+	"""
+	Read a choice for the files without dates from the fields of a request
+
+	:param fields: Request form or JSON of scope ('file' by default, 'folder' or 'all'), target (the path and filename
+		of the file, or the folder), type (one of CHOICE_TYPES) and value (the date of a 'custom' choice)
+	:return: Dictionary of scope, target, type and value
+	:raises ValueError: If the choice isn't valid
+	"""
+	scope = fields.get('scope') or 'file'
+	if scope not in CHOICE_SCOPES:
+		raise ValueError(f"Unknown choice scope '{scope}'")
+	choice_type = fields.get('type')
+	if choice_type not in CHOICE_TYPES:
+		raise ValueError(f"Unknown choice type '{choice_type}'")
+	target = '' if scope == 'all' else (fields.get('target') or '').rstrip('/')
+	if scope != 'all' and not target:
+		raise ValueError(f"A {scope} choice needs a target")
+	value = fields.get('value') or None
+	if choice_type == 'custom' and not (value and is_valid_date(value)):
+		raise ValueError(f"Invalid date '{value}'")
+	return {'scope': scope, 'target': target, 'type': choice_type, 'value': value if choice_type == 'custom' else None}
+
+class FileChoices:
+	"""
+	The choices for the files without dates of an analysis, from the list kept in the state store.  A file starts
+	as 'ignore', then gets its own choice if one was made, then each folder or bulk selection that covers it and was
+	made after that, in order.
+	"""
+	def __init__(self, choices):
+		self._files = {}
+		self._rules = []
+		for choice in choices:
+			if choice['scope'] == 'file':
+				self._files[choice['target']] = choice
+			else:
+				self._rules.append(choice)
+
+	def get_choice(self, path, filename, get_entry):
+		"""
+		Return the choice for a file
+
+		:param path: Folder of the file
+		:param filename: Name of the file
+		:param get_entry: Function that returns the analysis entry of the file, only called if a choice needs its dates
+		:return: 'ignore', 'delete' or the date to write to the file
+		"""
+		own = self._files.get(f'{path}/{filename}')
+		seq = own['seq'] if own else 0
+		choices = [own] if own else []
+		choices += [rule for rule in self._rules if rule['seq'] > seq and (rule['scope'] == 'all' or path == rule['target'] or path.startswith(rule['target'] + '/'))]
+		choice = 'ignore'
+		entry = None
+		for other in choices:
+			if entry is None and other['type'] not in ['ignore', 'delete', 'custom']:
+				entry = get_entry()
+			choice = apply_bulk_choice(entry, choice, other['type'], other['value'])
+		return choice
+
+def resolve_choices(results, choices):
+	"""
+	Resolve the choice for each of the files without dates of an analysis, for process_files()
+
+	:param results: AnalysisResults of the analysis
+	:param choices: List of choices for the analysis from the state store, in the order they were made
+	:return: Dictionary of 'choices_fileid_<path>/<filename>' -> choice
+	"""
+	file_choices = FileChoices(choices)
+	task_list = {}
+	for index, (path, filename) in enumerate(results.iter_files('files_without_dates')):
+		task_list[f"choices_fileid_{path}/{filename}"] = file_choices.get_choice(path, filename, lambda: results.get_entry('files_without_dates', index))
+	return task_list
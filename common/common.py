@@ -10,13 +10,16 @@
  *****************************************
 """
 
+import concurrent.futures
 import datetime
 import json
 import yaml
 import io
 import logging
 import os
+import stat
 import sys
+import time
 from collections.abc import Mapping
 from logging.handlers import RotatingFileHandler
 
@@ -25,6 +28,7 @@ Globals
 """
 
 CONFIG_FOLDER = 'config/'
+FOLDER_MTIME_SETTLE_NS = 2 * 1000000000  # Directory mtimes newer than this (2s) aren't trusted for incremental scans
 
 """
 Common Functions
@@ -167,8 +171,50 @@ def default_settings():
 		'enabled': True
 	}
 
+	settings['performance'] = {
+		'analyze_workers': 0, # 0 = automatic, based on the number of CPUs
+		'analyze_executor': 'thread', # 'thread' for I/O bound (i.e. NAS) imports, 'process' for CPU bound parsing
+		'metadata_cache': True, # Cache EXIF / file dates between analyses in config/metadata_cache.db
+		'metadata_cache_max_entries': 500000,
+		'state_backend': 'sqlite', # 'sqlite' shares task / process state between gunicorn workers, 'memory' for a single worker (restart required)
+		'job_concurrency': 2, # Copy / analyze / process tasks that can run at once, others wait in a queue (one task at a time per folder)
+		'scan_workers': 8, # Threads used to scan the originals folder tree (top level folders are scanned concurrently)
+		'copy_workers': 4, # Files copied in parallel from originals to import, 0 = automatic
+		'copy_resume': True, # Skip files already in the import folder with the same size and mtime
+		'import_transfer': 'copy', # 'copy', 'reflink' or 'hardlink' from originals to import, falls back to 'copy' across devices
+		'export_transfer': 'rename', # 'rename' or 'copy' (and delete) from import to export, falls back to 'copy' across devices
+		'export_mode': 'replace', # 'replace' clears the export folder before processing, 'incremental' adds to it (files with the same content aren't exported twice)
+		'process_workers': 4, # Files edited / moved to the export folder in parallel when processing, 0 = automatic
+		'sort_pattern': '%Y/%m', # strftime pattern for the dated folders that sorted files are moved to
+		'sort_workers': 4, # Files dated / moved in parallel when sorting, 0 = automatic
+		'thumbnail_workers': 2, # Background thumbnail creation after analysis, 0 = only create thumbnails on request
+		'thumbnail_cache_max_mb': 1024
+	}
+
 	return settings
 
+def get_worker_count(configured, executor='thread'):
+	"""
+	Resolve a configured worker count into the number of workers to use
+
+	:param configured: Configured number of workers (0 or less = automatic)
+	:param executor: 'thread' or 'process'
+	:return: Number of workers (minimum of 1)
+	"""
+	try:
+		configured = int(configured)
+	except (TypeError, ValueError):
+		configured = 0
+
+	if configured > 0:
+		return configured
+
+	cpu_count = os.cpu_count() or 1
+	if executor == 'process':
+		return cpu_count
+	# Threads spend most of their time waiting on I/O, so allow more of them than there are cores
+	return min(32, cpu_count + 4)
+
 def read_settings(filename=f'{CONFIG_FOLDER}settings.json', init=False, retry_count=0):
 	"""
 	Read Settings from file
@@ -241,10 +287,12 @@ def write_settings(settings):
 def upgrade_settings(prev_ver, settings, settings_default):
 	''' Check if upgrading from v0.1.4 or earlier '''
 	if prev_ver[0] == 0 and prev_ver[1] <= 4:
-		''' Update the folders to remove ./ from each path, re-write folders.json '''
+		''' Update the folders to remove ./ from each path.  The old folders.json (with ./ paths) is set aside, so the
+		folder catalog is filled by scanning the originals folder rather than imported from it. '''
 		settings['folders'] = settings_default['folders']
-		folder_status = read_folder_status(reset=True)
-		write_folder_status(folder_status)
+		legacy_path = f'{CONFIG_FOLDER}folders.json'
+		if os.path.exists(legacy_path):
+			os.replace(legacy_path, f'{legacy_path}.migrated')
 
 	return settings 
 
@@ -324,6 +372,26 @@ def write_generic_json(dictionary, filename):
 		event = f'Error writing generic json file ({filename})'
 		write_log(event)
 
+def write_json_atomic(data, filename, indent=2):
+	"""
+	Write a JSON file atomically, by writing a temporary file in the same folder and renaming it over the
+	original, so a crash part way through never leaves a truncated file behind
+
+	:param data: Object to write
+	:param filename: Path to the JSON file
+	:param indent: JSON indent, or None for a compact file
+	"""
+	temp_filename = f'{filename}.{os.getpid()}.tmp'
+	try:
+		with open(temp_filename, 'w') as json_file:
+			json.dump(data, json_file, indent=indent)
+			json_file.flush()
+			os.fsync(json_file.fileno())
+		os.replace(temp_filename, filename)
+	finally:
+		if os.path.exists(temp_filename):
+			os.remove(temp_filename)
+
 def read_generic_yaml(filename):
 	try:
 		yaml_file = os.fdopen(os.open(filename, os.O_RDONLY))
@@ -362,12 +430,71 @@ def write_log(event, log_level=logging.INFO):
 	event_logger = create_logger('app', filename='logs/app.log', level=log_level)
 	event_logger.info(event)
 
-def scan_directory(path='originals'):
+def read_log_since(filename, offset=0, max_bytes=1024*1024):
+	"""
+	Read the bytes added to a log file since a byte offset
+
+	:param filename: Path to the log file
+	:param offset: Byte offset to read from (the next_offset of the previous read).  If the file is now smaller 
+		than the offset (i.e. it was rotated), reading starts again from the beginning.
+	:param max_bytes: Maximum number of bytes to return.  If there is more, the read ends at the last complete line.
+	:return: Dictionary of text, next_offset, size, more (True if there is more to read) and reset (True if the 
+		offset was past the end of the file)
+	"""
+	with open(filename, 'rb') as file:
+		size = os.fstat(file.fileno()).st_size
+		reset = offset < 0 or offset > size
+		if reset:
+			offset = 0
+		file.seek(offset)
+		data = file.read(min(max_bytes, size - offset))
+	more = offset + len(data) < size
+	if more and b'\n' in data:
+		data = data[:data.rindex(b'\n') + 1]
+	return {'text': data.decode('utf-8', errors='replace'), 'next_offset': offset + len(data), 'size': size, 'more': more, 'reset': reset}
+
+def read_log_tail(filename, lines=500, max_bytes=1024*1024, block_size=64*1024):
+	"""
+	Read the last lines of a log file, reading backwards from the end so the whole file is never read
+
+	:param filename: Path to the log file
+	:param lines: Maximum number of lines to return
+	:param max_bytes: Maximum number of bytes to read from the end of the file
+	:param block_size: Number of bytes to read at a time
+	:return: Dictionary of text, next_offset (the end of the file, for use with read_log_since), size and 
+		truncated (True if there are earlier lines that weren't returned)
+	"""
+	with open(filename, 'rb') as file:
+		size = os.fstat(file.fileno()).st_size
+		position = size
+		data = b''
+		# Look for one extra newline, so that the first line returned is complete
+		while position > 0 and data.count(b'\n') <= lines and size - position < max_bytes:
+			read_size = min(block_size, position, max_bytes - (size - position))
+			position -= read_size
+			file.seek(position)
+			data = file.read(read_size) + data
+	# Keep only the last 'lines' lines
+	split_lines = data.splitlines(keepends=True)
+	truncated = position > 0 or len(split_lines) > lines
+	if position > 0 and split_lines:
+		split_lines = split_lines[1:]  # The first line is most likely partial
+	split_lines = split_lines[-lines:] if lines > 0 else []
+	return {'text': b''.join(split_lines).decode('utf-8', errors='replace'), 'next_offset': size, 'size': size, 'truncated': truncated}
+
+def scan_directory(path='originals', workers=0, previous=None):
 	"""
 	Scans a directory and returns a dictionary containing information about its contents.
 
+	Uses os.scandir() so that the file / folder type of each entry comes from the directory listing rather than 
+	a separate stat call per entry.  When the result of an earlier scan is passed in, directories whose mtime 
+	hasn't changed (so no entries were added, removed or renamed) reuse the earlier listing, and only need a 
+	stat to check their subfolders.
+
 	Args:
 		path (str): Path to the directory to scan
+		workers (int): Number of threads used to scan the top level subfolders concurrently (0 or 1 = serial)
+		previous (dict): Optional result of an earlier scan of the same path, for an incremental scan
 		
 	Returns:
 		dict: Dictionary containing:
@@ -375,6 +502,8 @@ def scan_directory(path='originals'):
 			- files: List of files in the directory
 			- subfolders: Dictionary of subdirectories with same structure
 			- processed: Boolean flag for tracking processing status
+			- mtime: Modification time (ns) of the directory when it was listed, or None if it was modified 
+			  too recently to be trusted for the next incremental scan
 	"""
 	result = {
 		'processed': False,
@@ -382,26 +511,53 @@ def scan_directory(path='originals'):
 		'num_files': 0,
 		'num_subfolders': 0,
 		'files': [],
-		'subfolders': {}
+		'subfolders': {},
+		'mtime': None
 	}
 
-	# Check if path exists and is a directory
-	if not os.path.exists(path) or not os.path.isdir(path):
-		return result
-		
 	# Get all items in directory
 	try:
-		items = os.listdir(path)
-		
-		for item in items:
-			full_path = os.path.join(path, item)
-			
-			# If item is a file, add to files list
-			if os.path.isfile(full_path):
-				result['files'].append(item)
-			# If item is a directory, recursively scan it
-			elif os.path.isdir(full_path):
-				result['subfolders'][item] = scan_directory(full_path)
+		# Check if path exists and is a directory
+		try:
+			path_stat = os.stat(path)
+		except FileNotFoundError:
+			return result
+		if not stat.S_ISDIR(path_stat.st_mode):
+			return result
+		mtime = path_stat.st_mtime_ns
+		if not isinstance(previous, dict) or 'subfolders' not in previous:
+			previous = {}
+		previous_subfolders = previous.get('subfolders', {})
+
+		subfolder_paths = {}
+		if previous.get('mtime') is not None and previous.get('mtime') == mtime:
+			# Unchanged since the last scan, reuse its listing
+			result['files'] = list(previous.get('files', []))
+			for name in previous_subfolders:
+				subfolder_paths[name] = os.path.join(path, name)
+		else:
+			with os.scandir(path) as entries:
+				for entry in entries:
+					# If item is a file, add to files list
+					if entry.is_file():
+						result['files'].append(entry.name)
+					# If item is a directory, scan it below
+					elif entry.is_dir():
+						subfolder_paths[entry.name] = entry.path
+		# Filesystems with coarse timestamps can miss changes made in the same tick as the listing, so only 
+		# trust the mtime once it is safely in the past
+		if time.time_ns() - mtime > FOLDER_MTIME_SETTLE_NS:
+			result['mtime'] = mtime
+
+		if workers > 1 and len(subfolder_paths) > 1:
+			# Each top level subtree is scanned serially in its own thread
+			with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as executor:
+				futures = {name: executor.submit(scan_directory, subfolder_path, 0, previous_subfolders.get(name)) for name, subfolder_path in subfolder_paths.items()}
+				for name, future in futures.items():
+					result['subfolders'][name] = future.result()
+		else:
+			for name, subfolder_path in subfolder_paths.items():
+				result['subfolders'][name] = scan_directory(subfolder_path, 0, previous_subfolders.get(name))
 			
 		result['num_files'] = len(result['files'])
 		result['num_subfolders'] = len(result['subfolders'])
@@ -420,118 +576,6 @@ def scan_directory(path='originals'):
 
 	return result
 
-def read_folder_status(path='config/folders.json', originals_path='originals', reset=False):
-	"""
-	Read the folder status from a JSON file
-
-	:param path: Path to the folder status file
-	:param originals_path: Path to scan for originals
-	:param reset: Whether to force a rescan of the directory
-	:return: JSON object with folder status
-	"""
-	folder_status = {}
-	existing_status = {}
-	
-	try:
-		# Try to read existing status file if it exists
-		if os.path.exists(path):
-			with open(path, 'r') as f:
-				existing_status = json.load(f)
-	except Exception as e:
-		event = f"Warning: Could not read existing folder status: {e}"
-		write_log(event)
-		
-	try:
-		if reset:
-			# Scan directory for new structure
-			folder_status = {originals_path : scan_directory(path=originals_path)}
-			# If we have existing status, overlay the processed flags
-			if existing_status:
-				folder_status = update_folder_status(folder_status, existing_status)
-			write_folder_status(folder_status, path)
-		else:
-			if existing_status:
-				folder_status = existing_status
-			else:
-				folder_status = {originals_path : scan_directory(path=originals_path)}
-				write_folder_status(folder_status, path)
-	except FileNotFoundError:
-		event = f"Warning: Folder status file not found at {path}. Scanning directory instead."
-		write_log(event)
-		folder_status = {originals_path : scan_directory(path=originals_path)}
-		write_folder_status(folder_status, path)
-	
-	return folder_status
-
-def write_folder_status(folder_status, path='config/folders.json'):
-	"""
-	Write the folder status to a JSON file, creating a timestamped backup if needed
-
-	:param folder_status: JSON object containing folder status
-	:param path: Path to the folder status file
-	:return: folder_status object that was written
-	"""
-	try:
-		# Create backup if file exists and has content
-		if os.path.exists(path):
-			try:
-				with open(path, 'r') as f:
-					existing = json.load(f)
-					if existing:  # Only backup if there's actual content
-						timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-						backup_path = f"{path}.{timestamp}.bak"
-						with open(backup_path, 'w') as f:
-							json.dump(existing, f, indent=2)
-						event = f"Created backup of folder status at {backup_path}"
-						write_log(event)
-						
-						# Clean up old backups
-						cleanup_old_backups(path)
-			except Exception as e:
-				event = f"Warning: Could not create backup: {e}"
-				write_log(event)
-		
-		# Write new status file
-		with open(path, 'w') as f:
-			json.dump(folder_status, f, indent=2)
-		event = f"Folder status file written to {path}"
-		write_log(event)
-		
-	except Exception as e:
-		event = f"Error writing folder status file: {e}"
-		write_log(event)
-		raise
-
-	return folder_status
-
-def update_folder_status(new, current):
-
-	def get_processed_flags(current, processed_list):
-		for key, value in current.items():
-			if isinstance(value, dict):
-				if value['processed']:
-					processed_list.append(value['path'])
-				if value['subfolders'] != {}:
-					get_processed_flags(value['subfolders'], processed_list)
-
-	def set_processed_flags(new, processed_list):
-		for key, value in new.items():
-			if isinstance(value, dict):
-				if value['path'] in processed_list:
-					#print(f'Setting {value["path"]} as processed')
-					value['processed'] = True
-				if value['subfolders'] != {}:
-					set_processed_flags(value['subfolders'], processed_list)
-
-	#print(f'\n ** Attempting Overlay ** \n')
-	
-	processed_list = []
-	get_processed_flags(current, processed_list)
-	#print(f'Processed List: {processed_list}')
-	set_processed_flags(new, processed_list)
-
-	return new
-
 def semantic_ver_to_list(version_string):
 	# Count number of '.' in string
 	decimal_count = version_string.count('.')
@@ -565,128 +609,3 @@ def semantic_ver_is_lower(version_A, version_B):
 			elif version_A [2] > version_B[2]:
 				return False
 	return False
-
-def list_available_backups(path):
-	"""
-	List all available backups for a given file
-
-	:param path: Path to the main JSON file (not the backup)
-	:return: List of dictionaries containing backup information, sorted by date (newest first)
-	"""
-	backups = []
-	try:
-		directory = os.path.dirname(path)
-		base_name = os.path.basename(path)
-		
-		if directory == "":
-			directory = "."
-			
-		for filename in os.listdir(directory):
-			if filename.startswith(base_name) and filename.endswith('.bak'):
-				try:
-					# Extract timestamp from filename
-					timestamp_str = filename.split('.')[-2]
-					file_date = datetime.datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-					
-					backup_path = os.path.join(directory, filename)
-					file_size = os.path.getsize(backup_path)
-					
-					backups.append({
-						'filename': filename,
-						'path': backup_path,
-						'date': file_date,
-						'size': file_size
-					})
-				except (ValueError, IndexError):
-					continue
-					
-		# Sort backups by date, newest first
-		backups.sort(key=lambda x: x['date'], reverse=True)
-		
-	except Exception as e:
-		event = f"Error listing backup files: {e}"
-		write_log(event)
-		
-	return backups
-
-def restore_backup(backup_path, target_path=None):
-	"""
-	Restore a backup file to its original location or a specified target
-
-	:param backup_path: Path to the backup file to restore
-	:param target_path: Optional path to restore to (if None, derives from backup name)
-	:return: True if successful, False otherwise
-	"""
-	try:
-		if target_path is None:
-			# Remove the timestamp and .bak from the backup filename
-			parts = backup_path.split('.')
-			target_path = '.'.join(parts[:-2])
-		
-		# Create a backup of the current file before restoring
-		if os.path.exists(target_path):
-			write_folder_status(read_folder_status(target_path), target_path)
-			
-		# Restore the backup
-		with open(backup_path, 'r') as source:
-			data = json.load(source)
-			with open(target_path, 'w') as target:
-				json.dump(data, target, indent=2)
-				
-		event = f"Restored backup from {backup_path} to {target_path}"
-		write_log(event)
-		return True
-		
-	except Exception as e:
-		event = f"Error restoring backup: {e}"
-		write_log(event)
-		return False
-
-def cleanup_old_backups(path, days=None):
-	"""
-	Clean up backup files older than specified number of days
-
-	:param path: Path to the main JSON file (not the backup)
-	:param days: Optional number of days to keep backups (if None, uses settings value)
-	"""
-	# Read settings to get retention period
-	settings = read_settings()
-	if not settings['backup']['enabled']:
-		return
-		
-	if days is None:
-		days = settings['backup']['retention_days']
-	try:
-		# Get the directory and base filename
-		directory = os.path.dirname(path)
-		base_name = os.path.basename(path)
-		
-		# Get current time
-		now = datetime.datetime.now()
-		
-		# Look for backup files
-		if directory == "":
-			directory = "."
-		for filename in os.listdir(directory):
-			if filename.startswith(base_name) and filename.endswith('.bak'):
-				try:
-					# Extract timestamp from filename (format: YYYYMMDD_HHMMSS)
-					timestamp_str = filename.split('.')[-2]  # Get the timestamp part
-					file_date = datetime.datetime.strptime(timestamp_str, '%Y%m%d_%H%M%S')
-					
-					# Calculate age in days
-					age = now - file_date
-					
-					# Remove if older than specified days
-					if age.days > days:
-						file_path = os.path.join(directory, filename)
-						os.remove(file_path)
-						event = f"Removed old backup file: {filename}"
-						write_log(event)
-				except (ValueError, IndexError):
-					# Skip files that don't match our timestamp format
-					continue
-	except Exception as e:
-		event = f"Error cleaning up backup files: {e}"
-		write_log(event)
-
@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Copy Engine Script
+ *****************************************
+
+ Description: Copies a list of files with a bounded pool of worker threads.
+  Errors are collected per file rather than stopping the whole copy, and in
+  resume mode files that were already copied (same size and mtime) are
+  skipped, so an interrupted copy can carry on where it stopped.
+
+  Files can be transferred as hardlinks or reflinks (copy on write clones)
+  instead of byte copies, and moved with a rename, falling back to a byte
+  copy when that isn't possible (i.e. across devices).
+
+ *****************************************
+"""
+
+import concurrent.futures
+import errno
+import os
+import shutil
+try:
+	import fcntl
+except ImportError:
+	fcntl = None  # Not available on Windows, reflinks fall back to a byte copy
+
+"""
+Globals
+"""
+
+COPY_MTIME_TOLERANCE = 1.0  # Seconds, some filesystems (i.e. FAT, SMB) store mtimes at a lower resolution
+TRANSFER_MODES = ['copy', 'reflink', 'hardlink']
+MOVE_MODES = ['rename', 'copy']
+FICLONE = 0x40049409  # Linux ioctl to clone (reflink) a whole file, supported by Btrfs, XFS and others
+# Errors that mean a link / clone / rename isn't possible here, rather than a problem with the file itself
+FALLBACK_ERRNOS = {errno.EXDEV, errno.EPERM, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP, errno.ENOTTY, errno.EINVAL, errno.ENOSYS, errno.EBADF}
+
+"""
+Copy Engine
+"""
+
+def is_same_file_copy(source_stat, destination_path):
+	"""
+	Check if the destination already holds a completed copy of the source (same size and mtime)
+
+	:param source_stat: os.stat() result for the source file
+	:param destination_path: Path to the destination file
+	:return: True if the destination exists and matches
+	"""
+	try:
+		destination_stat = os.stat(destination_path)
+	except OSError:
+		return False
+	return destination_stat.st_size == source_stat.st_size and abs(destination_stat.st_mtime - source_stat.st_mtime) < COPY_MTIME_TOLERANCE
+
+def reflink_file(source_path, destination_path):
+	"""
+	Clone a file with the FICLONE ioctl, so that the copy shares its data blocks with the source until either is 
+	modified
+
+	:param source_path: Path to the source file
+	:param destination_path: Path to the destination file
+	"""
+	if fcntl is None:
+		raise OSError(errno.ENOTSUP, 'Reflinks are not supported on this platform')
+	try:
+		with open(source_path, 'rb') as source, open(destination_path, 'wb') as destination:
+			fcntl.ioctl(destination.fileno(), FICLONE, source.fileno())
+	except OSError:
+		if os.path.exists(destination_path):
+			os.remove(destination_path)
+		raise
+
+def transfer_file(source_path, destination_path, mode='copy'):
+	"""
+	Create a copy of a file using the chosen transfer mode, falling back to a byte copy if the mode isn't possible
+	(i.e. the source and destination are on different devices, or the filesystem doesn't support reflinks)
+
+	Hardlinked files share their data with the source.  Anything that modifies a transferred file must replace it
+	(write a new file and rename it over the top) rather than writing to it in place, as the EXIF writer does.
+
+	:param source_path: Path to the source file
+	:param destination_path: Path to the destination file, which is replaced if it exists
+	:param mode: 'copy', 'reflink' or 'hardlink'
+	:return: Tuple of (mode used, warning message or None)
+	"""
+	if mode == 'hardlink':
+		try:
+			if os.path.lexists(destination_path):
+				os.remove(destination_path)
+			os.link(source_path, destination_path)
+			return 'hardlink', None
+		except OSError as e:
+			if e.errno not in FALLBACK_ERRNOS:
+				raise
+	elif mode == 'reflink':
+		try:
+			reflink_file(source_path, destination_path)
+			mode_used = 'reflink'
+		except OSError as e:
+			if e.errno not in FALLBACK_ERRNOS:
+				raise
+			mode_used = None
+		if mode_used:
+			try:
+				shutil.copystat(source_path, destination_path)
+			except OSError as e:
+				return mode_used, f"copystat failed for '{source_path}': {e}"
+			return mode_used, None
+
+	shutil.copyfile(source_path, destination_path)
+	try:
+		shutil.copystat(source_path, destination_path)
+	except OSError as e:
+		# Metadata copy failures should not stop the content copy.
+		return 'copy', f"copystat failed for '{source_path}': {e}"
+	return 'copy', None
+
+def move_file(source_path, destination_path, mode='rename'):
+	"""
+	Move a file, with a rename where possible and a byte copy and delete otherwise
+
+	:param source_path: Path to the source file
+	:param destination_path: Path to the destination file, which is replaced if it exists
+	:param mode: 'rename' or 'copy'
+	:return: Mode used ('rename' or 'copy')
+	"""
+	if mode == 'rename':
+		try:
+			os.rename(source_path, destination_path)
+			return 'rename'
+		except OSError as e:
+			if e.errno not in FALLBACK_ERRNOS:
+				raise
+	shutil.copy2(source_path, destination_path)
+	os.remove(source_path)
+	return 'copy'
+
+def copy_file(source_path, destination_path, resume=False, mode='copy'):
+	"""
+	Copy a single file, including its timestamps and permissions
+
+	The timestamps are copied after the data, so a partially copied file never looks complete to a resumed copy.
+
+	:param source_path: Path to the source file
+	:param destination_path: Path to the destination file
+	:param resume: Skip the copy if the destination already matches the source
+	:param mode: Transfer mode, 'copy', 'reflink' or 'hardlink'
+	:return: Tuple of ('skipped' or the transfer mode used, warning message or None)
+	"""
+	if not os.path.isfile(source_path):
+		raise OSError(f"Not a regular file: {source_path}")
+	source_stat = os.stat(source_path)
+	if resume and is_same_file_copy(source_stat, destination_path):
+		return 'skipped', None
+	return transfer_file(source_path, destination_path, mode)
+
+def copy_files(copy_list, workers=4, resume=False, mode='copy', progress_callback=None):
+	"""
+	Copy a list of files with a pool of worker threads
+
+	:param copy_list: List of (source path, destination path) tuples.  Destination folders must already exist.
+	:param workers: Number of worker threads
+	:param resume: Skip files where the destination already matches the source
+	:param mode: Transfer mode, 'copy', 'reflink' or 'hardlink'
+	:param progress_callback: Optional function called with (files done, total files) as files complete.  If it
+		returns False the copy is stopped.
+	:return: Dictionary of copied, skipped, methods (number of files per transfer mode used), warnings, errors 
+		(list of {'path', 'error'}) and cancelled
+	"""
+	result = {'copied': 0, 'skipped': 0, 'methods': {}, 'warnings': [], 'errors': [], 'cancelled': False}
+	total = len(copy_list)
+	done = 0
+	max_pending = max(1, workers) * 4
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+		pending = {}
+		next_index = 0
+		while next_index < total or pending:
+			# Keep a bounded number of copies queued so that cancellation is responsive
+			while next_index < total and len(pending) < max_pending:
+				source_path, destination_path = copy_list[next_index]
+				pending[executor.submit(copy_file, source_path, destination_path, resume, mode)] = source_path
+				next_index += 1
+
+			finished, _ = concurrent.futures.wait(pending, return_when=concurrent.futures.FIRST_COMPLETED)
+			for future in finished:
+				source_path = pending.pop(future)
+				try:
+					outcome, warning = future.result()
+					if outcome == 'skipped':
+						result['skipped'] += 1
+					else:
+						result['copied'] += 1
+						result['methods'][outcome] = result['methods'].get(outcome, 0) + 1
+					if warning:
+						result['warnings'].append(warning)
+				except OSError as e:
+					result['errors'].append({'path': source_path, 'error': str(e)})
+				done += 1
+
+			if progress_callback and progress_callback(done, total) is False:
+				result['cancelled'] = True
+				for future in pending:
+					future.cancel()
+				break
+	return result
+
+def clear_folder(path, keep_files=None):
+	"""
+	Remove the contents of a folder (but not the folder itself)
+
+	:param path: Folder to clear
+	:param keep_files: Optional set of file paths to keep, along with the folders that
+		contain them.  Used by a resumed copy to remove only the files that aren't part of the copy.
+	:return: Number of files removed
+	"""
+	removed = 0
+	if not os.path.isdir(path):
+		return removed
+	if keep_files is None:
+		for entry in os.scandir(path):
+			if entry.is_dir(follow_symlinks=False):
+				removed += sum(len(files) for _, _, files in os.walk(entry.path))
+				shutil.rmtree(entry.path)
+			else:
+				os.remove(entry.path)
+				removed += 1
+		return removed
+
+	keep_files = {os.path.normpath(file_path) for file_path in keep_files}
+	for root, dirs, files in os.walk(path, topdown=False):
+		for file in files:
+			file_path = os.path.join(root, file)
+			if os.path.normpath(file_path) not in keep_files:
+				os.remove(file_path)
+				removed += 1
+		for folder in dirs:
+			folder_path = os.path.join(root, folder)
+			if os.path.islink(folder_path):
+				os.remove(folder_path)
+			elif not os.listdir(folder_path):
+				os.rmdir(folder_path)
+	return removed
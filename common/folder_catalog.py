@@ -0,0 +1,491 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Folder Catalog Script
+ *****************************************
+
+ Description: SQLite catalog of the folders in the originals folder, with
+  their file counts and processed flags.  Each folder is one row, so
+  changing a flag is a single row update rather than rewriting the whole
+  tree.  The nested folders.json format is still used to import / export
+  the catalog (backup and restore).
+
+  An in-memory index of the catalog maps each path to its node, with the
+  number of folders and processed folders in its subtree, so browsing and
+  toggling folders doesn't have to walk the tree.
+
+  Every change is also recorded in the folder journal, which is used to
+  restore the catalog to an earlier point in time.
+
+ *****************************************
+"""
+
+import json
+import os
+import sqlite3
+import threading
+from common.common import CONFIG_FOLDER, write_log, scan_directory
+from common.folder_journal import FolderJournal, FOLDER_HISTORY_FOLDER, JOURNAL_RETENTION_DAYS
+from common.state_store import FileLock, STATE_LOCK_FOLDER
+
+"""
+Globals
+"""
+
+FOLDER_CATALOG_PATH = f'{CONFIG_FOLDER}folders.db'
+LEGACY_FOLDER_STATUS_PATH = f'{CONFIG_FOLDER}folders.json'
+
+"""
+Folder Catalog
+"""
+
+def normalize_folder_path(path):
+	""" Normalize a folder path so that i.e. './originals/' and 'originals' refer to the same row """
+	return os.path.normpath(path)
+
+def _subtree_range(path):
+	# Every descendant path starts with 'path/', and in binary collation these all sort between 'path/' and 'path0'
+	return (path + '/', path + '0')
+
+def validate_folder_status(folder_status):
+	"""
+	Check that an object is in the nested folders.json format, raising ValueError if it isn't
+
+	:param folder_status: Dictionary of root path -> nested folder node
+	"""
+	if not isinstance(folder_status, dict) or not folder_status:
+		raise ValueError('Folder status must be a dictionary of root folders')
+	for root, node in folder_status.items():
+		if not isinstance(node, dict) or 'path' not in node or 'subfolders' not in node:
+			raise ValueError(f"Folder status entry '{root}' is not a folder")
+
+def _flatten_tree(node, parent, position, rows):
+	""" Flatten a nested folder node (as returned by scan_directory) into catalog rows """
+	if not node or 'path' not in node:
+		# Folders that couldn't be scanned (i.e. permission denied) have no details to store
+		return
+	path = normalize_folder_path(node['path'])
+	rows.append({
+		'path': path,
+		'parent': parent,
+		'name': os.path.basename(path),
+		'position': position,
+		'num_files': node.get('num_files', 0),
+		'num_subfolders': node.get('num_subfolders', 0),
+		'processed': bool(node.get('processed', False)),
+		'dir_mtime': node.get('mtime'),
+		'files': node.get('files', [])
+	})
+	for index, child in enumerate(node.get('subfolders', {}).values()):
+		_flatten_tree(child, path, index, rows)
+
+def rows_to_folder_status(rows):
+	"""
+	Build the nested folders.json format from catalog rows
+
+	:param rows: Iterable of row dictionaries (path, parent, position, num_files, num_subfolders, processed, dir_mtime, files)
+	:return: Dictionary of root path -> nested folder node, for each row whose parent isn't in rows
+	"""
+	nodes = {}
+	children = {}
+	for row in sorted(rows, key=lambda row: row['position']):
+		nodes[row['path']] = {
+			'processed': bool(row['processed']),
+			'path': row['path'],
+			'num_files': row['num_files'],
+			'num_subfolders': row['num_subfolders'],
+			'files': row['files'],
+			'subfolders': {},
+			'mtime': row['dir_mtime']
+		}
+		children.setdefault(row['parent'], []).append(row['path'])
+	folder_status = {}
+	for parent, paths in children.items():
+		for path in paths:
+			if parent in nodes:
+				nodes[parent]['subfolders'][os.path.basename(path)] = nodes[path]
+			else:
+				folder_status[path] = nodes[path]
+	return folder_status
+
+class FolderIndex:
+	"""
+	In-memory index of the folder catalog.  Each node holds its children and the number of folders / processed
+	folders in its subtree (itself included), which are kept up to date as flags change.  Not thread safe on its
+	own, FolderCatalog holds its lock around every call.
+	"""
+	def __init__(self):
+		self._nodes = {}
+
+	def load(self, rows):
+		"""
+		Rebuild the index
+
+		:param rows: Iterable of (path, parent, name, position, num_files, num_subfolders, processed) tuples
+		"""
+		nodes = {}
+		positions = {}
+		for path, parent, name, position, num_files, num_subfolders, processed in rows:
+			nodes[path] = {
+				'path': path,
+				'parent': parent,
+				'name': name,
+				'num_files': num_files,
+				'num_subfolders': num_subfolders,
+				'processed': bool(processed),
+				'children': [],
+				'total': 1,
+				'processed_total': 1 if processed else 0
+			}
+			positions[path] = position
+		for path in sorted(nodes, key=lambda path: positions[path]):
+			parent = nodes[path]['parent']
+			if parent in nodes:
+				nodes[parent]['children'].append(path)
+		# Add each subtree's counts to its parent, deepest folders first
+		for path in sorted(nodes, key=lambda path: path.count('/'), reverse=True):
+			parent = nodes[path]['parent']
+			if parent in nodes:
+				nodes[parent]['total'] += nodes[path]['total']
+				nodes[parent]['processed_total'] += nodes[path]['processed_total']
+		self._nodes = nodes
+
+	def get(self, path):
+		return self._nodes.get(path)
+
+	def get_children(self, path):
+		node = self._nodes.get(path)
+		return [self._nodes[child] for child in node['children']] if node else []
+
+	def get_counts(self, path):
+		node = self._nodes.get(path)
+		return (node['total'], node['processed_total']) if node else (0, 0)
+
+	def set_processed(self, path, flag, recursive=False):
+		"""
+		Set the processed flag of a node (and optionally its subtree), then update the counts of its ancestors
+
+		:return: True if the path is in the index
+		"""
+		node = self._nodes.get(path)
+		if node is None:
+			return False
+		previous_total = node['processed_total']
+		if recursive:
+			stack = [node]
+			while stack:
+				current = stack.pop()
+				current['processed'] = flag
+				current['processed_total'] = current['total'] if flag else 0
+				stack.extend(self._nodes[child] for child in current['children'])
+		elif node['processed'] != flag:
+			node['processed'] = flag
+			node['processed_total'] += 1 if flag else -1
+		delta = node['processed_total'] - previous_total
+		parent = self._nodes.get(node['parent'])
+		while delta and parent is not None:
+			parent['processed_total'] += delta
+			parent = self._nodes.get(parent['parent'])
+		return True
+
+class FolderCatalog:
+	def __init__(self, path=FOLDER_CATALOG_PATH, journal=None):
+		self._path = path
+		self._journal = journal
+		self._lock = threading.Lock()
+		os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+		self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+		self._conn.row_factory = sqlite3.Row
+		with self._lock:
+			self._conn.execute('PRAGMA journal_mode=WAL')
+			self._conn.execute('PRAGMA synchronous=NORMAL')
+			self._conn.execute('''CREATE TABLE IF NOT EXISTS folders (
+				path TEXT PRIMARY KEY,
+				parent TEXT,
+				name TEXT NOT NULL,
+				position INTEGER NOT NULL DEFAULT 0,
+				num_files INTEGER NOT NULL DEFAULT 0,
+				num_subfolders INTEGER NOT NULL DEFAULT 0,
+				processed INTEGER NOT NULL DEFAULT 0,
+				dir_mtime INTEGER,
+				files TEXT NOT NULL DEFAULT '[]'
+			)''')
+			self._conn.execute('CREATE INDEX IF NOT EXISTS idx_folders_parent ON folders (parent, position)')
+			self._conn.commit()
+			self._index = FolderIndex()
+			self._reload_index()
+
+	def _reload_index(self):
+		# Caller must hold self._lock
+		self._index.load(self._conn.execute('SELECT path, parent, name, position, num_files, num_subfolders, processed FROM folders'))
+		self._data_version = self._conn.execute('PRAGMA data_version').fetchone()[0]
+
+	def _sync_index(self):
+		# Caller must hold self._lock.  data_version changes when another connection (i.e. another worker) commits.
+		if self._conn.execute('PRAGMA data_version').fetchone()[0] != self._data_version:
+			self._reload_index()
+
+	def _export_rows(self):
+		# Caller must hold self._lock
+		return [self._row_to_folder(row) for row in self._conn.execute('SELECT * FROM folders')]
+
+	def _insert_rows(self, rows):
+		# Caller must hold self._lock, and commit
+		self._conn.execute('DELETE FROM folders')
+		self._conn.executemany('INSERT OR REPLACE INTO folders (path, parent, name, position, num_files, num_subfolders, processed, dir_mtime, files) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)',
+			[(row['path'], row['parent'], row['name'], row['position'], row['num_files'], row['num_subfolders'], int(row['processed']), row['dir_mtime'], json.dumps(row['files'])) for row in rows])
+
+	def _journal_change(self, op, data, snapshot=False):
+		# Caller must hold self._lock and call this before committing.  The database write lock is held until the
+		#  commit, so the journal records changes in the same order as the database, even across workers.
+		if self._journal is None:
+			return
+		try:
+			self._journal.append(op, data)
+			if snapshot or self._journal.needs_snapshot():
+				self._journal.write_snapshot(self._export_rows())
+		except Exception as e:
+			write_log(f'Warning: Could not record folder change in the journal: {e}')
+
+	def set_journal(self, journal):
+		"""
+		Start recording changes in a journal, writing a first snapshot if the journal is new
+
+		:param journal: FolderJournal
+		"""
+		with self._lock:
+			self._journal = journal
+			if not journal.has_snapshot():
+				journal.write_snapshot(self._export_rows())
+
+	def get_journal(self):
+		return self._journal
+
+	def _row_to_folder(self, row):
+		folder = dict(row)
+		folder['processed'] = bool(folder['processed'])
+		folder['files'] = json.loads(folder['files'])
+		return folder
+
+	def is_empty(self):
+		with self._lock:
+			return self._conn.execute('SELECT 1 FROM folders LIMIT 1').fetchone() is None
+
+	def get_folder(self, path):
+		"""
+		Get a single folder
+
+		:param path: Path of the folder
+		:return: Dictionary of the folder's columns, or None if it isn't in the catalog
+		"""
+		with self._lock:
+			row = self._conn.execute('SELECT * FROM folders WHERE path = ?', (normalize_folder_path(path),)).fetchone()
+		return self._row_to_folder(row) if row else None
+
+	def get_children(self, path):
+		"""
+		Get the subfolders of a folder, in the order they were scanned
+
+		:param path: Path of the folder
+		:return: List of dictionaries of the subfolders' path, name, num_files, num_subfolders and processed flag
+		"""
+		with self._lock:
+			self._sync_index()
+			return [{key: child[key] for key in ['path', 'name', 'num_files', 'num_subfolders', 'processed']} for child in self._index.get_children(normalize_folder_path(path))]
+
+	def get_processed_counts(self, path):
+		"""
+		Count the folders in a subtree, and how many of them are flagged as processed
+
+		:param path: Path of the folder at the top of the subtree (included in the counts)
+		:return: Tuple of (number of folders, number of processed folders)
+		"""
+		with self._lock:
+			self._sync_index()
+			return self._index.get_counts(normalize_folder_path(path))
+
+	def set_processed(self, path, flag, recursive=False):
+		"""
+		Set the processed flag of a folder
+
+		:param path: Path of the folder
+		:param flag: True / False
+		:param recursive: Also set the flag on every folder below it
+		:return: True if the folder was found, False otherwise
+		"""
+		path = normalize_folder_path(path)
+		with self._lock:
+			self._sync_index()
+			found = self._conn.execute('UPDATE folders SET processed = ? WHERE path = ?', (int(bool(flag)), path)).rowcount > 0
+			if found and recursive:
+				low, high = _subtree_range(path)
+				self._conn.execute('UPDATE folders SET processed = ? WHERE path >= ? AND path < ?', (int(bool(flag)), low, high))
+			if found:
+				self._journal_change('set_processed', {'path': path, 'flag': bool(flag), 'recursive': recursive})
+			self._conn.commit()
+			self._index.set_processed(path, bool(flag), recursive)
+		return found
+
+	def update_from_scan(self, tree):
+		"""
+		Update the catalog from a scan of a folder (see scan_directory()).  Folders that are no longer there are
+		removed, new folders are added as not processed, and existing folders keep their processed flag.
+
+		:param tree: Nested folder node returned by scan_directory()
+		:return: Tuple of (number of rows added or changed, number of rows removed)
+		"""
+		rows = []
+		if tree and 'path' in tree:
+			root = normalize_folder_path(tree['path'])
+			parent = os.path.dirname(root) or None
+			_flatten_tree(tree, parent, 0, rows)
+		if not rows:
+			return 0, 0
+		low, high = _subtree_range(root)
+		with self._lock:
+			existing = {row['path']: row for row in self._conn.execute('SELECT path, parent, position, num_files, num_subfolders, dir_mtime, files FROM folders WHERE path = ? OR (path >= ? AND path < ?)', (root, low, high))}
+			changed = []
+			for row in rows:
+				files_json = json.dumps(row['files'])
+				current = existing.pop(row['path'], None)
+				if current is None or (current['parent'], current['position'], current['num_files'], current['num_subfolders'], current['dir_mtime'], current['files']) != (row['parent'], row['position'], row['num_files'], row['num_subfolders'], row['dir_mtime'], files_json):
+					changed.append((row['path'], row['parent'], row['name'], row['position'], row['num_files'], row['num_subfolders'], row['dir_mtime'], files_json))
+			self._conn.executemany('''INSERT INTO folders (path, parent, name, position, num_files, num_subfolders, dir_mtime, files) VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+				ON CONFLICT(path) DO UPDATE SET parent = excluded.parent, name = excluded.name, position = excluded.position, num_files = excluded.num_files,
+				num_subfolders = excluded.num_subfolders, dir_mtime = excluded.dir_mtime, files = excluded.files''', changed)
+			self._conn.executemany('DELETE FROM folders WHERE path = ?', [(path,) for path in existing])
+			if changed or existing:
+				upserts = [dict(zip(['path', 'parent', 'name', 'position', 'num_files', 'num_subfolders', 'dir_mtime'], values[:7]), files=json.loads(values[7])) for values in changed]
+				self._journal_change('scan', {'upserts': upserts, 'removed': list(existing)})
+			self._conn.commit()
+			if changed or existing:
+				self._reload_index()
+		return len(changed), len(existing)
+
+	def replace_all(self, folder_status):
+		"""
+		Replace the whole catalog, including the processed flags, from the nested folders.json format
+
+		:param folder_status: Dictionary of root path -> nested folder node
+		"""
+		validate_folder_status(folder_status)
+		rows = []
+		for root, node in folder_status.items():
+			_flatten_tree(node, os.path.dirname(normalize_folder_path(node['path'])) or None, 0, rows)
+		with self._lock:
+			self._insert_rows(rows)
+			self._journal_change('replace', {}, snapshot=True)
+			self._conn.commit()
+			self._reload_index()
+		write_log(f'Folder catalog replaced with {len(rows)} folders')
+
+	def restore_point(self, seq):
+		"""
+		Restore the catalog to how it was after a journaled change.  The restore is itself journaled, so it can be
+		undone by restoring to the point before it.
+
+		:param seq: Number of the change
+		"""
+		if self._journal is None:
+			raise ValueError('The folder catalog has no journal')
+		rows = list(self._journal.get_rows_at(seq).values())
+		with self._lock:
+			self._insert_rows(rows)
+			self._journal_change('replace', {'restored_seq': seq}, snapshot=True)
+			self._conn.commit()
+			self._reload_index()
+		write_log(f'Folder catalog restored to point {seq} ({len(rows)} folders)')
+
+	def to_folder_status(self, root):
+		"""
+		Export a subtree of the catalog in the nested folders.json format
+
+		:param root: Path of the folder at the top of the subtree
+		:return: Dictionary of {root: nested folder node}, or an empty dictionary if the root isn't in the catalog
+		"""
+		root = normalize_folder_path(root)
+		low, high = _subtree_range(root)
+		with self._lock:
+			rows = self._conn.execute('SELECT * FROM folders WHERE path = ? OR (path >= ? AND path < ?)', (root, low, high)).fetchall()
+		folder_status = rows_to_folder_status([self._row_to_folder(row) for row in rows])
+		return {root: folder_status[root]} if root in folder_status else {}
+
+	def get_stats(self):
+		""" Return the number of folders and the size of the catalog on disk """
+		with self._lock:
+			count = self._conn.execute('SELECT COUNT(*) FROM folders').fetchone()[0]
+		size = 0
+		for suffix in ['', '-wal', '-shm']:
+			if os.path.exists(self._path + suffix):
+				size += os.path.getsize(self._path + suffix)
+		return {'folders': count, 'size': size}
+
+	def close(self):
+		with self._lock:
+			self._conn.close()
+
+def open_folder_catalog(originals_path='originals', scan_workers=0, path=FOLDER_CATALOG_PATH, legacy_path=LEGACY_FOLDER_STATUS_PATH, history_folder=FOLDER_HISTORY_FOLDER, retention_days=JOURNAL_RETENTION_DAYS):
+	"""
+	Open the folder catalog and its journal.  The first time, the catalog is filled from an existing folders.json
+	(which is then renamed to folders.json.migrated) or by scanning the originals folder.  The timestamped
+	folders.json.<time>.bak backups written before the catalog are left where they are, and can still be uploaded
+	on the admin page to restore from.
+
+	:param originals_path: Path to the originals folder
+	:param scan_workers: Number of threads used to scan the originals folder
+	:param path: Path to the catalog database
+	:param legacy_path: Path to the folders.json used before the catalog
+	:param history_folder: Folder for the journal and snapshots
+	:param retention_days: Days of history to keep
+	:return: FolderCatalog
+	"""
+	catalog = FolderCatalog(path)
+	# Several workers may start at once, only one of them fills the catalog
+	with FileLock(os.path.join(STATE_LOCK_FOLDER, 'folder_catalog.lock')):
+		if catalog.is_empty():
+			imported = False
+			if os.path.exists(legacy_path):
+				try:
+					with open(legacy_path, 'r') as f:
+						catalog.replace_all(json.load(f))
+					os.replace(legacy_path, f'{legacy_path}.migrated')
+					write_log(f'Folder catalog imported from {legacy_path}')
+					imported = True
+				except Exception as e:
+					write_log(f'Warning: Could not import {legacy_path} into the folder catalog, scanning instead: {e}')
+			if not imported:
+				catalog.update_from_scan(scan_directory(path=originals_path, workers=scan_workers))
+		catalog.set_journal(FolderJournal(history_folder, retention_days=retention_days))
+	return catalog
+
+def list_available_backups(catalog, limit=None):
+	"""
+	List the points in time the folder catalog can be restored to
+
+	:param catalog: FolderCatalog
+	:param limit: Optional maximum number of points to return
+	:return: List of dictionaries of seq, date and description, newest first
+	"""
+	journal = catalog.get_journal()
+	return journal.list_points(limit) if journal is not None else []
+
+def restore_backup(catalog, seq=None, date=None):
+	"""
+	Restore the folder catalog to a journaled point in time
+
+	:param catalog: FolderCatalog
+	:param seq: Number of the change to restore to
+	:param date: Or, a datetime.datetime to restore the catalog as it was at that time
+	:return: True if successful, False otherwise
+	"""
+	try:
+		if seq is None:
+			seq = catalog.get_journal().find_point(date) if date is not None and catalog.get_journal() is not None else None
+			if seq is None:
+				raise ValueError(f'No folder history at {date}')
+		catalog.restore_point(seq)
+		return True
+	except Exception as e:
+		write_log(f'Error restoring folder catalog: {e}')
+		return False
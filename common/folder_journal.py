@@ -0,0 +1,316 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Folder Journal Script
+ *****************************************
+
+ Description: History of the folder catalog, as an append-only journal
+  with one line per change (a processed flag, a rescan or a restore) and
+  periodic snapshots of the whole catalog.  The catalog can be rebuilt as
+  it was at any point in the journal by loading the snapshot before it and
+  replaying the changes up to it.
+
+  Each snapshot starts a new journal file, so old history is removed a
+  snapshot (and its journal) at a time once it is past the retention
+  period.
+
+ *****************************************
+"""
+
+import datetime
+import json
+import os
+import threading
+from common.common import CONFIG_FOLDER, write_log, write_json_atomic
+
+"""
+Globals
+"""
+
+FOLDER_HISTORY_FOLDER = f'{CONFIG_FOLDER}folder_history/'
+JOURNAL_COMPACT_ENTRIES = 1000  # Write a new snapshot after this many changes
+JOURNAL_RETENTION_DAYS = 7
+
+"""
+Folder Journal
+"""
+
+def _snapshot_name(seq):
+	return f'snapshot.{seq:012d}.json'
+
+def _journal_name(seq):
+	return f'journal.{seq:012d}.jsonl'
+
+def _describe_entry(entry):
+	""" Describe a journal entry for the list of restore points """
+	if entry['op'] == 'set_processed':
+		state = 'processed' if entry['flag'] else 'not processed'
+		subfolders = ' (and subfolders)' if entry.get('recursive') else ''
+		return f"Marked {entry['path']}{subfolders} as {state}"
+	if entry['op'] == 'scan':
+		return f"Rescan: {len(entry['upserts'])} folders added or changed, {len(entry['removed'])} removed"
+	if entry['op'] == 'replace':
+		if entry.get('restored_seq') is not None:
+			return f"Restored to point {entry['restored_seq']}"
+		return 'Folders replaced (reset or restore from file)'
+	return entry['op']
+
+def apply_journal_entry(rows, entry):
+	"""
+	Apply a journal entry to a set of catalog rows
+
+	:param rows: Dictionary of path -> row dictionary, modified in place
+	:param entry: Journal entry
+	"""
+	if entry['op'] == 'set_processed':
+		path = entry['path']
+		if path in rows:
+			rows[path]['processed'] = entry['flag']
+			if entry.get('recursive'):
+				prefix = path + '/'
+				for row_path, row in rows.items():
+					if row_path.startswith(prefix):
+						row['processed'] = entry['flag']
+	elif entry['op'] == 'scan':
+		for upsert in entry['upserts']:
+			processed = rows[upsert['path']]['processed'] if upsert['path'] in rows else False
+			rows[upsert['path']] = dict(upsert, processed=processed)
+		for path in entry['removed']:
+			rows.pop(path, None)
+	elif entry['op'] == 'replace':
+		# The catalog was replaced wholesale, and a snapshot was written at this point
+		raise ValueError(f"Point {entry['seq']} replaced the catalog and can only be restored from its snapshot")
+	else:
+		raise ValueError(f"Unknown journal entry '{entry['op']}'")
+
+class FolderJournal:
+	def __init__(self, folder=FOLDER_HISTORY_FOLDER, compact_entries=JOURNAL_COMPACT_ENTRIES, retention_days=JOURNAL_RETENTION_DAYS):
+		self._folder = folder
+		self._compact_entries = compact_entries
+		self._retention_days = retention_days
+		self._lock = threading.Lock()
+		os.makedirs(folder, exist_ok=True)
+
+		self._base = None
+		self._size = None
+		with self._lock:
+			self._sync()
+			journal_path = os.path.join(folder, _journal_name(self._base))
+			if os.path.exists(journal_path) and self._repair_journal(journal_path):
+				self._size = None
+				self._sync()
+
+	def _sync(self):
+		# Caller must hold self._lock.  Another worker may have appended to the journal or written a snapshot since
+		#  this one last looked, so the current journal and last change are checked on every use.
+		snapshots = self._list_seqs('snapshot.')
+		journals = self._list_seqs('journal.')
+		# The current journal starts at the newest snapshot (or journal, if a snapshot is missing)
+		base = max(snapshots[-1] if snapshots else 0, journals[-1] if journals else 0)
+		journal_path = os.path.join(self._folder, _journal_name(base))
+		size = os.path.getsize(journal_path) if os.path.exists(journal_path) else 0
+		if base != self._base or size != self._size:
+			last_entry = self._read_last_entry(journal_path) if size else None
+			self._base = base
+			self._size = size
+			self._seq = last_entry['seq'] if last_entry else base
+		self._has_snapshot = bool(snapshots)
+
+	def _read_last_entry(self, journal_path):
+		""" Read the last entry of a journal, reading back from the end of the file rather than the whole file """
+		with open(journal_path, 'rb') as journal_file:
+			position = journal_file.seek(0, os.SEEK_END)
+			data = b''
+			while position > 0:
+				step = min(64 * 1024, position)
+				position -= step
+				journal_file.seek(position)
+				data = journal_file.read(step) + data
+				if b'\n' in data.rstrip(b'\n'):
+					break
+		try:
+			return json.loads(data.rstrip(b'\n').rsplit(b'\n', 1)[-1])
+		except ValueError:
+			entries = self._read_journal(journal_path)
+			return entries[-1] if entries else None
+
+	def _list_seqs(self, prefix):
+		seqs = []
+		for filename in os.listdir(self._folder):
+			if filename.startswith(prefix) and not filename.endswith('.tmp'):
+				try:
+					seqs.append(int(filename.split('.')[1]))
+				except (IndexError, ValueError):
+					continue
+		return sorted(seqs)
+
+	def _repair_journal(self, journal_path):
+		""" Remove a partly written last line, left behind if the app stopped in the middle of an append """
+		with open(journal_path, 'rb+') as journal_file:
+			data = journal_file.read()
+			if data and not data.endswith(b'\n'):
+				journal_file.truncate(data.rfind(b'\n') + 1)
+				write_log(f'Removed a partly written entry from {journal_path}')
+				return True
+		return False
+
+	def _read_journal(self, journal_path):
+		entries = []
+		with open(journal_path, 'r') as journal_file:
+			for line in journal_file:
+				try:
+					entries.append(json.loads(line))
+				except ValueError:
+					continue
+		return entries
+
+	def get_seq(self):
+		""" Return the number of the last journaled change """
+		with self._lock:
+			self._sync()
+			return self._seq
+
+	def has_snapshot(self):
+		with self._lock:
+			self._sync()
+			return self._has_snapshot
+
+	def needs_snapshot(self):
+		""" Return True once enough changes have been journaled since the last snapshot """
+		with self._lock:
+			self._sync()
+			return self._seq - self._base >= self._compact_entries
+
+	def append(self, op, data):
+		"""
+		Append a change to the journal
+
+		:param op: 'set_processed', 'scan' or 'replace'
+		:param data: Dictionary with the details of the change
+		:return: Number of the change
+		"""
+		with self._lock:
+			self._sync()
+			self._seq += 1
+			entry = dict(data, seq=self._seq, time=datetime.datetime.now().isoformat(), op=op)
+			line = (json.dumps(entry) + '\n').encode('utf-8', 'surrogateescape')
+			fd = os.open(os.path.join(self._folder, _journal_name(self._base)), os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+			try:
+				os.write(fd, line)
+			finally:
+				os.close(fd)
+			self._size += len(line)
+			return self._seq
+
+	def write_snapshot(self, rows):
+		"""
+		Write a snapshot of the catalog at the current point, start a new journal and remove history that is past
+		the retention period
+
+		:param rows: List of catalog row dictionaries
+		"""
+		with self._lock:
+			self._sync()
+			snapshot = {'seq': self._seq, 'time': datetime.datetime.now().isoformat(), 'folders': rows}
+			write_json_atomic(snapshot, os.path.join(self._folder, _snapshot_name(self._seq)), indent=None)
+			self._base = self._seq
+			self._size = 0
+			self._has_snapshot = True
+		write_log(f'Folder history snapshot written at point {snapshot["seq"]}')
+		self.cleanup()
+
+	def cleanup(self):
+		"""
+		Remove snapshots older than the retention period (the newest snapshot is always kept), along with the journal
+		entries before the oldest remaining snapshot
+
+		:return: Number of files removed
+		"""
+		removed = 0
+		with self._lock:
+			snapshots = self._list_seqs('snapshot.')
+			cutoff = datetime.datetime.now() - datetime.timedelta(days=self._retention_days)
+			keep_from = snapshots[-1] if snapshots else 0
+			for seq in snapshots[:-1]:
+				if datetime.datetime.fromtimestamp(os.path.getmtime(os.path.join(self._folder, _snapshot_name(seq)))) >= cutoff:
+					keep_from = seq
+					break
+			for prefix, name in [('snapshot.', _snapshot_name), ('journal.', _journal_name)]:
+				for seq in self._list_seqs(prefix):
+					if seq < keep_from:
+						os.remove(os.path.join(self._folder, name(seq)))
+						removed += 1
+		if removed:
+			write_log(f'Removed {removed} folder history files past the retention period')
+		return removed
+
+	def list_points(self, limit=None):
+		"""
+		List the points in time the catalog can be restored to
+
+		:param limit: Optional maximum number of points to return
+		:return: List of dictionaries of seq, date and description, newest first
+		"""
+		with self._lock:
+			snapshots = self._list_seqs('snapshot.')
+			journals = self._list_seqs('journal.')
+		if not snapshots:
+			return []
+		points = []
+		for base in reversed([seq for seq in journals if seq >= snapshots[0]]):
+			for entry in reversed(self._read_journal(os.path.join(self._folder, _journal_name(base)))):
+				points.append({'seq': entry['seq'], 'date': datetime.datetime.fromisoformat(entry['time']), 'description': _describe_entry(entry)})
+				if limit is not None and len(points) >= limit:
+					return points
+		# The first snapshot may not have a journal entry of its own (i.e. the initial scan)
+		if not points or points[-1]['seq'] > snapshots[0]:
+			with open(os.path.join(self._folder, _snapshot_name(snapshots[0])), 'r') as snapshot_file:
+				snapshot = json.load(snapshot_file)
+			points.append({'seq': snapshot['seq'], 'date': datetime.datetime.fromisoformat(snapshot['time']), 'description': 'Snapshot'})
+		return points
+
+	def find_point(self, date):
+		"""
+		Find the last change made at or before a point in time
+
+		:param date: datetime.datetime
+		:return: Number of the change, or None if the history doesn't go back that far
+		"""
+		for point in self.list_points():
+			if point['date'] <= date:
+				return point['seq']
+		return None
+
+	def get_rows_at(self, seq):
+		"""
+		Rebuild the catalog as it was after a change
+
+		:param seq: Number of the change
+		:return: Dictionary of path -> row dictionary
+		"""
+		with self._lock:
+			self._sync()
+			if seq > self._seq:
+				raise ValueError(f'Point {seq} is in the future')
+			snapshots = [snapshot for snapshot in self._list_seqs('snapshot.') if snapshot <= seq]
+			journals = self._list_seqs('journal.')
+		if not snapshots:
+			raise ValueError(f'Point {seq} is older than the folder history')
+		with open(os.path.join(self._folder, _snapshot_name(snapshots[-1])), 'r') as snapshot_file:
+			snapshot = json.load(snapshot_file)
+		rows = {row['path']: row for row in snapshot['folders']}
+		current = snapshot['seq']
+		for base in [base for base in journals if base >= snapshots[-1]]:
+			for entry in self._read_journal(os.path.join(self._folder, _journal_name(base))):
+				if entry['seq'] <= current:
+					continue
+				if entry['seq'] > seq:
+					return rows
+				if entry['seq'] != current + 1:
+					raise ValueError(f"Folder history is missing changes {current + 1} to {entry['seq'] - 1}")
+				apply_journal_entry(rows, entry)
+				current = entry['seq']
+		if current != seq:
+			raise ValueError(f'Folder history is missing changes {current + 1} to {seq}')
+		return rows
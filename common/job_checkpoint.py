@@ -0,0 +1,231 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Job Checkpoint Script
+ *****************************************
+
+ Description: Checkpoints of the analyze and process tasks in
+  config/jobs/, so that a task interrupted by a restart (i.e. an image
+  update or the container running out of memory) can be resumed, or its
+  changes rolled back, rather than starting again from nothing.
+
+  Each task has a small header (<task_id>.json) with a summary to list
+  it by, the parameters it was started with (<task_id>.params.json, which
+  can hold a whole analysis), both written once, and a log
+  (<task_id>.jsonl) that the task appends its progress to.  The files are
+  removed when the task finishes.
+  A running task holds a lock on <task_id>.lock, so a checkpoint whose
+  lock is free belongs to a task that is no longer running.
+
+ *****************************************
+"""
+
+import datetime
+import json
+import os
+import threading
+from common.analysis import metadata_from_json, metadata_to_json
+from common.common import CONFIG_FOLDER, write_log, write_json_atomic
+from common.state_store import FileLock
+
+"""
+Globals
+"""
+
+JOB_CHECKPOINT_FOLDER = f'{CONFIG_FOLDER}jobs/'
+JOB_CHECKPOINT_INTERVAL = 10  # Seconds between checkpoints of a task's progress
+
+_open_checkpoints = set()  # Task IDs with a checkpoint open in this process
+_open_checkpoints_lock = threading.Lock()
+_log_line_counts = {}  # Log path -> (size, mtime_ns, number of lines), so unchanged logs aren't counted again
+
+"""
+Job Checkpoint
+"""
+
+class JobCheckpoint:
+	def __init__(self, task_id, folder=JOB_CHECKPOINT_FOLDER):
+		self.task_id = task_id
+		self.header = None
+		self._folder = folder
+		self._header_path = os.path.join(folder, f'{task_id}.json')
+		self._params_path = os.path.join(folder, f'{task_id}.params.json')
+		self._log_path = os.path.join(folder, f'{task_id}.jsonl')
+		self._lock_path = os.path.join(folder, f'{task_id}.lock')
+		self._lock = FileLock(self._lock_path)
+		self._is_open = False
+
+	@classmethod
+	def create(cls, task_id, kind, params, summary=None, folder=JOB_CHECKPOINT_FOLDER):
+		"""
+		Start the checkpoint of a new task
+
+		:param task_id: Task ID
+		:param kind: 'analyze' or 'process'
+		:param params: JSON serializable parameters needed to resume the task
+		:param summary: Small JSON serializable dictionary describing the task, for the list of unfinished tasks
+		:return: JobCheckpoint, open until close() or finish() is called
+		"""
+		checkpoint = cls(task_id, folder)
+		checkpoint._open()
+		header = {'task_id': task_id, 'kind': kind, 'started': datetime.datetime.now().isoformat(), 'summary': summary or {}}
+		try:
+			# The header is written last, a checkpoint without one is never listed or opened
+			write_json_atomic(params, checkpoint._params_path, indent=None)
+			open(checkpoint._log_path, 'wb').close()
+			write_json_atomic(header, checkpoint._header_path, indent=None)
+		except Exception:
+			checkpoint.close()
+			raise
+		checkpoint.header = dict(header, params=params)
+		return checkpoint
+
+	@classmethod
+	def open(cls, task_id, folder=JOB_CHECKPOINT_FOLDER):
+		"""
+		Open the checkpoint of an unfinished task, to resume or roll it back
+
+		:param task_id: Task ID
+		:return: JobCheckpoint, open until close() or finish() is called
+		:raises ValueError: If there is no checkpoint for the task, or the task is still running
+		"""
+		checkpoint = cls(task_id, folder)
+		if not os.path.exists(checkpoint._header_path):
+			raise ValueError(f'No checkpoint found for task {task_id}')
+		checkpoint._open()
+		try:
+			with open(checkpoint._header_path, 'r') as header_file:
+				checkpoint.header = json.load(header_file)
+			with open(checkpoint._params_path, 'r') as params_file:
+				checkpoint.header['params'] = json.load(params_file)
+			checkpoint._repair_log()
+		except Exception:
+			checkpoint.close()
+			raise
+		return checkpoint
+
+	def _open(self):
+		os.makedirs(self._folder, exist_ok=True)
+		with _open_checkpoints_lock:
+			if self.task_id in _open_checkpoints or not self._lock.acquire(blocking=False):
+				raise ValueError(f'Task {self.task_id} is still running')
+			_open_checkpoints.add(self.task_id)
+		self._is_open = True
+
+	def _repair_log(self):
+		# Remove a partly written last line, left behind if the task stopped in the middle of an append
+		if not os.path.exists(self._log_path):
+			return
+		with open(self._log_path, 'rb+') as log_file:
+			data = log_file.read()
+			if data and not data.endswith(b'\n'):
+				log_file.truncate(data.rfind(b'\n') + 1)
+
+	def append(self, entries):
+		"""
+		Append entries to the log of the task
+
+		:param entries: List of JSON serializable dictionaries
+		"""
+		if not entries:
+			return
+		data = ''.join(json.dumps(entry, default=str) + '\n' for entry in entries).encode('utf-8', 'surrogateescape')
+		fd = os.open(self._log_path, os.O_WRONLY | os.O_APPEND | os.O_CREAT, 0o644)
+		try:
+			os.write(fd, data)
+		finally:
+			os.close(fd)
+
+	def read_entries(self):
+		""" Return the entries in the log of the task """
+		entries = []
+		if not os.path.exists(self._log_path):
+			return entries
+		with open(self._log_path, 'r', encoding='utf-8', errors='surrogateescape') as log_file:
+			for line in log_file:
+				try:
+					entries.append(json.loads(line))
+				except ValueError:
+					continue
+		return entries
+
+	def add_metadata(self, items):
+		"""
+		Checkpoint the metadata read by an analysis
+
+		:param items: List of (key, metadata) tuples, where key is a (path, size, mtime_ns, inode) tuple
+		"""
+		self.append([{'key': list(key), 'metadata': metadata_to_json(metadata)} for key, metadata in items])
+
+	def get_metadata(self):
+		"""
+		Return the metadata checkpointed by an analysis
+
+		:return: Dictionary of path -> (key, metadata)
+		"""
+		metadata = {}
+		for entry in self.read_entries():
+			if 'key' in entry:
+				metadata[entry['key'][0]] = (tuple(entry['key']), metadata_from_json(entry['metadata']))
+		return metadata
+
+	def close(self):
+		""" Close the checkpoint, leaving it in place so that the task can be resumed """
+		if not self._is_open:
+			return
+		self._is_open = False
+		with _open_checkpoints_lock:
+			_open_checkpoints.discard(self.task_id)
+			self._lock.release()
+
+	def finish(self):
+		""" Remove the checkpoint of a finished (or discarded) task """
+		for path in [self._header_path, self._log_path, self._params_path, self._lock_path]:
+			try:
+				os.remove(path)
+			except FileNotFoundError:
+				pass
+		self.close()
+
+def _count_lines(path):
+	stat_result = os.stat(path)
+	cached = _log_line_counts.get(path)
+	if cached and cached[:2] == (stat_result.st_size, stat_result.st_mtime_ns):
+		return cached[2]
+	count = 0
+	with open(path, 'rb') as log_file:
+		for chunk in iter(lambda: log_file.read(1024 * 1024), b''):
+			count += chunk.count(b'\n')
+	_log_line_counts[path] = (stat_result.st_size, stat_result.st_mtime_ns, count)
+	return count
+
+def list_unfinished_jobs(folder=JOB_CHECKPOINT_FOLDER):
+	"""
+	List the tasks that were interrupted before they finished.  Only the small headers are read, not the parameters.
+
+	:param folder: Checkpoint folder
+	:return: List of dictionaries of task_id, kind, started, summary and checkpointed (number of log entries), oldest first
+	"""
+	jobs = []
+	if not os.path.isdir(folder):
+		return jobs
+	for filename in os.listdir(folder):
+		if not filename.endswith('.json') or filename.endswith('.params.json'):
+			continue
+		task_id = filename[:-len('.json')]
+		checkpoint = JobCheckpoint(task_id, folder)
+		try:
+			checkpoint._open()
+		except ValueError:
+			continue  # Still running
+		try:
+			with open(checkpoint._header_path, 'r') as header_file:
+				header = json.load(header_file)
+			checkpointed = _count_lines(checkpoint._log_path) if os.path.exists(checkpoint._log_path) else 0
+			jobs.append(dict(header, started=datetime.datetime.fromisoformat(header['started']), checkpointed=checkpointed))
+		except (OSError, ValueError, KeyError) as e:
+			write_log(f"Unable to read the checkpoint of task {task_id}: {e}")
+		finally:
+			checkpoint.close()
+	return sorted(jobs, key=lambda job: job['started'])
@@ -0,0 +1,191 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Job Scheduler Script
+ *****************************************
+
+ Description: Runs the background tasks (copy, analyze and process) with
+  a limit on the number of tasks running at once and only one task at a
+  time per folder.  Tasks that can't start yet wait in a queue, with their
+  position in the queue shown as the task's progress.
+
+  Tasks are cancelled through the state store: a cancelled task is marked
+  'cancelled', its next progress update fails and the task stops at that
+  point.  This works from any gunicorn worker, as do the folder locks and
+  the running task slots, which are held with the state store's locks.
+
+ *****************************************
+"""
+
+import hashlib
+import os
+import threading
+from common.common import write_log
+
+"""
+Globals
+"""
+
+JOB_CONCURRENCY = 2  # Default number of tasks that can run at once (across all workers)
+JOB_POLL_INTERVAL = 1.0  # Seconds between checks for slots and folders freed by other workers
+
+"""
+Job Scheduler
+"""
+
+class Job:
+	def __init__(self, task_id, kind, folders, target, args):
+		self.task_id = task_id
+		self.kind = kind
+		self.folders = folders
+		self.target = target
+		self.args = args
+		self.locks = []
+
+class JobScheduler:
+	def __init__(self, store, concurrency=JOB_CONCURRENCY):
+		"""
+		:param store: StateStore that holds the tasks and locks
+		:param concurrency: Number of tasks that can run at once, or a function that returns it (so that a
+			change to the settings applies straight away)
+		"""
+		self._store = store
+		self._concurrency = concurrency
+		self._queue = []
+		self._running = {}
+		self._condition = threading.Condition()
+		self._thread = None
+
+	def _get_concurrency(self):
+		concurrency = self._concurrency() if callable(self._concurrency) else self._concurrency
+		return max(1, int(concurrency))
+
+	def _folder_key(self, folder):
+		return hashlib.sha1(os.path.realpath(folder).encode('utf-8', 'surrogateescape')).hexdigest()[:16]
+
+	def submit(self, task_id, kind, folders, target, args=()):
+		"""
+		Queue a task.  The task is created in the store as 'queued', and set to 'running' when it starts.
+
+		:param task_id: Task ID
+		:param kind: Type of task, i.e. 'copy', 'analyze' or 'process'
+		:param folders: List of folders the task writes to.  Only one task at a time runs for each folder.
+		:param target: Function that runs the task
+		:param args: Arguments for the function
+		"""
+		job = Job(task_id, kind, sorted({self._folder_key(folder) for folder in folders}), target, args)
+		self._store.put_task(task_id, {'status': 'queued', 'progress': 0, 'processed_files': 0, 'total_files': 0, 'data': {}, 'kind': kind})
+		with self._condition:
+			self._queue.append(job)
+			if self._thread is None:
+				self.recover_abandoned_tasks()
+				self._thread = threading.Thread(target=self._dispatch_loop, name='job-scheduler', daemon=True)
+				self._thread.start()
+			self._condition.notify_all()
+		write_log(f"Queued {kind} task {task_id}")
+
+	def cancel(self, task_id):
+		"""
+		Cancel a queued or running task.  Running tasks stop at their next progress update.
+
+		:param task_id: Task ID
+		:return: True if the task was cancelled, False if it doesn't exist or has already finished
+		"""
+		cancelled = self._store.update_task(task_id, {'status': 'cancelled', 'data': {'error': 'The task was cancelled.'}}, statuses=['queued', 'running'])
+		if cancelled:
+			write_log(f"Cancelled task {task_id}")
+			with self._condition:
+				self._condition.notify_all()
+		return cancelled
+
+	def list_tasks(self):
+		""" Return the queued and running tasks of all workers, in the order they were submitted """
+		return self._store.list_tasks(['queued', 'running'])
+
+	def recover_abandoned_tasks(self):
+		"""
+		Mark the tasks left queued or running by a worker that has stopped as failed, as they will never finish.
+		A worker started after a restart may have the same pid as before, so tasks with this worker's pid must be in
+		its queue.
+		"""
+		with self._condition:
+			for task in self._store.list_tasks(['queued', 'running']):
+				if task['owner'] == os.getpid():
+					abandoned = task['task_id'] not in self._running and not any(job.task_id == task['task_id'] for job in self._queue)
+				else:
+					try:
+						os.kill(task['owner'], 0)
+						abandoned = False
+					except ProcessLookupError:
+						abandoned = True
+					except OSError:
+						abandoned = False
+				if abandoned:
+					self._store.update_task(task['task_id'], {'status': 'error', 'data': {'error': 'The server stopped before the task finished.'}}, statuses=['queued', 'running'])
+
+	def _acquire(self, job):
+		# Take a free slot, then the locks of the job's folders.  Returns False (holding nothing) if any is busy.
+		for slot in range(self._get_concurrency()):
+			lock = self._store.lock(f'job_slot.{slot}')
+			if lock.acquire(blocking=False):
+				job.locks.append(lock)
+				break
+		else:
+			return False
+		for folder in job.folders:
+			lock = self._store.lock(f'job_folder.{folder}')
+			if not lock.acquire(blocking=False):
+				self._release(job)
+				return False
+			job.locks.append(lock)
+		return True
+
+	def _release(self, job):
+		for lock in reversed(job.locks):
+			lock.release()
+		job.locks = []
+
+	def _dispatch(self):
+		# Caller must hold self._condition.  Jobs start in the order they were queued, except that a job waiting
+		#  for a folder doesn't hold up jobs for other folders.
+		waiting_folders = set()
+		for job in list(self._queue):
+			task = self._store.get_task(job.task_id, include_data=False)
+			if task is None or task['status'] != 'queued':
+				# Cancelled, or removed from the store
+				self._queue.remove(job)
+				continue
+			if waiting_folders.intersection(job.folders) or not self._acquire(job):
+				waiting_folders.update(job.folders)
+				continue
+			self._queue.remove(job)
+			if not self._store.update_task(job.task_id, {'status': 'running'}, statuses=['queued']):
+				self._release(job)
+				continue
+			thread = threading.Thread(target=self._run, args=(job,), name=f'job-{job.kind}', daemon=True)
+			self._running[job.task_id] = thread
+			thread.start()
+
+	def _dispatch_loop(self):
+		with self._condition:
+			while True:
+				try:
+					self._dispatch()
+				except Exception as e:
+					write_log(f'Error dispatching queued tasks: {e}')
+				# Slots and folders may be freed by another worker, so queued jobs are retried periodically
+				self._condition.wait(JOB_POLL_INTERVAL if self._queue else None)
+
+	def _run(self, job):
+		write_log(f"Started {job.kind} task {job.task_id}")
+		try:
+			job.target(*job.args)
+		except Exception as e:
+			write_log(f"Error running {job.kind} task {job.task_id}: {e}")
+			self._store.update_task(job.task_id, {'status': 'error', 'data': {'error': f'Unexpected error: {e}'}}, statuses=['running'])
+		finally:
+			with self._condition:
+				self._release(job)
+				self._running.pop(job.task_id, None)
+				self._condition.notify_all()
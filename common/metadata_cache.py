@@ -0,0 +1,142 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Metadata Cache Script
+ *****************************************
+
+ Description: Persistent (SQLite) cache of the metadata read from image
+  files during analysis.  Entries are keyed on the path, size, mtime and
+  inode of the file, so any change to the file is treated as a miss.
+
+ *****************************************
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from common.analysis import metadata_from_json, metadata_to_json
+from common.common import CONFIG_FOLDER, write_log
+
+"""
+Globals
+"""
+
+METADATA_CACHE_PATH = f'{CONFIG_FOLDER}metadata_cache.db'
+METADATA_CACHE_MAX_ENTRIES = 500000
+SQLITE_MAX_PARAMETERS = 900  # Stay under the default SQLite host parameter limit of 999
+
+"""
+Metadata Cache
+"""
+
+def get_cache_key(file_path, stat_result=None):
+	"""
+	Get the cache key for a file
+
+	:param file_path: Path to the file
+	:param stat_result: Optional os.stat() result, if the file has already been stat'ed
+	:return: Tuple of (path, size, mtime_ns, inode)
+	"""
+	if stat_result is None:
+		stat_result = os.stat(file_path)
+	return (file_path, stat_result.st_size, stat_result.st_mtime_ns, stat_result.st_ino)
+
+class MetadataCache:
+	def __init__(self, path=METADATA_CACHE_PATH, max_entries=METADATA_CACHE_MAX_ENTRIES):
+		self._path = path
+		self._max_entries = max_entries
+		self._lock = threading.Lock()
+		os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+		self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+		with self._lock:
+			self._conn.execute('PRAGMA journal_mode=WAL')
+			self._conn.execute('PRAGMA synchronous=NORMAL')
+			self._conn.execute('''CREATE TABLE IF NOT EXISTS metadata (
+				path TEXT PRIMARY KEY,
+				size INTEGER NOT NULL,
+				mtime_ns INTEGER NOT NULL,
+				inode INTEGER NOT NULL,
+				metadata TEXT NOT NULL,
+				last_used REAL NOT NULL
+			)''')
+			self._conn.execute('CREATE INDEX IF NOT EXISTS idx_metadata_last_used ON metadata (last_used)')
+			self._conn.commit()
+
+	def get_many(self, keys):
+		"""
+		Look up the cached metadata for a list of cache keys
+
+		:param keys: List of (path, size, mtime_ns, inode) tuples
+		:return: Dictionary of path -> metadata for each key that is in the cache and still matches the file
+		"""
+		hits = {}
+		keys_by_path = {key[0]: key for key in keys}
+		paths = list(keys_by_path.keys())
+		now = time.time()
+		with self._lock:
+			for index in range(0, len(paths), SQLITE_MAX_PARAMETERS):
+				chunk = paths[index:index + SQLITE_MAX_PARAMETERS]
+				placeholders = ','.join('?' * len(chunk))
+				rows = self._conn.execute(f'SELECT path, size, mtime_ns, inode, metadata FROM metadata WHERE path IN ({placeholders})', chunk).fetchall()
+				for path, size, mtime_ns, inode, metadata_json in rows:
+					if keys_by_path[path] == (path, size, mtime_ns, inode):
+						try:
+							hits[path] = metadata_from_json(metadata_json)
+						except (ValueError, TypeError):
+							continue
+			if hits:
+				self._conn.executemany('UPDATE metadata SET last_used = ? WHERE path = ?', [(now, path) for path in hits])
+				self._conn.commit()
+		return hits
+
+	def put_many(self, items):
+		"""
+		Store metadata in the cache
+
+		:param items: List of (key, metadata) tuples, where key is a (path, size, mtime_ns, inode) tuple
+		"""
+		now = time.time()
+		rows = [(key[0], key[1], key[2], key[3], metadata_to_json(metadata), now) for key, metadata in items]
+		with self._lock:
+			self._conn.executemany('INSERT OR REPLACE INTO metadata (path, size, mtime_ns, inode, metadata, last_used) VALUES (?, ?, ?, ?, ?, ?)', rows)
+			self._conn.commit()
+
+	def evict(self):
+		"""
+		Remove the least recently used entries if the cache has grown beyond the maximum number of entries
+
+		:return: Number of entries removed
+		"""
+		with self._lock:
+			count = self._conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+			excess = count - self._max_entries
+			if excess <= 0:
+				return 0
+			self._conn.execute('DELETE FROM metadata WHERE path IN (SELECT path FROM metadata ORDER BY last_used ASC LIMIT ?)', (excess,))
+			self._conn.commit()
+		write_log(f'Metadata cache evicted {excess} least recently used entries')
+		return excess
+
+	def clear(self):
+		""" Remove all entries from the cache """
+		with self._lock:
+			self._conn.execute('DELETE FROM metadata')
+			self._conn.commit()
+			self._conn.execute('VACUUM')
+		write_log('Metadata cache cleared')
+
+	def get_stats(self):
+		""" Return the number of entries and the size of the cache on disk """
+		with self._lock:
+			count = self._conn.execute('SELECT COUNT(*) FROM metadata').fetchone()[0]
+		size = 0
+		for suffix in ['', '-wal', '-shm']:
+			if os.path.exists(self._path + suffix):
+				size += os.path.getsize(self._path + suffix)
+		return {'entries': count, 'size': size, 'max_entries': self._max_entries}
+
+	def close(self):
+		with self._lock:
+			self._conn.close()
@@ -0,0 +1,272 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Process Plan Script
+ *****************************************
+
+ Description: Plans and runs the processing of an analyzed import folder.
+
+  The planner makes a single pass over the choices and the results of the
+  analysis, with set / dictionary lookups, and produces an explicit list
+  of actions: the dates to write (or ignore), then the files to delete or
+  move to the export folder, along with the export folders to create.  A
+  dry run stops there and reports the plan and an estimate of the data
+  that processing it would read and write.
+
+  The executor runs the actions in batches with a pool of worker threads,
+  timing each kind of action, and reports back after each batch so that
+  progress, checkpoints and cancellation are handled once per batch rather
+  than once per file.
+
+  In the 'replace' export mode the export folder is cleared before the
+  files are moved to it.  In the 'incremental' mode files are added to the
+  tree left by earlier runs: a file that is already there (same content)
+  isn't exported again, and a different file with the same name is given
+  a numbered name.  Either way, a manifest of what the run added is
+  written to EXPORT_MANIFEST_FOLDER for the post-processing to pick up.
+
+ *****************************************
+"""
+
+import concurrent.futures
+import datetime
+import hashlib
+import os
+import time
+from common.analysis import fixup_date_time, is_valid_date
+from common.common import write_json_atomic
+from common.copy_engine import move_file
+
+"""
+Globals
+"""
+
+PROCESS_BATCH_SIZE = 64  # Actions run between progress updates / cancellation checks
+PROCESS_RESULT_GROUPS = ['files_with_dates', 'files_without_dates', 'ignored_files']
+EXPORT_MODES = ['replace', 'incremental']
+EXPORT_MANIFEST_FOLDER = 'logs/export_manifests/'
+HASH_CHUNK_SIZE = 1024 * 1024
+
+"""
+Process Plan
+"""
+
+def get_export_path(path, filename, export_folder, import_folder):
+	""" Get the path that a file in the import folder is moved to in the export folder """
+	return os.path.join(export_folder + path.replace(import_folder, ''), filename)
+
+def plan_process(task_list, analysis, export_folder, import_folder):
+	"""
+	Plan the processing of the files of an analysis
+
+	:param task_list: Dictionary of 'choices_fileid_<path>/<filename>' -> choice, from resolve_choices()
+	:param analysis: AnalysisResults of the import folder
+	:param export_folder: Export folder, with a trailing '/'
+	:param import_folder: Import folder, that paths in the export folder are relative to
+	:return: Dictionary of dates (list of 'edit', 'ignore' and 'invalid' actions, one per choice), files (list of
+		'delete' and 'move' actions, one per file of the analysis), folders (export folders that moves need) and counts
+		(number of actions of each kind).  Actions are dictionaries of op and file, with the date of an edit, the
+		choice of an invalid choice and the destination of a move.
+	"""
+	dates = []
+	delete_files = set()
+	for name, choice in task_list.items():
+		file_path = name.replace('choices_fileid_', '')
+		if choice == 'ignore':
+			dates.append({'op': 'ignore', 'file': file_path})
+		elif choice == 'delete':
+			delete_files.add(file_path)
+		elif is_valid_date(choice):
+			dates.append({'op': 'edit', 'file': file_path, 'date': fixup_date_time(choice)})
+		else:
+			dates.append({'op': 'invalid', 'file': file_path, 'choice': choice})
+
+	files = []
+	folders = set()
+	for group in PROCESS_RESULT_GROUPS:
+		for path, filename in analysis.iter_files(group):
+			file_path = os.path.join(path, filename)
+			if file_path in delete_files:
+				files.append({'op': 'delete', 'file': file_path})
+			else:
+				destination = get_export_path(path, filename, export_folder, import_folder)
+				folders.add(os.path.dirname(destination))
+				files.append({'op': 'move', 'file': file_path, 'destination': destination})
+
+	counts = {op: 0 for op in ['edit', 'ignore', 'invalid', 'delete', 'move']}
+	for action in dates + files:
+		counts[action['op']] += 1
+	return {'dates': dates, 'files': files, 'folders': sorted(folders), 'counts': counts}
+
+def _get_device(path):
+	# Device of the nearest existing folder, the export folder may not have been created yet
+	while path and not os.path.exists(path):
+		parent = os.path.dirname(path.rstrip('/'))
+		if parent == path:
+			break
+		path = parent
+	return os.stat(path or '.').st_dev
+
+def estimate_plan_bytes(plan, export_folder, move_mode='rename'):
+	"""
+	Estimate the data that processing a plan reads and writes
+
+	:param plan: Plan from plan_process()
+	:param export_folder: Export folder
+	:param move_mode: 'rename' or 'copy', the export transfer mode
+	:return: Dictionary of edit (size of the files that get a new date, which are rewritten), move (size of the files
+		moved to the export folder), copy (the part of that which is copied rather than renamed) and missing (number of
+		files that couldn't be found)
+	"""
+	result = {'edit': 0, 'move': 0, 'copy': 0, 'missing': 0}
+	export_device = _get_device(export_folder)
+	for action in plan['dates'] + plan['files']:
+		if action['op'] not in ['edit', 'move']:
+			continue
+		try:
+			file_stat = os.stat(action['file'])
+		except OSError:
+			result['missing'] += 1
+			continue
+		result[action['op']] += file_stat.st_size
+		if action['op'] == 'move' and (move_mode != 'rename' or file_stat.st_dev != export_device):
+			result['copy'] += file_stat.st_size
+	return result
+
+def run_plan_actions(actions, run_action, workers=4, batch_size=PROCESS_BATCH_SIZE, batch_callback=None, timings=None):
+	"""
+	Run actions from a plan in batches with a pool of worker threads
+
+	:param actions: List of actions
+	:param run_action: Function that runs an action and returns its (result group, message).  It is called from the
+		worker threads, and must handle its own errors.
+	:param workers: Number of worker threads
+	:param batch_size: Number of actions in each batch
+	:param batch_callback: Optional function called after each batch with a list of (action, group, message) for the
+		batch, in the order of the actions, and the number of actions done.  If it returns False the rest are skipped.
+	:param timings: Optional dictionary of timings to add to, from an earlier call
+	:return: Tuple of (timings, cancelled).  Timings are a dictionary of op -> {'count', 'seconds', 'max_seconds'}.
+	"""
+	timings = {} if timings is None else timings
+
+	def timed(action):
+		start = time.perf_counter()
+		group, message = run_action(action)
+		return action, group, message, time.perf_counter() - start
+
+	done = 0
+	with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+		for start in range(0, len(actions), max(1, batch_size)):
+			completed = []
+			for action, group, message, seconds in executor.map(timed, actions[start:start + max(1, batch_size)]):
+				timing = timings.setdefault(action['op'], {'count': 0, 'seconds': 0.0, 'max_seconds': 0.0})
+				timing['count'] += 1
+				timing['seconds'] += seconds
+				timing['max_seconds'] = max(timing['max_seconds'], seconds)
+				completed.append((action, group, message))
+			done += len(completed)
+			if batch_callback and batch_callback(completed, done) is False:
+				return timings, True
+	return timings, False
+
+def format_plan_timings(timings):
+	""" Format the timings from run_plan_actions() for the log and report, i.e. 'move: 120 in 1.52s (max 0.10s)' """
+	return ', '.join(f"{op}: {timing['count']} in {timing['seconds']:.2f}s (max {timing['max_seconds']:.2f}s)" for op, timing in timings.items()) or 'nothing to do'
+
+def hash_file(path):
+	""" Return the SHA-256 hex digest of a file's content """
+	digest = hashlib.sha256()
+	with open(path, 'rb') as file:
+		for chunk in iter(lambda: file.read(HASH_CHUNK_SIZE), b''):
+			digest.update(chunk)
+	return digest.hexdigest()
+
+def is_same_content(path, other_path):
+	""" Check if two files have the same content, comparing their sizes before hashing them """
+	if os.path.getsize(path) != os.path.getsize(other_path):
+		return False
+	return hash_file(path) == hash_file(other_path)
+
+def export_file(source_path, destination_path, move_mode='rename', record=None):
+	"""
+	Move a file into an export folder that may already hold files from earlier runs, without replacing any of them.
+	If the destination (or a numbered name for it) already holds the same content, the source is removed rather than
+	exported again.  A different file with the same name gets the next free numbered name, i.e. IMG_0001_1.jpg.
+
+	:param source_path: Path to the file in the import folder
+	:param destination_path: Path for the file in the export folder.  The folder must already exist.
+	:param move_mode: 'rename' or 'copy'
+	:param record: Optional function called with (outcome, path in the export folder) just before the source is moved
+		or removed, so that a task that stops part way through knows which files in the export folder are its own
+	:return: Tuple of (outcome, path in the export folder, move mode used).  The outcome is 'added', 'renamed' or
+		'duplicate' (with no move mode).
+	"""
+	root, extension = os.path.splitext(destination_path)
+	number = 0
+	candidate = destination_path
+	while True:
+		try:
+			# Reserve the name first, so that two workers can't pick the same one
+			os.close(os.open(candidate, os.O_CREAT | os.O_EXCL | os.O_WRONLY))
+			break
+		except FileExistsError:
+			if is_same_content(source_path, candidate):
+				if record:
+					record('duplicate', candidate)
+				os.remove(source_path)
+				return 'duplicate', candidate, None
+		number += 1
+		candidate = f'{root}_{number}{extension}'
+	outcome = 'renamed' if number else 'added'
+	try:
+		if record:
+			record(outcome, candidate)
+		method = move_file(source_path, candidate, move_mode)
+	except Exception:
+		os.remove(candidate)
+		raise
+	return outcome, candidate, method
+
+def write_export_manifest(task_id, export_folder, export_mode, exports, folder=EXPORT_MANIFEST_FOLDER):
+	"""
+	Write the manifest of the files a process task added to the export folder.  Along with manifest_<time>_<task>.json,
+	latest.txt lists the files that were added (relative to the export folder, one per line) so that a shell script
+	can use it, i.e. with rsync --files-from.  Paths in the manifest are relative to the export folder, apart from the
+	files in the import folder that the renamed and duplicate files came from.
+
+	:param task_id: Task ID of the process task
+	:param export_folder: Export folder
+	:param export_mode: 'replace' or 'incremental'
+	:param exports: List of dictionaries of file (path in the import folder), destination (path in the export folder)
+		and outcome ('added', 'renamed' or 'duplicate') for each file moved to the export folder
+	:param folder: Folder for the manifests
+	:return: Path to the manifest
+	"""
+	now = datetime.datetime.now()
+	manifest = {
+		'task_id': task_id,
+		'created': now.isoformat(timespec='seconds'),
+		'export_folder': export_folder,
+		'export_mode': export_mode,
+		'added': [],
+		'renamed': [],
+		'duplicates': []
+	}
+	for export in exports:
+		destination = os.path.relpath(export['destination'], export_folder)
+		if export['outcome'] == 'duplicate':
+			manifest['duplicates'].append({'file': export['file'], 'existing': destination})
+			continue
+		manifest['added'].append(destination)
+		if export['outcome'] == 'renamed':
+			manifest['renamed'].append({'file': export['file'], 'destination': destination})
+
+	os.makedirs(folder, exist_ok=True)
+	manifest_path = os.path.join(folder, f"manifest_{now.strftime('%Y%m%d-%H%M%S')}_{task_id[:8]}.json")
+	write_json_atomic(manifest, manifest_path)
+	latest_path = os.path.join(folder, 'latest.txt')
+	with open(f'{latest_path}.tmp', 'w') as file:
+		file.writelines(f'{destination}\n' for destination in manifest['added'])
+	os.replace(f'{latest_path}.tmp', latest_path)
+	return manifest_path
@@ -0,0 +1,489 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	State Store Script
+ *****************************************
+
+ Description: Storage for the state that is shared between requests - the
+  progress of background tasks, the scripts started from the UI and the
+  choices made on the fix files page - so that it can be shared between
+  several gunicorn worker processes.
+
+  The 'sqlite' backend (default) keeps the state in config/state.db, with
+  file locks for operations that must not run in two workers at once.  The
+  'memory' backend keeps everything in the process, as before, and only
+  works with a single worker.
+
+ *****************************************
+"""
+
+import json
+import os
+import sqlite3
+import threading
+import time
+from abc import ABC, abstractmethod
+from common.common import CONFIG_FOLDER, write_log
+try:
+	import fcntl
+except ImportError:
+	fcntl = None  # Not available on Windows, locks only apply within the process
+
+"""
+Globals
+"""
+
+STATE_STORE_PATH = f'{CONFIG_FOLDER}state.db'
+STATE_LOCK_FOLDER = f'{CONFIG_FOLDER}locks/'
+STATE_BACKENDS = ['sqlite', 'memory']
+STATE_POLL_INTERVAL = 0.2  # Seconds between checks for changes made by other workers
+STATE_TASK_MAX_AGE = 24 * 60 * 60  # Seconds before finished tasks are removed when the store is opened
+TASK_FINISHED_STATUSES = ['completed', 'error', 'cancelled']
+
+"""
+State Store
+"""
+
+class FileLock:
+	"""
+	Lock that is held across threads and processes, with flock() on a lock file.  Used as a context manager.
+	"""
+	def __init__(self, path):
+		self._path = path
+		self._thread_lock = threading.Lock()
+		os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+
+	def acquire(self, blocking=True):
+		"""
+		Acquire the lock
+
+		:param blocking: If False, return straight away when the lock is held elsewhere
+		:return: True if the lock was acquired
+		"""
+		if not self._thread_lock.acquire(blocking):
+			return False
+		if fcntl is None:
+			return True
+		try:
+			self._file = open(self._path, 'a')
+			fcntl.flock(self._file.fileno(), fcntl.LOCK_EX if blocking else fcntl.LOCK_EX | fcntl.LOCK_NB)
+		except BlockingIOError:
+			self._file.close()
+			self._thread_lock.release()
+			return False
+		except Exception:
+			self._thread_lock.release()
+			raise
+		return True
+
+	def release(self):
+		try:
+			if fcntl is not None:
+				fcntl.flock(self._file.fileno(), fcntl.LOCK_UN)
+				self._file.close()
+		finally:
+			self._thread_lock.release()
+
+	def __enter__(self):
+		self.acquire()
+		return self
+
+	def __exit__(self, exc_type, exc_value, traceback):
+		self.release()
+
+class StateStore(ABC):
+	"""
+	Interface for the state backends.  Tasks are dictionaries of status, progress, processed_files, total_files,
+	data (which must be JSON serializable) and kind.  The store adds the owner (pid of the worker that created the
+	task), and the queue_position of queued tasks.  Processes are dictionaries of JSON serializable details.  Choices
+	are the dates chosen for the files without dates of an analysis task, and are removed with the tasks.  A backend
+	that doesn't implement every method can't be created.
+	"""
+	@abstractmethod
+	def put_task(self, task_id, task):
+		pass
+
+	@abstractmethod
+	def update_task(self, task_id, fields, statuses=None):
+		"""
+		Update some fields of a task
+
+		:param statuses: Optional list of statuses, the task is only updated if it has one of them
+		:return: False if the task doesn't exist (or doesn't have one of the statuses)
+		"""
+
+	@abstractmethod
+	def get_task(self, task_id, include_data=True):
+		""" Return the task, or None if it doesn't exist """
+
+	@abstractmethod
+	def list_tasks(self, statuses=None):
+		""" Return the tasks (without their data) that have one of the statuses, oldest first """
+
+	@abstractmethod
+	def clear_tasks(self, statuses=TASK_FINISHED_STATUSES):
+		""" Remove the tasks that have one of the statuses (finished tasks by default), along with their choices """
+
+	@abstractmethod
+	def put_process(self, process_id, info):
+		pass
+
+	@abstractmethod
+	def update_process(self, process_id, fields):
+		""" Update some fields of a process, returning False if the process doesn't exist """
+
+	@abstractmethod
+	def get_process(self, process_id):
+		""" Return the process, or None if it doesn't exist """
+
+	@abstractmethod
+	def list_processes(self):
+		""" Return a dictionary of process_id -> process """
+
+	@abstractmethod
+	def delete_process(self, process_id):
+		pass
+
+	@abstractmethod
+	def add_choice(self, task_id, choice):
+		"""
+		Record a choice for the files without dates of an analysis.  A choice for a single file replaces the earlier
+		choice for that file, choices for a folder or for all files are kept in the order they were made.
+
+		:param task_id: Task ID of the analysis
+		:param choice: Dictionary of scope ('file', 'folder' or 'all'), target (the file or folder), type and value
+		:return: Sequence number of the choice, later choices have higher numbers
+		"""
+
+	@abstractmethod
+	def list_choices(self, task_id):
+		""" Return the choices for an analysis (with their seq), in the order they were made """
+
+	@abstractmethod
+	def get_version(self):
+		""" Return a number that changes whenever a task or process changes """
+
+	@abstractmethod
+	def wait_for_change(self, version, timeout):
+		""" Block until the version changes or the timeout expires, and return the current version """
+
+	@abstractmethod
+	def lock(self, name):
+		""" Return a context manager that holds the named lock """
+
+class MemoryStateStore(StateStore):
+	def __init__(self):
+		self._tasks = {}
+		self._processes = {}
+		self._choices = {}
+		self._choice_seq = 0
+		self._version = 0
+		self._condition = threading.Condition()
+		self._locks = {}
+
+	def _notify(self):
+		# Must be called with the condition held
+		self._version += 1
+		self._condition.notify_all()
+
+	def _queue_position(self, task):
+		# Must be called with the condition held
+		if task['status'] != 'queued':
+			return 0
+		return sum(1 for other in self._tasks.values() if other['status'] == 'queued' and other['created'] <= task['created'])
+
+	def put_task(self, task_id, task):
+		with self._condition:
+			self._tasks[task_id] = dict(json.loads(json.dumps(task, default=str)), owner=os.getpid(), created=time.time())
+			self._tasks[task_id].setdefault('kind', None)
+			self._notify()
+
+	def update_task(self, task_id, fields, statuses=None):
+		with self._condition:
+			if task_id not in self._tasks or (statuses is not None and self._tasks[task_id]['status'] not in statuses):
+				return False
+			self._tasks[task_id].update(json.loads(json.dumps(fields, default=str)))
+			self._notify()
+			return True
+
+	def get_task(self, task_id, include_data=True):
+		with self._condition:
+			task = self._tasks.get(task_id)
+			if task is None:
+				return None
+			task = dict(task, queue_position=self._queue_position(task))
+			task.pop('created')
+			if not include_data:
+				task['data'] = {'error': task['data']['error']} if task['status'] in ['error', 'cancelled'] and 'error' in task['data'] else {}
+			return task
+
+	def list_tasks(self, statuses=None):
+		with self._condition:
+			tasks = sorted(self._tasks.items(), key=lambda item: item[1]['created'])
+			return [dict({key: value for key, value in task.items() if key not in ['data', 'created']}, task_id=task_id, queue_position=self._queue_position(task))
+				for task_id, task in tasks if statuses is None or task['status'] in statuses]
+
+	def clear_tasks(self, statuses=TASK_FINISHED_STATUSES):
+		with self._condition:
+			for task_id in [task_id for task_id, task in self._tasks.items() if task['status'] in statuses]:
+				del self._tasks[task_id]
+				self._choices.pop(task_id, None)
+			self._notify()
+
+	def put_process(self, process_id, info):
+		with self._condition:
+			self._processes[process_id] = dict(info)
+			self._notify()
+
+	def update_process(self, process_id, fields):
+		with self._condition:
+			if process_id not in self._processes:
+				return False
+			self._processes[process_id].update(fields)
+			self._notify()
+			return True
+
+	def get_process(self, process_id):
+		with self._condition:
+			info = self._processes.get(process_id)
+			return dict(info) if info is not None else None
+
+	def list_processes(self):
+		with self._condition:
+			return {process_id: dict(info) for process_id, info in self._processes.items()}
+
+	def delete_process(self, process_id):
+		with self._condition:
+			if self._processes.pop(process_id, None) is None:
+				return False
+			self._notify()
+			return True
+
+	def add_choice(self, task_id, choice):
+		with self._condition:
+			self._choice_seq += 1
+			choices = self._choices.setdefault(task_id, [])
+			if choice['scope'] == 'file':
+				choices[:] = [other for other in choices if other['scope'] != 'file' or other['target'] != choice['target']]
+			choices.append(dict(choice, seq=self._choice_seq))
+			return self._choice_seq
+
+	def list_choices(self, task_id):
+		with self._condition:
+			return [dict(choice) for choice in self._choices.get(task_id, [])]
+
+	def get_version(self):
+		with self._condition:
+			return self._version
+
+	def wait_for_change(self, version, timeout):
+		with self._condition:
+			self._condition.wait_for(lambda: self._version != version, timeout)
+			return self._version
+
+	def lock(self, name):
+		with self._condition:
+			if name not in self._locks:
+				self._locks[name] = threading.Lock()
+			return self._locks[name]
+
+class SQLiteStateStore(StateStore):
+	def __init__(self, path=STATE_STORE_PATH, lock_folder=STATE_LOCK_FOLDER):
+		self._path = path
+		self._lock_folder = lock_folder
+		self._lock = threading.Lock()
+		self._condition = threading.Condition()  # Wakes up waiters in this process without waiting for the next poll
+		self._locks = {}
+		os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+		self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+		with self._lock:
+			self._conn.execute('PRAGMA journal_mode=WAL')
+			self._conn.execute('PRAGMA synchronous=NORMAL')
+			columns = [row[1] for row in self._conn.execute('PRAGMA table_info(tasks)')]
+			if columns and 'owner' not in columns:
+				# Tasks only live for a day, so a table from an older version is recreated rather than migrated
+				self._conn.execute('DROP TABLE tasks')
+			self._conn.execute('''CREATE TABLE IF NOT EXISTS tasks (
+				task_id TEXT PRIMARY KEY,
+				status TEXT NOT NULL,
+				progress REAL NOT NULL DEFAULT 0,
+				processed_files INTEGER NOT NULL DEFAULT 0,
+				total_files INTEGER NOT NULL DEFAULT 0,
+				data TEXT NOT NULL DEFAULT '{}',
+				kind TEXT,
+				owner INTEGER NOT NULL,
+				created REAL NOT NULL,
+				updated REAL NOT NULL
+			)''')
+			self._conn.execute('CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, created)')
+			self._conn.execute('''CREATE TABLE IF NOT EXISTS processes (
+				process_id TEXT PRIMARY KEY,
+				info TEXT NOT NULL
+			)''')
+			self._conn.execute('''CREATE TABLE IF NOT EXISTS choices (
+				seq INTEGER PRIMARY KEY AUTOINCREMENT,
+				task_id TEXT NOT NULL,
+				scope TEXT NOT NULL,
+				target TEXT NOT NULL,
+				type TEXT NOT NULL,
+				value TEXT
+			)''')
+			self._conn.execute('CREATE INDEX IF NOT EXISTS choices_task ON choices (task_id, scope, target)')
+			self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+			self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+			self._conn.execute("DELETE FROM tasks WHERE status NOT IN ('queued', 'running') AND updated < ?", (time.time() - STATE_TASK_MAX_AGE,))
+			self._conn.execute('DELETE FROM choices WHERE task_id NOT IN (SELECT task_id FROM tasks)')
+			self._conn.commit()
+
+	def _commit(self):
+		# Caller must hold self._lock.  Bumps the version in the same transaction as the change.
+		self._conn.execute("UPDATE meta SET value = value + 1 WHERE key = 'version'")
+		self._conn.commit()
+		with self._condition:
+			self._condition.notify_all()
+
+	def put_task(self, task_id, task):
+		now = time.time()
+		with self._lock:
+			self._conn.execute('INSERT OR REPLACE INTO tasks (task_id, status, progress, processed_files, total_files, data, kind, owner, created, updated) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+				(task_id, task['status'], task['progress'], task['processed_files'], task['total_files'], json.dumps(task.get('data', {}), default=str), task.get('kind'), os.getpid(), now, now))
+			self._commit()
+
+	def update_task(self, task_id, fields, statuses=None):
+		fields = dict(fields)
+		if 'data' in fields:
+			fields['data'] = json.dumps(fields['data'], default=str)
+		columns = [column for column in ['status', 'progress', 'processed_files', 'total_files', 'data'] if column in fields]
+		assignments = ''.join(f'{column} = ?, ' for column in columns)
+		condition = f" AND status IN ({', '.join('?' * len(statuses))})" if statuses is not None else ''
+		with self._lock:
+			found = self._conn.execute(f'UPDATE tasks SET {assignments}updated = ? WHERE task_id = ?{condition}',
+				[fields[column] for column in columns] + [time.time(), task_id] + list(statuses or [])).rowcount > 0
+			if found:
+				self._commit()
+			return found
+
+	def _queue_position(self, status, created):
+		# Caller must hold self._lock
+		if status != 'queued':
+			return 0
+		return self._conn.execute("SELECT COUNT(*) FROM tasks WHERE status = 'queued' AND created <= ?", (created,)).fetchone()[0]
+
+	def get_task(self, task_id, include_data=True):
+		with self._lock:
+			row = self._conn.execute(f"SELECT status, progress, processed_files, total_files, kind, owner, created, {'data' if include_data else 'CASE WHEN status IN (?, ?) THEN data ELSE NULL END'} FROM tasks WHERE task_id = ?",
+				(task_id,) if include_data else ('error', 'cancelled', task_id)).fetchone()
+			if row is None:
+				return None
+			queue_position = self._queue_position(row[0], row[6])
+		data = json.loads(row[7]) if row[7] else {}
+		if not include_data:
+			data = {'error': data['error']} if 'error' in data else {}
+		return {'status': row[0], 'progress': row[1], 'processed_files': row[2], 'total_files': row[3], 'data': data, 'kind': row[4], 'owner': row[5], 'queue_position': queue_position}
+
+	def list_tasks(self, statuses=None):
+		condition = f" WHERE status IN ({', '.join('?' * len(statuses))})" if statuses is not None else ''
+		with self._lock:
+			rows = self._conn.execute(f'SELECT task_id, status, progress, processed_files, total_files, kind, owner, created FROM tasks{condition} ORDER BY created', list(statuses or [])).fetchall()
+		queued = 0
+		tasks = []
+		for row in rows:
+			# Rows are in creation order, so queued tasks are numbered as they come
+			queued += row[1] == 'queued'
+			tasks.append({'task_id': row[0], 'status': row[1], 'progress': row[2], 'processed_files': row[3], 'total_files': row[4], 'kind': row[5], 'owner': row[6],
+				'queue_position': queued if row[1] == 'queued' else 0})
+		return tasks
+
+	def clear_tasks(self, statuses=TASK_FINISHED_STATUSES):
+		placeholders = ','.join('?' * len(statuses))
+		with self._lock:
+			self._conn.execute(f'DELETE FROM choices WHERE task_id IN (SELECT task_id FROM tasks WHERE status IN ({placeholders}))', list(statuses))
+			self._conn.execute(f'DELETE FROM tasks WHERE status IN ({placeholders})', list(statuses))
+			self._commit()
+
+	def put_process(self, process_id, info):
+		with self._lock:
+			self._conn.execute('INSERT OR REPLACE INTO processes (process_id, info) VALUES (?, ?)', (process_id, json.dumps(info)))
+			self._commit()
+
+	def update_process(self, process_id, fields):
+		with self._lock:
+			row = self._conn.execute('SELECT info FROM processes WHERE process_id = ?', (process_id,)).fetchone()
+			if row is None:
+				return False
+			info = json.loads(row[0])
+			info.update(fields)
+			self._conn.execute('UPDATE processes SET info = ? WHERE process_id = ?', (json.dumps(info), process_id))
+			self._commit()
+			return True
+
+	def get_process(self, process_id):
+		with self._lock:
+			row = self._conn.execute('SELECT info FROM processes WHERE process_id = ?', (process_id,)).fetchone()
+		return json.loads(row[0]) if row else None
+
+	def list_processes(self):
+		with self._lock:
+			rows = self._conn.execute('SELECT process_id, info FROM processes').fetchall()
+		return {process_id: json.loads(info) for process_id, info in rows}
+
+	def delete_process(self, process_id):
+		with self._lock:
+			found = self._conn.execute('DELETE FROM processes WHERE process_id = ?', (process_id,)).rowcount > 0
+			if found:
+				self._commit()
+			return found
+
+	def add_choice(self, task_id, choice):
+		# Nothing waits on choices, so they don't bump the version
+		with self._lock:
+			if choice['scope'] == 'file':
+				self._conn.execute("DELETE FROM choices WHERE task_id = ? AND scope = 'file' AND target = ?", (task_id, choice['target']))
+			seq = self._conn.execute('INSERT INTO choices (task_id, scope, target, type, value) VALUES (?, ?, ?, ?, ?)',
+				(task_id, choice['scope'], choice['target'], choice['type'], choice.get('value'))).lastrowid
+			self._conn.commit()
+			return seq
+
+	def list_choices(self, task_id):
+		with self._lock:
+			rows = self._conn.execute('SELECT seq, scope, target, type, value FROM choices WHERE task_id = ? ORDER BY seq', (task_id,)).fetchall()
+		return [{'seq': row[0], 'scope': row[1], 'target': row[2], 'type': row[3], 'value': row[4]} for row in rows]
+
+	def get_version(self):
+		with self._lock:
+			return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+	def wait_for_change(self, version, timeout):
+		deadline = time.monotonic() + timeout
+		while True:
+			current = self.get_version()
+			remaining = deadline - time.monotonic()
+			if current != version or remaining <= 0:
+				return current
+			with self._condition:
+				self._condition.wait(min(STATE_POLL_INTERVAL, remaining))
+
+	def lock(self, name):
+		with self._lock:
+			if name not in self._locks:
+				self._locks[name] = FileLock(os.path.join(self._lock_folder, f'{name}.lock'))
+			return self._locks[name]
+
+	def close(self):
+		with self._lock:
+			self._conn.close()
+
+def create_state_store(backend='sqlite', path=STATE_STORE_PATH):
+	"""
+	Create the state store for a backend
+
+	:param backend: 'sqlite' or 'memory'
+	:param path: Path to the SQLite database, for the 'sqlite' backend
+	:return: StateStore
+	"""
+	if backend == 'memory':
+		return MemoryStateStore()
+	if backend != 'sqlite':
+		write_log(f"Warning: Unknown state backend '{backend}', using sqlite")
+	return SQLiteStateStore(path)
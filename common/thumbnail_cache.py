@@ -0,0 +1,236 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Thumbnail Cache Script
+ *****************************************
+
+ Description: Disk cache of downscaled JPEG thumbnails and previews for the
+  images shown on the fix files page.  Entries are keyed on the path, size
+  and mtime of the original, so a changed file gets a new entry (and ETag).
+  The least recently used entries are removed once the cache grows beyond
+  its maximum size.
+
+ *****************************************
+"""
+
+import concurrent.futures
+import hashlib
+import io
+import os
+import threading
+from PIL import Image, ImageOps
+from common.common import CONFIG_FOLDER, write_log
+from exif.exif import read_exif_thumbnail
+
+"""
+Globals
+"""
+
+THUMBNAIL_CACHE_FOLDER = f'{CONFIG_FOLDER}thumbnails/'
+THUMBNAIL_CACHE_MAX_MB = 1024
+THUMBNAIL_SIZES = {
+	'thumb': 200,  # Shown at 100px wide in the file tables, doubled for high DPI screens
+	'preview': 1280  # Shown in the image modal
+}
+THUMBNAIL_QUALITY = 80
+EVICT_CHECK_INTERVAL = 200  # Check the cache size after this many new entries
+
+"""
+Thumbnail Cache
+"""
+
+def _apply_orientation(image, orientation):
+	""" Rotate / flip an image to match the EXIF orientation value of the original """
+	method = {
+		2: Image.Transpose.FLIP_LEFT_RIGHT,
+		3: Image.Transpose.ROTATE_180,
+		4: Image.Transpose.FLIP_TOP_BOTTOM,
+		5: Image.Transpose.TRANSPOSE,
+		6: Image.Transpose.ROTATE_270,
+		7: Image.Transpose.TRANSVERSE,
+		8: Image.Transpose.ROTATE_90
+	}.get(orientation)
+	return image.transpose(method) if method is not None else image
+
+def _to_rgb(image):
+	""" Flatten any transparency onto white and convert to RGB for JPEG output """
+	if image.mode in ['RGBA', 'LA'] or (image.mode == 'P' and 'transparency' in image.info):
+		image = image.convert('RGBA')
+		background = Image.new('RGB', image.size, (255, 255, 255))
+		background.paste(image, mask=image.getchannel('A'))
+		return background
+	if image.mode != 'RGB':
+		return image.convert('RGB')
+	return image
+
+def create_thumbnail(image_path, output_path, max_size):
+	"""
+	Create a downscaled JPEG copy of an image
+
+	The embedded EXIF thumbnail is used when it is large enough, otherwise the image is decoded at a reduced
+	scale (JPEG DCT scaling via draft(), reduce() for other formats) before the final resize.
+
+	:param image_path: Path to the original image
+	:param output_path: Path to write the JPEG to
+	:param max_size: Maximum width / height in pixels
+	"""
+	embedded = read_exif_thumbnail(image_path) if max_size <= THUMBNAIL_SIZES['thumb'] else None
+	if embedded:
+		thumbnail_data, orientation = embedded
+		try:
+			with Image.open(io.BytesIO(thumbnail_data)) as image:
+				# Embedded thumbnails are usually 160x120, only use them if they don't need upscaling by much
+				if max(image.size) >= max_size // 2:
+					image = _to_rgb(_apply_orientation(image, orientation))
+					image.thumbnail((max_size, max_size))
+					image.save(output_path, format='JPEG', quality=THUMBNAIL_QUALITY)
+					return
+		except Exception:
+			pass  # Fall back to decoding the full image
+
+	with Image.open(image_path) as image:
+		if image.format == 'JPEG':
+			image.draft('RGB', (max_size, max_size))
+		image = ImageOps.exif_transpose(image)
+		# thumbnail() uses reduce() for the bulk of the downscale when reducing_gap is set
+		image.thumbnail((max_size, max_size), reducing_gap=2.0)
+		_to_rgb(image).save(output_path, format='JPEG', quality=THUMBNAIL_QUALITY)
+
+class ThumbnailCache:
+	def __init__(self, folder=THUMBNAIL_CACHE_FOLDER, max_mb=THUMBNAIL_CACHE_MAX_MB):
+		self._folder = folder
+		self._max_bytes = max_mb * 1024 * 1024
+		self._lock = threading.Lock()
+		self._new_entries = 0
+		os.makedirs(folder, exist_ok=True)
+
+	def set_max_mb(self, max_mb):
+		""" Change the maximum size of the cache, which takes effect at the next eviction """
+		self._max_bytes = max_mb * 1024 * 1024
+
+	def get_key(self, image_path, size='thumb'):
+		"""
+		Get the cache key (also used as the ETag) for an image
+
+		:param image_path: Path to the original image
+		:param size: 'thumb' or 'preview'
+		:return: Hex digest string
+		"""
+		stat_result = os.stat(image_path)
+		key_data = f'{os.path.realpath(image_path)}|{stat_result.st_size}|{stat_result.st_mtime_ns}|{size}'
+		return hashlib.sha1(key_data.encode('utf-8', 'surrogateescape')).hexdigest()
+
+	def _get_cache_path(self, key):
+		return os.path.join(self._folder, key[:2], f'{key}.jpg')
+
+	def get(self, image_path, size='thumb'):
+		"""
+		Get the cached thumbnail for an image, creating it if needed
+
+		:param image_path: Path to the original image
+		:param size: 'thumb' or 'preview'
+		:return: Tuple of (path to the cached JPEG, key)
+		"""
+		key = self.get_key(image_path, size)
+		cache_path = self._get_cache_path(key)
+		if os.path.exists(cache_path):
+			try:
+				# The mtime of the cache entry records when it was last used
+				os.utime(cache_path)
+			except OSError:
+				pass
+			return cache_path, key
+
+		os.makedirs(os.path.dirname(cache_path), exist_ok=True)
+		temp_path = f'{cache_path}.{os.getpid()}.{threading.get_ident()}.tmp'
+		try:
+			create_thumbnail(image_path, temp_path, THUMBNAIL_SIZES[size])
+			os.replace(temp_path, cache_path)
+		finally:
+			if os.path.exists(temp_path):
+				os.remove(temp_path)
+
+		with self._lock:
+			self._new_entries += 1
+			check_size = self._new_entries >= EVICT_CHECK_INTERVAL
+			if check_size:
+				self._new_entries = 0
+		if check_size:
+			self.evict()
+		return cache_path, key
+
+	def generate_many(self, image_paths, sizes=('thumb',), workers=2, cancel_event=None):
+		"""
+		Create thumbnails for a list of images, skipping any that are already cached
+
+		:param image_paths: List of paths to the original images
+		:param sizes: Sizes to create for each image
+		:param workers: Number of worker threads
+		:param cancel_event: Optional threading.Event, stop early once it is set
+		:return: Number of images that could not be thumbnailed
+		"""
+		def _generate(image_path):
+			if cancel_event is not None and cancel_event.is_set():
+				return 0
+			errors = 0
+			for size in sizes:
+				try:
+					self.get(image_path, size)
+				except Exception:
+					errors += 1
+			return errors
+
+		with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+			errors = sum(executor.map(_generate, image_paths))
+		self.evict()
+		return errors
+
+	def _list_entries(self):
+		entries = []
+		for root, dirs, files in os.walk(self._folder):
+			for file in files:
+				file_path = os.path.join(root, file)
+				try:
+					stat_result = os.stat(file_path)
+				except OSError:
+					continue
+				entries.append((stat_result.st_mtime, stat_result.st_size, file_path))
+		return entries
+
+	def evict(self):
+		"""
+		Remove the least recently used entries if the cache has grown beyond the maximum size
+
+		:return: Number of entries removed
+		"""
+		entries = self._list_entries()
+		total_size = sum(entry[1] for entry in entries)
+		if total_size <= self._max_bytes:
+			return 0
+		removed = 0
+		for mtime, size, file_path in sorted(entries):
+			if total_size <= self._max_bytes:
+				break
+			try:
+				os.remove(file_path)
+			except OSError:
+				continue
+			total_size -= size
+			removed += 1
+		write_log(f'Thumbnail cache evicted {removed} least recently used entries')
+		return removed
+
+	def clear(self):
+		""" Remove all entries from the cache """
+		for mtime, size, file_path in self._list_entries():
+			try:
+				os.remove(file_path)
+			except OSError:
+				pass
+		write_log('Thumbnail cache cleared')
+
+	def get_stats(self):
+		""" Return the number of entries and the size of the cache on disk """
+		entries = self._list_entries()
+		return {'entries': len(entries), 'size': sum(entry[1] for entry in entries), 'max_size': self._max_bytes}
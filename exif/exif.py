@@ -1,3 +1,7 @@
+import os
+import shutil
+import struct
+import threading
 from datetime import datetime
 from PIL import Image
 from PIL.ExifTags import TAGS
@@ -93,6 +97,13 @@ def write_date_to_exif(image_path, date=None):
 	"""
 	Write a date to an image's EXIF data. If no date is provided, current date is used.
 
+	Only the EXIF data is rewritten; the image data is streamed through as-is rather than being decoded and 
+	re-encoded.  JPEG and WEBP files get a new EXIF segment / chunk spliced in, TIFF files have their date tags 
+	patched or new IFDs appended.  Anything else (i.e. PNG or a BigTIFF) falls back to re-saving the image with PIL.  
+	The updated file is written to a temporary file and then moved over the original.  The file is never 
+	modified in place, so an image that is hardlinked (i.e. imported with the hardlink transfer mode) is 
+	unlinked from the other copy rather than changing it too.
+
 	Args:
 		image_path (str): Path to the image file
 		date (datetime, optional): Date to write to EXIF. Defaults to current date.
@@ -114,35 +125,21 @@ def write_date_to_exif(image_path, date=None):
 	# Format date according to EXIF specification
 	date_string = date.strftime("%Y:%m:%d %H:%M:%S")
 
+	temp_path = None
 	try:
-		# Open the image
-		image = Image.open(image_path)
-		
-		# Get existing EXIF data or create new if none exists
-		try:
-			exif_dict = piexif.load(image.info["exif"])
-		except:
-			exif_dict = {
-				"0th": {},
-				"Exif": {},
-				"GPS": {},
-				"1st": {},
-				"thumbnail": None
-			}
-		
-		# Update date fields in EXIF
-		# DateTime (0x0132) - The date and time of image creation
-		exif_dict["0th"][piexif.ImageIFD.DateTime] = date_string
-		# DateTimeOriginal (0x9003) - The date and time when the original image data was generated
-		exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = date_string
-		# DateTimeDigitized (0x9004) - The date and time when the image was stored as digital data
-		exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = date_string
-		
-		# Convert EXIF dict to bytes
-		exif_bytes = piexif.dump(exif_dict)
-		
-		# Save the image with updated EXIF data
-		image.save(image_path, exif=exif_bytes)
+		with open(image_path, 'rb') as file:
+			image_format = _get_image_format(file.read(12))
+
+		temp_path = _get_temp_path(image_path)
+		if image_format in ['JPEG', 'WEBP']:
+			_splice_exif_date(image_path, temp_path, date_string, image_format)
+		elif not (image_format == 'TIFF' and _patch_tiff_dates(image_path, temp_path, date_string)):
+			_save_exif_date(image_path, temp_path, date_string)
+
+		# Keep the permissions of the original file, then replace it (which also breaks any hardlink)
+		shutil.copymode(image_path, temp_path)
+		os.replace(temp_path, image_path)
+		temp_path = None
 		#print(f"Successfully updated EXIF date for {image_path}")
 		#logger.info(f"Successfully updated EXIF date for {image_path}")
 		result = True
@@ -153,7 +150,482 @@ def write_date_to_exif(image_path, date=None):
 		pass
 
 	finally:
-		if 'image' in locals():
-			image.close()
+		if temp_path and os.path.exists(temp_path):
+			os.remove(temp_path)
+
+	return result
+
+def _get_temp_path(image_path):
+	""" Temporary file in the same folder as the image, so that os.replace() is an atomic rename. """
+	directory, filename = os.path.split(image_path)
+	return os.path.join(directory, f'.{filename}.{os.getpid()}.{threading.get_ident()}.tmp')
+
+def _new_exif_dict():
+	return {
+		"0th": {},
+		"Exif": {},
+		"GPS": {},
+		"1st": {},
+		"thumbnail": None
+	}
+
+def _set_exif_dict_dates(exif_dict, date_string):
+	""" Update the date fields in a piexif dictionary. """
+	# DateTime (0x0132) - The date and time of image creation
+	exif_dict["0th"][piexif.ImageIFD.DateTime] = date_string
+	# DateTimeOriginal (0x9003) - The date and time when the original image data was generated
+	exif_dict["Exif"][piexif.ExifIFD.DateTimeOriginal] = date_string
+	# DateTimeDigitized (0x9004) - The date and time when the image was stored as digital data
+	exif_dict["Exif"][piexif.ExifIFD.DateTimeDigitized] = date_string
+	return exif_dict
+
+def _dump_exif_dict(exif_dict):
+	""" Convert an EXIF dictionary to bytes.  If it won't fit in a single APP1 segment, drop the embedded thumbnail. """
+	exif_bytes = piexif.dump(exif_dict)
+	if len(exif_bytes) > 65533 and exif_dict.get('thumbnail'):
+		exif_dict['thumbnail'] = None
+		exif_dict['1st'] = {}
+		exif_bytes = piexif.dump(exif_dict)
+	return exif_bytes
+
+def _get_exif_bytes(exif_data, date_string):
+	""" New EXIF data (with the 'Exif' header) with the dates set, keeping the other tags of the existing EXIF data, if any. """
+	try:
+		exif_dict = piexif.load(exif_data) if exif_data else _new_exif_dict()
+	except:
+		exif_dict = _new_exif_dict()
+	return _dump_exif_dict(_set_exif_dict_dates(exif_dict, date_string))
+
+def _copy_range(file, output, offset, length):
+	""" Copy length bytes, starting at offset, from one file to another in chunks. """
+	file.seek(offset)
+	while length > 0:
+		data = file.read(min(length, COPY_CHUNK_SIZE))
+		if not data:
+			raise _ExifHeaderUnsupported('Unexpected end of file')
+		output.write(data)
+		length -= len(data)
+
+def _splice_exif_date(image_path, temp_path, date_string, image_format):
+	""" 
+	Replace (or add) the EXIF segment of a JPEG / EXIF chunk of a WEBP.  Only the headers and the old EXIF data 
+	are read into memory, all other data is streamed through as raw bytes. 
+	"""
+	with open(image_path, 'rb') as file, open(temp_path, 'wb') as output:
+		if image_format == 'JPEG':
+			_splice_jpeg_exif(file, output, date_string)
+		else:
+			_splice_webp_exif(file, output, date_string)
+
+def _splice_jpeg_exif(file, output, date_string):
+	segment = _find_jpeg_exif_segment(file)
+	if segment:
+		# The APP1 segment starts with its marker, length and 'Exif\0\0' header, 10 bytes before the TIFF data
+		start, end = segment[0] - 10, segment[0] + segment[1]
+		exif_data = _read_exact(file, segment[0] - 6, segment[1] + 6)
+	else:
+		# A new segment goes after the JFIF (APP0) segment, if there is one, as exiftool does
+		start = end = 2
+		marker = _read_exact(file, 2, 4)
+		if marker[0:2] == b'\xff\xe0':
+			start = end = 4 + struct.unpack('>H', marker[2:4])[0]
+		exif_data = None
 
-	return result	
\ No newline at end of file
+	exif_bytes = _get_exif_bytes(exif_data, date_string)
+	_copy_range(file, output, 0, start)
+	output.write(b'\xff\xe1' + struct.pack('>H', len(exif_bytes) + 2) + exif_bytes)
+	file.seek(end)
+	shutil.copyfileobj(file, output, COPY_CHUNK_SIZE)
+
+def _get_webp_canvas(file, chunks):
+	""" Return the (flags, width, height) for a new VP8X chunk of a simple (VP8 / VP8L) WEBP file. """
+	for fourcc, offset, size in chunks:
+		if fourcc == b'VP8 ':
+			data = _read_exact(file, offset + 8, 10)
+			if data[3:6] != b'\x9d\x01\x2a':
+				raise _ExifHeaderUnsupported('Invalid VP8 frame header')
+			width, height = struct.unpack('<HH', data[6:10])
+			flags = WEBP_ALPHA_FLAG if any(chunk[0] == b'ALPH' for chunk in chunks) else 0
+			return flags, width & 0x3FFF, height & 0x3FFF
+		if fourcc == b'VP8L':
+			data = _read_exact(file, offset + 8, 5)
+			if data[0] != 0x2F:
+				raise _ExifHeaderUnsupported('Invalid VP8L header')
+			bits = struct.unpack('<I', data[1:5])[0]
+			return (WEBP_ALPHA_FLAG if bits >> 28 & 1 else 0), (bits & 0x3FFF) + 1, (bits >> 14 & 0x3FFF) + 1
+	raise _ExifHeaderUnsupported('No image data in WEBP file')
+
+def _splice_webp_exif(file, output, date_string):
+	header = _read_exact(file, 0, 12)
+	riff_end = 8 + struct.unpack('<I', header[4:8])[0]
+	chunks = []
+	offset = 12
+	while offset + 8 <= riff_end:
+		chunk = _read_exact(file, offset, 8)
+		size = struct.unpack('<I', chunk[4:8])[0]
+		chunks.append((chunk[0:4], offset, size))
+		offset += 8 + size + (size & 1)
+
+	exif_data = None
+	for fourcc, offset, size in chunks:
+		if fourcc == b'EXIF':
+			exif_data = _read_exact(file, offset + 8, size)
+	# The 'Exif\0\0' header is left out of a WEBP EXIF chunk
+	exif_bytes = _get_exif_bytes(exif_data, date_string)[6:]
+	exif_chunk = b'EXIF' + struct.pack('<I', len(exif_bytes)) + exif_bytes + b'\x00' * (len(exif_bytes) & 1)
+
+	# The new chunks, as bytes or (offset, size) of a chunk copied from the file.  The EXIF chunk replaces the old 
+	#  one, or goes before the XMP chunk or at the end, and a VP8X chunk is added to a simple WEBP file to flag it.
+	parts = []
+	if chunks[0][0] != b'VP8X':
+		flags, width, height = _get_webp_canvas(file, chunks)
+		parts.append(b'VP8X' + struct.pack('<IB', 10, flags | WEBP_EXIF_FLAG) + b'\x00' * 3 + struct.pack('<I', width - 1)[:3] + struct.pack('<I', height - 1)[:3])
+	for fourcc, offset, size in chunks:
+		if fourcc == b'VP8X':
+			data = bytearray(_read_exact(file, offset, 8 + size))
+			data[8] |= WEBP_EXIF_FLAG
+			parts.append(bytes(data) + b'\x00' * (size & 1))
+		elif fourcc == b'EXIF':
+			if exif_chunk:
+				parts.append(exif_chunk)
+				exif_chunk = None
+		else:
+			if fourcc == b'XMP ' and exif_chunk:
+				parts.append(exif_chunk)
+				exif_chunk = None
+			parts.append((offset, size))
+	if exif_chunk:
+		parts.append(exif_chunk)
+
+	riff_size = 4 + sum(len(part) if isinstance(part, bytes) else 8 + part[1] + (part[1] & 1) for part in parts)
+	output.write(b'RIFF' + struct.pack('<I', riff_size) + b'WEBP')
+	for part in parts:
+		if isinstance(part, bytes):
+			output.write(part)
+		else:
+			_copy_range(file, output, part[0], 8 + part[1])
+			output.write(b'\x00' * (part[1] & 1))
+
+def _read_tiff_ifd(file, endian, offset):
+	""" Return the entries (tag -> (type, count, raw value / offset bytes)) and the next IFD offset of the IFD at offset. """
+	count = struct.unpack(endian + 'H', _read_exact(file, offset, 2))[0]
+	if count > EXIF_MAX_IFD_ENTRIES:
+		raise _ExifHeaderUnsupported('Too many IFD entries')
+	data = _read_exact(file, offset + 2, count * 12 + 4)
+	entries = {}
+	for index in range(count):
+		tag, field_type, value_count = struct.unpack(endian + 'HHI', data[index * 12:index * 12 + 8])
+		entries[tag] = (field_type, value_count, data[index * 12 + 8:index * 12 + 12])
+	return entries, struct.unpack(endian + 'I', data[-4:])[0]
+
+def _append_tiff_data(file, data):
+	""" Append data to the end of a TIFF file, on a word boundary, and return its offset. """
+	offset = file.seek(0, os.SEEK_END)
+	if offset % 2:
+		file.write(b'\x00')
+		offset += 1
+	file.write(data)
+	return offset
+
+def _append_tiff_ifd(file, endian, entries, next_offset):
+	""" Append an IFD (entries sorted by tag) to the end of a TIFF file, and return its offset. """
+	data = struct.pack(endian + 'H', len(entries))
+	for tag in sorted(entries):
+		field_type, value_count, value = entries[tag]
+		data += struct.pack(endian + 'HHI', tag, field_type, value_count) + value
+	return _append_tiff_data(file, data + struct.pack(endian + 'I', next_offset))
+
+def _patch_tiff_dates(image_path, temp_path, date_string):
+	""" 
+	Write the date tags of a TIFF file without touching the image data.  Date tags with room for a full date are 
+	overwritten where they are.  Otherwise the new values, and new copies of the IFD0 / Exif IFD with the date tags 
+	added, are appended to the end of the file and the pointers to the IFDs updated, leaving the old IFDs unused.  
+	Returns False if the file can't be patched (i.e. a BigTIFF). 
+	"""
+	value = date_string.encode('ascii') + b'\x00'
+	shutil.copyfile(image_path, temp_path)
+	try:
+		with open(temp_path, 'r+b') as file:
+			header = _read_exact(file, 0, 8)
+			endian = '<' if header[0:2] == b'II' else '>'
+			if header[0:2] not in [b'II', b'MM'] or struct.unpack(endian + 'H', header[2:4])[0] != 42:
+				return False
+			ifd0_offset = struct.unpack(endian + 'I', header[4:8])[0]
+			ifd0, ifd0_next = _read_tiff_ifd(file, endian, ifd0_offset)
+			exif_ifd, exif_next = {}, 0
+			if EXIF_IFD_POINTER in ifd0:
+				exif_ifd, exif_next = _read_tiff_ifd(file, endian, struct.unpack(endian + 'I', ifd0[EXIF_IFD_POINTER][2])[0])
+
+			def set_dates(entries, tags):
+				""" Set the date tags of an IFD, returning True if the IFD itself has to be rewritten """
+				rewrite = False
+				for tag in tags:
+					field_type, value_count, raw = entries.get(tag, (None, 0, b''))
+					if field_type == 2 and value_count == len(value):
+						file.seek(struct.unpack(endian + 'I', raw)[0])
+						file.write(value)
+					else:
+						entries[tag] = (2, len(value), struct.pack(endian + 'I', _append_tiff_data(file, value)))
+						rewrite = True
+				return rewrite
+
+			rewrite_ifd0 = set_dates(ifd0, [0x0132])
+			if set_dates(exif_ifd, [0x9003, 0x9004]):
+				pointer_type = ifd0[EXIF_IFD_POINTER][0] if EXIF_IFD_POINTER in ifd0 else 4
+				ifd0[EXIF_IFD_POINTER] = (pointer_type, 1, struct.pack(endian + 'I', _append_tiff_ifd(file, endian, exif_ifd, exif_next)))
+				rewrite_ifd0 = True
+			if rewrite_ifd0:
+				ifd0_offset = _append_tiff_ifd(file, endian, ifd0, ifd0_next)
+				file.seek(4)
+				file.write(struct.pack(endian + 'I', ifd0_offset))
+	except (_ExifHeaderUnsupported, struct.error):
+		return False
+	return True
+
+def _save_exif_date(image_path, temp_path, date_string):
+	""" Fallback for formats that can't be updated in place: re-save the image with PIL. """
+	with Image.open(image_path) as image:
+		# Get existing EXIF data or create new if none exists
+		try:
+			exif_dict = piexif.load(image.info["exif"])
+		except:
+			exif_dict = _new_exif_dict()
+		exif_bytes = piexif.dump(_set_exif_dict_dates(exif_dict, date_string))
+		image.save(temp_path, format=image.format, exif=exif_bytes)
+
+""" 
+Header-only EXIF date reader.  Rather than decoding the image with PIL and translating every tag, these functions
+seek through the container (JPEG / TIFF / WEBP / PNG) to the EXIF block and walk just enough of the IFD structure
+to find the three date tags.  Typically only a few KB at the start of the file are read. 
+"""
+
+EXIF_DATE_TAGS = {
+	0x0132 : 'DateTime',          # IFD0
+	0x9003 : 'DateTimeOriginal',  # Exif IFD
+	0x9004 : 'DateTimeDigitized'  # Exif IFD
+}
+EXIF_IFD_POINTER = 0x8769
+EXIF_MAX_IFD_ENTRIES = 1024  # Sanity limit when walking a (possibly corrupt) IFD
+COPY_CHUNK_SIZE = 1024 * 1024  # Bytes copied at a time when the image data is streamed through
+WEBP_ALPHA_FLAG = 0x10  # VP8X chunk flags
+WEBP_EXIF_FLAG = 0x08
+
+class _ExifHeaderUnsupported(Exception):
+	""" Raised when the header reader can't handle a file, and PIL should be used instead. """
+	pass
+
+def _get_image_format(signature):
+	""" Identify the image container from the first 12 bytes of the file. Returns 'JPEG', 'TIFF', 'WEBP', 'PNG' or None. """
+	if signature[0:2] == b'\xff\xd8':
+		return 'JPEG'
+	if signature[0:4] in [b'II*\x00', b'MM\x00*']:
+		return 'TIFF'
+	if signature[0:4] == b'RIFF' and signature[8:12] == b'WEBP':
+		return 'WEBP'
+	if signature[0:8] == b'\x89PNG\r\n\x1a\n':
+		return 'PNG'
+	return None
+
+def _read_exact(file, offset, length):
+	file.seek(offset)
+	data = file.read(length)
+	if len(data) != length:
+		raise _ExifHeaderUnsupported('Unexpected end of file')
+	return data
+
+def _find_tiff_date_tags(file, base, limit=None):
+	"""
+	Walk a TIFF structure starting at byte offset 'base' in the file and find any date tags.
+
+	:param file: Open file object (binary)
+	:param base: Offset in the file of the TIFF header (all IFD offsets are relative to this)
+	:param limit: Optional length of the TIFF block (i.e. the size of the EXIF segment)
+	:return: Dictionary of tag name to (absolute file offset of the value, value length in bytes, date string)
+	"""
+	header = _read_exact(file, base, 8)
+	if header[0:2] == b'II':
+		endian = '<'
+	elif header[0:2] == b'MM':
+		endian = '>'
+	else:
+		raise _ExifHeaderUnsupported('Invalid TIFF byte order')
+	if struct.unpack(endian + 'H', header[2:4])[0] != 42:
+		raise _ExifHeaderUnsupported('Invalid TIFF magic number')
+
+	def read_block(offset, length):
+		if limit is not None and offset + length > limit:
+			raise _ExifHeaderUnsupported('IFD points outside of the EXIF block')
+		return _read_exact(file, base + offset, length)
+
+	def read_ifd(offset):
+		""" Return a dictionary of tag -> (type, count, raw value/offset bytes, offset of the value field) for the IFD at offset. """
+		count = struct.unpack(endian + 'H', read_block(offset, 2))[0]
+		if count > EXIF_MAX_IFD_ENTRIES:
+			raise _ExifHeaderUnsupported('Too many IFD entries')
+		entries = read_block(offset + 2, count * 12)
+		ifd = {}
+		for index in range(count):
+			tag, field_type, value_count = struct.unpack(endian + 'HHI', entries[index * 12:index * 12 + 8])
+			ifd[tag] = (field_type, value_count, entries[index * 12 + 8:index * 12 + 12], offset + 2 + index * 12 + 8)
+		return ifd
+
+	def read_ascii(entry):
+		field_type, value_count, value, value_field_offset = entry
+		if field_type != 2 or value_count == 0:
+			return None
+		if value_count <= 4:
+			value_offset = value_field_offset
+			data = value[:value_count]
+		else:
+			value_offset = struct.unpack(endian + 'I', value)[0]
+			data = read_block(value_offset, value_count)
+		return base + value_offset, value_count, data.split(b'\x00', 1)[0].decode('ascii', errors='replace').strip()
+
+	tags = {}
+	ifd0 = read_ifd(struct.unpack(endian + 'I', header[4:8])[0])
+	exif_ifd = {}
+	if EXIF_IFD_POINTER in ifd0:
+		exif_ifd = read_ifd(struct.unpack(endian + 'I', ifd0[EXIF_IFD_POINTER][2])[0])
+
+	for ifd in [ifd0, exif_ifd]:
+		for tag, name in EXIF_DATE_TAGS.items():
+			if tag in ifd:
+				value = read_ascii(ifd[tag])
+				if value:
+					tags[name] = value
+	return tags
+
+def _read_tiff_dates(file, base, limit=None):
+	""" Return a dictionary of tag name to date string for any date tags found in the TIFF structure at 'base'. """
+	return {name: value[2] for name, value in _find_tiff_date_tags(file, base, limit).items() if value[2]}
+
+def _find_jpeg_exif_segment(file):
+	""" Walk the JPEG markers up to the start of scan, returning the (offset, length) of the TIFF data in the APP1 EXIF segment, or None. """
+	offset = 2
+	while True:
+		marker = _read_exact(file, offset, 2)
+		if marker[0] != 0xFF:
+			raise _ExifHeaderUnsupported('Invalid JPEG marker')
+		if marker[1] == 0xFF:
+			# Fill byte, skip it
+			offset += 1
+			continue
+		if marker[1] in [0xD8, 0x01] or 0xD0 <= marker[1] <= 0xD7:
+			# Markers without a length field
+			offset += 2
+			continue
+		if marker[1] in [0xDA, 0xD9]:
+			# Start of scan (image data) or end of image, there is no EXIF segment
+			return None
+		length = struct.unpack('>H', _read_exact(file, offset + 2, 2))[0]
+		if marker[1] == 0xE1 and length >= 8:
+			if _read_exact(file, offset + 4, 6) == b'Exif\x00\x00':
+				return (offset + 10, length - 8)
+		offset += 2 + length
+
+def _read_jpeg_dates(file):
+	""" Read the date tags from the APP1 EXIF segment of a JPEG file. """
+	segment = _find_jpeg_exif_segment(file)
+	if segment is None:
+		return {}
+	return _read_tiff_dates(file, segment[0], limit=segment[1])
+
+def _read_webp_dates(file):
+	""" Walk the RIFF chunks of a WEBP file looking for the EXIF chunk. """
+	header = _read_exact(file, 0, 12)
+	riff_size = struct.unpack('<I', header[4:8])[0]
+	offset = 12
+	while offset + 8 <= riff_size + 8:
+		chunk = _read_exact(file, offset, 8)
+		chunk_size = struct.unpack('<I', chunk[4:8])[0]
+		if chunk[0:4] == b'EXIF':
+			base = offset + 8
+			# Some writers include the JPEG style 'Exif\0\0' prefix in the chunk
+			if _read_exact(file, base, 6) == b'Exif\x00\x00':
+				return _read_tiff_dates(file, base + 6, limit=chunk_size - 6)
+			return _read_tiff_dates(file, base, limit=chunk_size)
+		offset += 8 + chunk_size + (chunk_size & 1)
+	return {}
+
+def _read_png_dates(file):
+	""" Walk the PNG chunks looking for the eXIf chunk. """
+	offset = 8
+	while True:
+		chunk = _read_exact(file, offset, 8)
+		chunk_size = struct.unpack('>I', chunk[0:4])[0]
+		chunk_type = chunk[4:8]
+		if chunk_type == b'eXIf':
+			return _read_tiff_dates(file, offset + 8, limit=chunk_size)
+		if chunk_type in [b'tEXt', b'zTXt', b'iTXt'] and _read_exact(file, offset + 8, min(chunk_size, 24)).startswith(b'Raw profile type exif'):
+			# EXIF stored as a hex encoded text profile (i.e. ImageMagick), let PIL handle this
+			raise _ExifHeaderUnsupported('PNG text EXIF profile')
+		if chunk_type == b'IEND':
+			return {}
+		offset += 12 + chunk_size
+
+def read_exif_dates(image_path):
+	"""
+	Read only the EXIF date tags from an image file, without decoding the image.
+
+	Args:
+		image_path (str): Path to the image file
+
+	Returns:
+		dict or None: Dictionary of date tags found (possibly empty if the file has no EXIF data), or None 
+		if the file format isn't supported by the header reader.
+	"""
+	try:
+		with open(image_path, 'rb') as file:
+			image_format = _get_image_format(file.read(12))
+			if image_format == 'JPEG':
+				return _read_jpeg_dates(file)
+			if image_format == 'TIFF':
+				return _read_tiff_dates(file, 0)
+			if image_format == 'WEBP':
+				return _read_webp_dates(file)
+			if image_format == 'PNG':
+				return _read_png_dates(file)
+	except (_ExifHeaderUnsupported, struct.error, OSError):
+		pass
+	return None
+
+def read_exif_date(image_path):
+	"""
+	Get the date the image was taken, reading only the EXIF header where possible.  Falls back to
+	opening the image with PIL for anything the header reader doesn't support.
+
+	Args:
+		image_path (str): Path to the image file
+
+	Returns:
+		datetime or None: DateTime object of when the image was taken, or None if not found
+	"""
+	exif_dates = read_exif_dates(image_path)
+	if exif_dates is None:
+		return get_exif_date(get_exif_data(image_path))
+	return get_exif_date(exif_dates)
+
+def read_exif_thumbnail(image_path):
+	"""
+	Read the embedded EXIF thumbnail from a JPEG file, without decoding the image.
+
+	Args:
+		image_path (str): Path to the image file
+
+	Returns:
+		tuple or None: (thumbnail JPEG bytes, EXIF orientation of the main image) or None if the file has no
+		embedded thumbnail.
+	"""
+	try:
+		with open(image_path, 'rb') as file:
+			if _get_image_format(file.read(12)) != 'JPEG':
+				return None
+			segment = _find_jpeg_exif_segment(file)
+			if segment is None:
+				return None
+			exif_dict = piexif.load(b'Exif\x00\x00' + _read_exact(file, segment[0], segment[1]))
+	except Exception:
+		return None
+	if not exif_dict.get('thumbnail'):
+		return None
+	return exif_dict['thumbnail'], exif_dict['0th'].get(piexif.ImageIFD.Orientation, 1)
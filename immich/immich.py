@@ -5,8 +5,25 @@ import os
 import argparse
 import yaml
 import time
+import random
+import threading
+import uuid
+import hashlib
+import sqlite3
+import concurrent.futures
 from datetime import datetime
 from pathlib import Path
+from requests.adapters import HTTPAdapter
+
+DEFAULT_WORKERS = 4  # Concurrent uploads
+DEFAULT_RETRIES = 3  # Retries of an upload after a 5xx / 429 response or a connection error
+DEFAULT_BACKOFF = 1.0  # Seconds before the first retry, doubled for each retry after that
+DEFAULT_TIMEOUT = (10, 300)  # (connect, read) timeouts in seconds
+UPLOAD_CHUNK_SIZE = 64 * 1024  # Bytes read from a file at a time while it is sent
+RETRY_STATUS_CODES = [429, 500, 502, 503, 504]
+CHECKSUM_CACHE_FILE = 'immich_checksums.db'  # Checksum cache, next to the configuration file by default
+BULK_CHECK_BATCH_SIZE = 500  # Checksums sent to the server in each check for existing assets
+SQLITE_MAX_PARAMETERS = 900  # Stay under the default SQLite host parameter limit of 999
 
 def load_config(config_path='secrets.yaml'):
     """Load configuration from YAML file."""
@@ -47,44 +64,232 @@ def get_file_list(path, recursive=False):
             
     return files
 
-def upload_file(file_path, config, current, total):
-    """Upload a single file to the API."""
-    try:
-        stats = os.stat(file_path)
-        
-        headers = {
-            'Accept': 'application/json',
-            'x-api-key': config['api_key']
-        }
-
-        data = {
-            'deviceAssetId': f'{file_path}-{stats.st_mtime}',
-            'deviceId': 'python',
-            'fileCreatedAt': datetime.fromtimestamp(stats.st_mtime),
-            'fileModifiedAt': datetime.fromtimestamp(stats.st_mtime),
-            'isFavorite': 'false',
-        }
-
-        progress = (current / total) * 100
-        print(f"[{progress:3.1f}%] Uploading {file_path}...", end='', flush=True)
-
-        with open(file_path, 'rb') as f:
-            files = {
-                'assetData': f
-            }
-            response = requests.post(
-                f"{config['base_url']}/assets", headers=headers, data=data, files=files)
-            
-        result = response.json()
-        print(f" Done - {result}")
-        return True
-        
-    except Exception as e:
-        print(f" Error: {str(e)}")
-        return False
+def get_file_key(file_path):
+    """Key of a file in the checksum cache, (absolute path, size, mtime_ns)."""
+    stats = os.stat(file_path)
+    return (os.path.abspath(file_path), stats.st_size, stats.st_mtime_ns)
+
+class ChecksumCache:
+    """Local (SQLite) cache of file checksums.  Entries are keyed on the path, size and mtime of the file, so only new
+    or changed files are hashed again when an upload is re-run."""
+
+    def __init__(self, path):
+        self.lock = threading.Lock()
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        self.conn = sqlite3.connect(path, timeout=30, check_same_thread=False)
+        with self.lock:
+            self.conn.execute('PRAGMA journal_mode=WAL')
+            self.conn.execute('''CREATE TABLE IF NOT EXISTS checksums (
+                path TEXT PRIMARY KEY,
+                size INTEGER NOT NULL,
+                mtime_ns INTEGER NOT NULL,
+                checksum TEXT NOT NULL
+            )''')
+            self.conn.commit()
+
+    def get_many(self, keys):
+        """Look up the checksums for a list of cache keys.  Returns a dictionary of key -> checksum for each key that
+        is in the cache and still matches the file."""
+        hits = {}
+        keys_by_path = {key[0]: key for key in keys}
+        paths = list(keys_by_path.keys())
+        with self.lock:
+            for index in range(0, len(paths), SQLITE_MAX_PARAMETERS):
+                chunk = paths[index:index + SQLITE_MAX_PARAMETERS]
+                placeholders = ','.join('?' * len(chunk))
+                rows = self.conn.execute(f'SELECT path, size, mtime_ns, checksum FROM checksums WHERE path IN ({placeholders})', chunk).fetchall()
+                for path, size, mtime_ns, checksum in rows:
+                    if keys_by_path[path] == (path, size, mtime_ns):
+                        hits[keys_by_path[path]] = checksum
+        return hits
+
+    def put_many(self, items):
+        """Store checksums in the cache, from a list of (key, checksum) tuples."""
+        with self.lock:
+            self.conn.executemany('INSERT OR REPLACE INTO checksums (path, size, mtime_ns, checksum) VALUES (?, ?, ?, ?)',
+                                  [(key[0], key[1], key[2], checksum) for key, checksum in items])
+            self.conn.commit()
+
+    def close(self):
+        with self.lock:
+            self.conn.close()
+
+class RateLimiter:
+    """Limit on the bytes per second sent by all of the upload workers together."""
+
+    def __init__(self, bytes_per_second=0):
+        self.bytes_per_second = bytes_per_second
+        self.lock = threading.Lock()
+        self.next_time = time.monotonic()
+
+    def consume(self, size):
+        """Wait until size more bytes can be sent (no wait without a limit)."""
+        if not self.bytes_per_second:
+            return
+        with self.lock:
+            now = time.monotonic()
+            start = max(now, self.next_time)
+            self.next_time = start + size / self.bytes_per_second
+        if start > now:
+            time.sleep(start - now)
+
+class MultipartBody:
+    """multipart/form-data body for an asset upload, which streams the file in chunks rather than reading it into
+    memory, so that uploads can be throttled by a RateLimiter.  The SHA-1 checksum of the file (as Immich uses) is
+    computed from the same chunks as they are sent."""
+
+    def __init__(self, file_path, fields, limiter=None):
+        self.boundary = uuid.uuid4().hex
+        self.content_type = f'multipart/form-data; boundary={self.boundary}'
+        self.limiter = limiter
+        filename = os.path.basename(file_path).replace('"', '%22')
+        head = ''.join(f'--{self.boundary}\r\nContent-Disposition: form-data; name="{name}"\r\n\r\n{value}\r\n' for name, value in fields.items())
+        head += f'--{self.boundary}\r\nContent-Disposition: form-data; name="assetData"; filename="{filename}"\r\nContent-Type: application/octet-stream\r\n\r\n'
+        self.head = head.encode()
+        self.tail = f'\r\n--{self.boundary}--\r\n'.encode()
+        self.file = open(file_path, 'rb')
+        self.file_size = os.fstat(self.file.fileno()).st_size
+        self.length = len(self.head) + self.file_size + len(self.tail)
+        self.parts = [self.head, self.file, self.tail]
+        self.digest = hashlib.sha1()
+        self.hashed = 0
+
+    def __len__(self):
+        return self.length
+
+    def __iter__(self):
+        return iter(lambda: self.read(UPLOAD_CHUNK_SIZE), b'')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def read(self, size=-1):
+        size = self.length if size is None or size < 0 else size
+        data = b''
+        while self.parts and len(data) < size:
+            part = self.parts[0]
+            if isinstance(part, bytes):
+                chunk = part[:size - len(data)]
+                self.parts[0] = part[len(chunk):]
+            else:
+                chunk = part.read(size - len(data))
+                self.digest.update(chunk)
+                self.hashed += len(chunk)
+            if not chunk:
+                self.parts.pop(0)
+            data += chunk
+        if self.limiter and data:
+            self.limiter.consume(len(data))
+        return data
+
+    @property
+    def checksum(self):
+        """Hex SHA-1 checksum of the file, or None if it hasn't all been sent."""
+        return self.digest.hexdigest() if self.hashed == self.file_size else None
+
+    def close(self):
+        self.file.close()
 
-def process_path(path, config, recursive=False):
-    """Process a path, which can be a file or directory."""
+def create_session(config, workers=DEFAULT_WORKERS):
+    """Create a session, with a pool of keep-alive connections for the upload workers to share."""
+    session = requests.Session()
+    adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(1, workers))
+    session.mount('http://', adapter)
+    session.mount('https://', adapter)
+    session.headers.update({
+        'Accept': 'application/json',
+        'x-api-key': config['api_key']
+    })
+    return session
+
+def get_retry_delay(response, attempt, backoff):
+    """Seconds to wait before retrying a request, from a Retry-After header or exponential backoff with jitter."""
+    retry_after = response.headers.get('Retry-After', '') if response is not None else ''
+    if retry_after.isdigit():
+        return int(retry_after)
+    return backoff * (2 ** attempt) + random.uniform(0, backoff)
+
+def request_with_retry(send, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF):
+    """Send a request, retrying after a 5xx / 429 response or a connection error.  send() makes a single attempt and
+    returns the response.
+
+    Returns the JSON response from the server, and raises an exception if the request fails.
+    """
+    for attempt in range(retries + 1):
+        response = None
+        try:
+            response = send()
+            if response.status_code not in RETRY_STATUS_CODES:
+                response.raise_for_status()
+                return response.json()
+            error = f'HTTP {response.status_code}'
+        except (requests.ConnectionError, requests.Timeout) as e:
+            error = str(e)
+        if attempt < retries:
+            time.sleep(get_retry_delay(response, attempt, backoff))
+
+    raise IOError(f'{error} (after {retries + 1} attempts)')
+
+def check_existing_assets(session, config, checksums, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT):
+    """Ask the server which of a batch of files it already has, by their checksums.
+
+    checksums is a list of (file path, checksum) tuples.  Returns a dictionary of file path -> result, where the
+    result has an action of 'accept' (upload the file) or 'reject', with a reason ('duplicate' for an asset the server
+    already has) and the assetId of an existing asset.
+    """
+    assets = [{'id': str(index), 'checksum': checksum} for index, (file_path, checksum) in enumerate(checksums)]
+    response = request_with_retry(
+        lambda: session.post(f"{config['base_url']}/assets/bulk-upload-check", json={'assets': assets}, timeout=timeout),
+        retries)
+    return {checksums[int(result['id'])][0]: result for result in response['results']}
+
+def upload_file(file_path, config, session, limiter=None, retries=DEFAULT_RETRIES, backoff=DEFAULT_BACKOFF, timeout=DEFAULT_TIMEOUT, checksum=None):
+    """Upload a single file to the API.
+
+    The upload is retried after a 5xx / 429 response or a connection error.  Retrying is safe, as each attempt sends
+    the same deviceAssetId and file, and the server reports an asset it already has as a duplicate.  With a checksum,
+    the server can report a duplicate without the whole file being sent.  Without one, the checksum is computed as
+    the file is sent.
+
+    Returns (response from the server, checksum of the file or None), and raises an exception if the upload fails.
+    """
+    stats = os.stat(file_path)
+
+    data = {
+        'deviceAssetId': f'{file_path}-{stats.st_mtime}',
+        'deviceId': 'python',
+        'fileCreatedAt': datetime.fromtimestamp(stats.st_mtime),
+        'fileModifiedAt': datetime.fromtimestamp(stats.st_mtime),
+        'isFavorite': 'false',
+    }
+
+    sent_checksum = [checksum]
+
+    def send():
+        with MultipartBody(file_path, data, limiter) as body:
+            headers = {'Content-Type': body.content_type}
+            if checksum:
+                headers['x-immich-checksum'] = checksum
+            response = session.post(f"{config['base_url']}/assets", data=body, headers=headers, timeout=timeout)
+            sent_checksum[0] = checksum or body.checksum
+            return response
+
+    response = request_with_retry(send, retries, backoff)
+    return response, sent_checksum[0]
+
+def process_path(path, config, recursive=False, workers=DEFAULT_WORKERS, max_bandwidth=0, retries=DEFAULT_RETRIES, timeout=DEFAULT_TIMEOUT, checksum_cache=None):
+    """Process a path, which can be a file or directory.
+
+    The SHA-1 checksums of files uploaded before are read from the checksum cache (the path to an SQLite file, or None
+    for no cache), and sent to the server in batches to check for assets it already has.  Those files are skipped.
+    The rest, and the files without a cached checksum, are uploaded by a pool of workers, which compute the checksums
+    of new files as they are sent, so each file is only read once.  The new checksums are written to the cache as each
+    batch of uploads completes.  The workers share a session (and its connections) and a bandwidth limit, in bytes
+    per second (0 = no limit).
+    """
     start_time = time.time()
     
     # Get list of all files to process
@@ -97,11 +302,78 @@ def process_path(path, config, recursive=False):
     
     print(f"Found {total_files} files to process")
     
-    # Process each file
-    successful_uploads = 0
-    for i, file_path in enumerate(files, 1):
-        if upload_file(str(file_path), config, i, total_files):
-            successful_uploads += 1
+    session = create_session(config, workers)
+    limiter = RateLimiter(max_bandwidth)
+    cache = ChecksumCache(checksum_cache) if checksum_cache else None
+    counts = {'uploaded': 0, 'skipped': 0, 'failed': 0}
+    done = 0
+
+    def report(outcome, message):
+        nonlocal done
+        done += 1
+        counts[outcome] += 1
+        print(f"[{(done / total_files) * 100:3.1f}%] {message}", flush=True)
+
+    keys = {}
+    for file_path in map(str, files):
+        try:
+            keys[file_path] = get_file_key(file_path)
+        except OSError as e:
+            report('failed', f"Uploading {file_path}... Error: {str(e)}")
+    cached = cache.get_many(list(keys.values())) if cache else {}
+
+    with concurrent.futures.ThreadPoolExecutor(max_workers=max(1, workers)) as executor:
+        def submit(file_path, checksum=None):
+            return executor.submit(upload_file, file_path, config, session, limiter, retries, DEFAULT_BACKOFF, timeout, checksum)
+
+        # Files without a cached checksum start uploading straight away, and are hashed as they are sent
+        uploads = {submit(file_path): file_path for file_path, key in keys.items() if key not in cached}
+
+        # Files with a cached checksum are checked with the server first, while the workers upload
+        queued_checksums = {}
+        batch = [(file_path, cached[key]) for file_path, key in keys.items() if key in cached]
+        for index in range(0, len(batch), BULK_CHECK_BATCH_SIZE):
+            checksums = batch[index:index + BULK_CHECK_BATCH_SIZE]
+            try:
+                results = check_existing_assets(session, config, checksums, retries, timeout)
+            except Exception as e:
+                print(f"Unable to check for existing assets, uploading {len(checksums)} files without checking: {str(e)}", flush=True)
+                results = {}
+            for file_path, checksum in checksums:
+                result = results.get(file_path, {'action': 'accept'})
+                if result['action'] == 'reject' and result.get('reason') == 'duplicate':
+                    report('skipped', f"Skipping {file_path}... Already on server - {result.get('assetId')}")
+                elif result['action'] == 'reject':
+                    report('failed', f"Uploading {file_path}... Error: Rejected by server - {result.get('reason')}")
+                elif checksum in queued_checksums:
+                    report('skipped', f"Skipping {file_path}... Same as {queued_checksums[checksum]}")
+                else:
+                    queued_checksums[checksum] = file_path
+                    uploads[submit(file_path, checksum)] = file_path
+        print(f"Checked {len(batch)} cached checksums with the server, uploading {len(uploads)} files", flush=True)
+
+        # Report each upload as it completes, and cache the checksums of new files in batches
+        new_checksums = []
+        for future in concurrent.futures.as_completed(uploads):
+            file_path = uploads[future]
+            try:
+                result, checksum = future.result()
+            except Exception as e:
+                report('failed', f"Uploading {file_path}... Error: {str(e)}")
+                continue
+            if result.get('status') == 'duplicate' or result.get('duplicate'):
+                report('skipped', f"Uploading {file_path}... Already on server - {result.get('id')}")
+            else:
+                report('uploaded', f"Uploading {file_path}... Done - {result}")
+            if cache and checksum and keys[file_path] not in cached:
+                new_checksums.append((keys[file_path], checksum))
+                if len(new_checksums) >= BULK_CHECK_BATCH_SIZE:
+                    cache.put_many(new_checksums)
+                    new_checksums = []
+        if cache:
+            cache.put_many(new_checksums)
+            cache.close()
+    session.close()
     
     # Calculate and display summary
     end_time = time.time()
@@ -109,8 +381,9 @@ def process_path(path, config, recursive=False):
     
     print("\nUpload Summary:")
     print(f"Total files processed: {total_files}")
-    print(f"Successful uploads: {successful_uploads}")
-    print(f"Failed uploads: {total_files - successful_uploads}")
+    print(f"Successful uploads: {counts['uploaded']}")
+    print(f"Skipped duplicates: {counts['skipped']}")
+    print(f"Failed uploads: {counts['failed']}")
     print(f"Total runtime: {total_time:.2f} seconds")
     if total_files > 0:
         print(f"Average time per file: {total_time/total_files:.2f} seconds")
@@ -122,13 +395,30 @@ def main():
                         help='Recursively process directories')
     parser.add_argument('-c', '--config', default='secrets.yaml',
                         help='Path to configuration file (default: secrets.yaml)')
+    parser.add_argument('-w', '--workers', type=int, default=DEFAULT_WORKERS,
+                        help=f'Number of concurrent uploads (default: {DEFAULT_WORKERS})')
+    parser.add_argument('--max-bandwidth', type=float, default=0,
+                        help='Maximum upload bandwidth in MB/s for all uploads together (default: 0, no limit)')
+    parser.add_argument('--retries', type=int, default=DEFAULT_RETRIES,
+                        help=f'Retries of an upload after a server or connection error (default: {DEFAULT_RETRIES})')
+    parser.add_argument('--timeout', type=float, default=DEFAULT_TIMEOUT[1],
+                        help=f'Seconds to wait for the server to respond to an upload (default: {DEFAULT_TIMEOUT[1]})')
+    parser.add_argument('--checksum-cache', default=None,
+                        help=f'Path to the checksum cache (default: {CHECKSUM_CACHE_FILE} next to the configuration file)')
+    parser.add_argument('--no-checksum-cache', action='store_true',
+                        help='Compute the checksum of every file, without reading or updating the cache')
     
     args = parser.parse_args()
     
     # Load configuration
     config = load_config(args.config)
     
-    process_path(args.path, config, args.recursive)
+    checksum_cache = None
+    if not args.no_checksum_cache:
+        checksum_cache = args.checksum_cache or os.path.join(os.path.dirname(os.path.abspath(args.config)), CHECKSUM_CACHE_FILE)
+    
+    process_path(args.path, config, args.recursive, workers=args.workers, max_bandwidth=int(args.max_bandwidth * 1024 * 1024),
+                 retries=max(0, args.retries), timeout=(DEFAULT_TIMEOUT[0], args.timeout), checksum_cache=checksum_cache)
 
 if __name__ == '__main__':
     main()
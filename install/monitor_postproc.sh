@@ -40,8 +40,8 @@ while true; do
         
         # Try to find the actual process
         echo ""
-        echo "Looking for sortphotos or Python processes..."
-        ps aux | grep -E "(sortphotos|python|postproc)" | grep -v grep
+        echo "Looking for sorter or Python processes..."
+        ps aux | grep -E "(sorter|python|postproc)" | grep -v grep
     fi
     
     sleep 30
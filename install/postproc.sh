@@ -67,65 +67,36 @@ fi
 log_msg "Deleting all files in import/ folder"
 find "./import/" -mindepth 1 -delete 2>&1 || log_msg "Warning: Error deleting import folder contents"
 
-# Copy with -p flag to preserve attributes all files and folders in export/ folder to import/unsorted/ folder (create if it doesn't exist)
-log_msg "Copying $file_count files in export/ folder to import/unsorted/ folder"
-mkdir -p "./import/unsorted"
-
-# Use rsync instead of cp for better progress reporting and performance with large numbers of files
-if command -v rsync &> /dev/null; then
-    log_msg "Using rsync for copy operation (better for large file counts)"
-    rsync -a --info=progress2 "./export/" "./import/unsorted/" 2>&1 || {
-        log_msg "ERROR: Failed to copy files from export to import/unsorted"
-        exit 1
-    }
-else
-    log_msg "Using cp for copy operation (rsync not available)"
-    cp -rp "./export/"* "./import/unsorted/" 2>&1 || {
-        log_msg "ERROR: Failed to copy files from export to import/unsorted"
-        exit 1
-    }
-fi
-
-log_msg "Verifying copy operation..."
-import_count=$(find "./import/unsorted" -type f 2>/dev/null | wc -l)
-log_msg "Copied $import_count files to import/unsorted"
-
-if [ "$import_count" -ne "$file_count" ]; then
-    log_msg "WARNING: File count mismatch! Expected $file_count but got $import_count"
-fi
-
-# Delete all files and folders in export/ folder
-log_msg "Deleting all files in export/ folder"
-find "./export/" -mindepth 1 -delete 2>&1 || log_msg "Warning: Error deleting export folder contents"
-
 log_msg "Creating /export/sorted folder"
-# Create /export/sorted and ensure it's empty
 mkdir -p "./export/sorted" || {
     log_msg "ERROR: Failed to create export/sorted folder"
     exit 1
 }
 
-# Run sortphotos with unbuffered output
-log_msg "Running sortphotos to organize files..."
-log_msg "Command: python -u ./sortphotos/src/sortphotos.py -r --sort %Y/%m import/unsorted export/sorted"
+# Sort the export folder in place into export/sorted.  Files are renamed into their dated folders (no copy through
+# import/unsorted), and the folders they leave empty are removed.  SORT_PATTERN / SORT_WORKERS are set from the settings.
+SORT_PATTERN="${SORT_PATTERN:-%Y/%m}"
+SORT_WORKERS="${SORT_WORKERS:-4}"
+log_msg "Running sorter to organize files..."
+log_msg "Command: python -u -m sorter -r --prune --sort $SORT_PATTERN --workers $SORT_WORKERS export export/sorted"
 
-# Run sortphotos with timeout protection and better output handling
-timeout 3600 python -u ./sortphotos/src/sortphotos.py -r --sort %Y/%m import/unsorted export/sorted 2>&1 || {
+# Run the sorter with timeout protection
+timeout 3600 python -u -m sorter -r --prune --sort "$SORT_PATTERN" --workers "$SORT_WORKERS" ./export ./export/sorted 2>&1 || {
     exit_code=$?
     if [ $exit_code -eq 124 ]; then
-        log_msg "ERROR: sortphotos timed out after 3600 seconds"
+        log_msg "ERROR: sorter timed out after 3600 seconds"
     else
-        log_msg "ERROR: sortphotos failed with exit code $exit_code"
+        log_msg "ERROR: sorter failed with exit code $exit_code"
     fi
     exit 1
 }
 
-log_msg "Verifying sortphotos output..."
+log_msg "Verifying sorter output..."
 sorted_count=$(find "./export/sorted" -type f 2>/dev/null | wc -l)
 log_msg "Found $sorted_count files in export/sorted after sorting"
 
 # Optionally, run Python script to export to Immich.  Uncomment below if you want to use this feature
 # log_msg "Running export to Immich script"
-# python -u ./immich/immich.py -c ./config/secrets.yaml -r export/sorted
+# python -u ./immich/immich.py -c ./config/secrets.yaml -r -w 4 export/sorted
 
 log_msg "Script complete!"
\ No newline at end of file
@@ -91,10 +91,10 @@ else
     exit 1
 fi
 
-# Run sortphotos
-echo " - Running sortphotos"
-python -u ./sortphotos/src/sortphotos.py -r --sort %Y/%m "$IMPORT_DIR" "$SORTED_DIR" 2>&1 || {
-    echo "ERROR: sortphotos failed with exit code $?"
+# Run the sorter (SORT_PATTERN / SORT_WORKERS are set from the settings)
+echo " - Running sorter"
+python -u -m sorter -r --sort "${SORT_PATTERN:-%Y/%m}" --workers "${SORT_WORKERS:-4}" "$IMPORT_DIR" "$SORTED_DIR" 2>&1 || {
+    echo "ERROR: sorter failed with exit code $?"
     exit 1
 }
 
@@ -0,0 +1 @@
+from sorter.sorter import *
\ No newline at end of file
@@ -0,0 +1,4 @@
+import sys
+from sorter.sorter import main
+
+sys.exit(main())
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Sorter Script
+ *****************************************
+
+ Description: Sorts photos into folders by the date they were taken.
+
+  Each file is laid out under the destination folder by a strftime
+  pattern (i.e. '%Y/%m' for destination/2019/06/IMG_0001.jpg), using the
+  EXIF date read by the exif module, or the file's modification time for
+  files without one.  The dates are read, and the files moved, by a pool
+  of worker threads.  Files are renamed into place where the source and
+  destination are on the same filesystem, and copied (and deleted)
+  otherwise.
+
+  A file with the same name and content as one already in its folder is
+  a duplicate, and is removed rather than sorted again.  A different file
+  with the same name gets a numbered name, i.e. IMG_0001_1.jpg.
+
+  Run from the application folder, in place of sortphotos:
+
+    python -u -m sorter -r --sort %Y/%m import/unsorted import/presorted
+
+ *****************************************
+"""
+
+import argparse
+import datetime
+import os
+import time
+from exif.exif import read_exif_date
+from common.common import get_worker_count
+from common.copy_engine import MOVE_MODES
+from common.process_plan import export_file, format_plan_timings, run_plan_actions
+
+"""
+Globals
+"""
+
+SORT_PATTERN = '%Y/%m'
+SORT_WORKERS = 4  # Files dated / moved in parallel, 0 = automatic
+SORT_BATCH_SIZE = 64  # Files sorted between progress updates
+SORT_PROGRESS_INTERVAL = 2  # Seconds between progress lines
+SORT_OUTCOMES = ['added', 'renamed', 'duplicate', 'unchanged', 'error']
+
+"""
+Sorter
+"""
+
+def log_msg(message):
+	""" Print a message with a timestamp, in the same format as the pre / post processing scripts """
+	print(f"[{datetime.datetime.now().strftime('%Y-%m-%d %H:%M:%S')}] {message}", flush=True)
+
+def is_valid_sort_pattern(pattern):
+	""" Check that a strftime pattern makes a relative folder path that stays inside the destination folder """
+	if not pattern or pattern.startswith('/'):
+		return False
+	try:
+		folder = datetime.datetime(2000, 1, 1).strftime(pattern)
+	except ValueError:
+		return False
+	return all(part not in ['', '.', '..'] for part in folder.split('/'))
+
+def get_file_date(file_path):
+	"""
+	Get the date to sort a file by
+
+	:param file_path: Path to the file
+	:return: Tuple of (datetime, source), where the source is 'exif', or 'file' for the modification time of a file
+		without an EXIF date
+	"""
+	try:
+		date = read_exif_date(file_path)
+	except Exception:
+		date = None
+	if date:
+		return date, 'exif'
+	return datetime.datetime.fromtimestamp(os.path.getmtime(file_path)), 'file'
+
+def list_files(source_folder, recursive=False, exclude=None):
+	"""
+	List the files to sort, skipping hidden files and folders
+
+	:param source_folder: Folder to sort
+	:param recursive: Include the files in sub-folders
+	:param exclude: Optional folder to leave out, i.e. a destination folder inside the source folder
+	:return: Sorted list of file paths
+	"""
+	exclude = os.path.realpath(exclude) if exclude else None
+	files = []
+	for root, dirs, filenames in os.walk(source_folder):
+		if recursive:
+			dirs[:] = [d for d in dirs if not d.startswith('.') and os.path.realpath(os.path.join(root, d)) != exclude]
+		else:
+			dirs[:] = []
+		files.extend(os.path.join(root, filename) for filename in filenames if not filename.startswith('.'))
+	return sorted(files)
+
+def prune_empty_folders(folder, exclude=None):
+	""" Remove the empty sub-folders left in a folder after sorting it (not the folder itself, or an excluded folder) """
+	exclude = os.path.realpath(exclude) if exclude and os.path.realpath(exclude) != os.path.realpath(folder) else None
+	removed = 0
+	for root, dirs, filenames in os.walk(folder, topdown=False):
+		real_root = os.path.realpath(root)
+		if real_root == os.path.realpath(folder) or (exclude and (real_root == exclude or real_root.startswith(exclude + os.sep))):
+			continue
+		try:
+			os.rmdir(root)
+			removed += 1
+		except OSError:
+			pass
+	return removed
+
+def sort_file(file_path, destination_folder, pattern=SORT_PATTERN, move_mode='rename'):
+	"""
+	Sort a single file into the destination folder
+
+	:param file_path: Path to the file
+	:param destination_folder: Folder to sort into
+	:param pattern: strftime pattern for the folder under the destination folder
+	:param move_mode: 'rename' or 'copy'
+	:return: Tuple of (outcome, path in the destination folder).  The outcome is 'added', 'renamed', 'duplicate' or
+		'unchanged' (for a file that is already where it would be sorted to).
+	"""
+	date = get_file_date(file_path)[0]
+	folder = os.path.join(destination_folder, date.strftime(pattern))
+	destination = os.path.join(folder, os.path.basename(file_path))
+	if os.path.exists(destination) and os.path.samefile(file_path, destination):
+		return 'unchanged', destination
+	os.makedirs(folder, exist_ok=True)
+	outcome, destination, _ = export_file(file_path, destination, move_mode)
+	return outcome, destination
+
+def sort_photos(source_folder, destination_folder, pattern=SORT_PATTERN, recursive=False, workers=SORT_WORKERS, move_mode='rename', prune=False, progress=None):
+	"""
+	Sort the files in a folder into dated folders
+
+	:param source_folder: Folder to sort.  The destination folder may be inside it, in which case it's left out.
+	:param destination_folder: Folder to sort into
+	:param pattern: strftime pattern for the folders under the destination folder
+	:param recursive: Include the files in sub-folders of the source folder
+	:param workers: Number of files dated / moved in parallel, 0 = automatic
+	:param move_mode: 'rename' or 'copy'
+	:param prune: Remove the sub-folders of the source folder that are left empty
+	:param progress: Optional function called with (done, total, results) after each batch of files, where results is
+		a list of (file, outcome, path in the destination folder or error message) for the batch
+	:return: Dictionary of total, counts (of each outcome), timings and pruned (number of folders removed)
+	"""
+	if not is_valid_sort_pattern(pattern):
+		raise ValueError(f"Invalid sort pattern '{pattern}'")
+	if not os.path.isdir(source_folder):
+		raise ValueError(f"Source folder '{source_folder}' does not exist")
+
+	files = list_files(source_folder, recursive=recursive, exclude=destination_folder)
+	counts = {outcome: 0 for outcome in SORT_OUTCOMES}
+
+	def run_action(action):
+		try:
+			return sort_file(action['file'], destination_folder, pattern, move_mode)
+		except Exception as e:
+			return 'error', str(e)
+
+	def batch_callback(completed, done):
+		for action, outcome, message in completed:
+			counts[outcome] += 1
+		if progress:
+			progress(done, len(files), [(action['file'], outcome, message) for action, outcome, message in completed])
+
+	os.makedirs(destination_folder, exist_ok=True)
+	actions = [{'op': 'sort', 'file': file_path} for file_path in files]
+	timings, _ = run_plan_actions(actions, run_action, workers=get_worker_count(workers), batch_size=SORT_BATCH_SIZE, batch_callback=batch_callback)
+	pruned = prune_empty_folders(source_folder, exclude=destination_folder) if prune else 0
+	return {'total': len(files), 'counts': counts, 'timings': timings, 'pruned': pruned}
+
+"""
+Command Line
+"""
+
+def main():
+	parser = argparse.ArgumentParser(description='Sort photos into folders by the date they were taken')
+	parser.add_argument('source', help='Folder to sort')
+	parser.add_argument('destination', help='Folder to sort into (may be inside the source folder)')
+	parser.add_argument('-r', '--recursive', action='store_true', help='Include the files in sub-folders')
+	parser.add_argument('-s', '--sort', default=SORT_PATTERN, help=f"strftime pattern for the folders to sort into (default '{SORT_PATTERN}')")
+	parser.add_argument('-w', '--workers', type=int, default=SORT_WORKERS, help='Files dated / moved in parallel, 0 = automatic')
+	parser.add_argument('--move-mode', choices=MOVE_MODES, default='rename', help="'rename' where possible, or 'copy' and delete")
+	parser.add_argument('--prune', action='store_true', help='Remove the sub-folders of the source folder left empty')
+	args = parser.parse_args()
+
+	if not is_valid_sort_pattern(args.sort):
+		log_msg(f"ERROR: Invalid sort pattern '{args.sort}'")
+		return 1
+	if not os.path.isdir(args.source):
+		log_msg(f"ERROR: Source folder '{args.source}' does not exist")
+		return 1
+
+	log_msg(f"Sorting '{args.source}' into '{args.destination}' by '{args.sort}'")
+	last_update = [0.0]
+
+	def progress(done, total, results):
+		for file_path, outcome, message in results:
+			if outcome == 'error':
+				log_msg(f"ERROR: {file_path}: {message}")
+			elif outcome == 'renamed':
+				log_msg(f"Renamed {file_path} -> {message}")
+		if done == total or time.monotonic() - last_update[0] >= SORT_PROGRESS_INTERVAL:
+			last_update[0] = time.monotonic()
+			log_msg(f"Progress: {done}/{total} files ({done * 100 // max(total, 1)}%)")
+
+	result = sort_photos(args.source, args.destination, pattern=args.sort, recursive=args.recursive, workers=args.workers, move_mode=args.move_mode, prune=args.prune, progress=progress)
+	counts = result['counts']
+	log_msg(f"Sorted {result['total']} files: {counts['added']} added, {counts['renamed']} renamed, {counts['duplicate']} duplicates removed, {counts['unchanged']} already sorted, {counts['error']} errors")
+	if args.prune:
+		log_msg(f"Removed {result['pruned']} empty folders")
+	log_msg(f"Timings: {format_plan_timings(result['timings'])}")
+	return 1 if counts['error'] else 0
@@ -52,6 +52,209 @@ function fixFiles(action, task_id) {
 	$('#process_working_row').load('/fixfiles', senddata).fadeIn(500);
 }
 
+// Fix files page.  The results of the analysis are loaded a page at a time from /tasks/<task_id>/results as each 
+// table is scrolled.  The choices for the files without dates are saved to /tasks/<task_id>/choices as they are
+// made, one change at a time, and the server works out the choice for every file when they are processed.
+var resultsTaskId = null;
+var resultsState = {};
+var resultsObserver = null;
+var fileOptions = {};	// Path and filename -> dates found for the file, for the bulk selections
+var choiceRequests = $.when();	// Choices are saved in the order they were made
+var RESULTS_PAGE_SIZE = 100;
+
+function showResults(task_id, groups) {
+	resultsTaskId = task_id;
+	resultsState = {};
+	fileOptions = {};
+	if (resultsObserver) {
+		resultsObserver.disconnect();
+	}
+	resultsObserver = window.IntersectionObserver ? new IntersectionObserver(function(entries) {
+		entries.forEach(function(entry) {
+			if (entry.isIntersecting) {
+				loadResults($(entry.target).data('group'));
+			}
+		});
+	}, { rootMargin: '800px' }) : null;
+	groups.forEach(function(group) {
+		resultsState[group] = { offset: 0, total: null, loading: false, generation: 0, query: {} };
+		$('#' + group + '_filters [data-filter]').on('change', function() {
+			resetResults(group);
+		});
+		resetResults(group);
+	});
+	$('#submitAllModal').on('show.bs.modal', showProcessPlan);
+	$('#files_without_dates_rows').on('change', 'input[type=radio]', function() {
+		// A custom date is saved once it has been picked
+		if (this.value) {
+			saveFileChoice($(this).closest('tr').attr('data-file'), this.value);
+		}
+	});
+}
+
+function resetResults(group) {
+	var state = resultsState[group];
+	state.generation += 1;
+	state.offset = 0;
+	state.total = null;
+	state.loading = false;
+	state.query = {};
+	$('#' + group + '_filters [data-filter]').each(function() {
+		if ($(this).val()) {
+			state.query[$(this).data('filter')] = $(this).val();
+		}
+	});
+	$('#' + group + '_rows').empty();
+	$('#' + group + '_more').html('<i class="fa-solid fa-spinner fa-spin"></i>&nbsp; Loading...').show();
+	if (resultsObserver) {
+		resultsObserver.observe(document.getElementById(group + '_more'));
+	} else {
+		loadResults(group);
+	}
+}
+
+function loadResults(group) {
+	var state = resultsState[group];
+	if (!state || state.loading || (state.total !== null && state.offset >= state.total)) {
+		return;
+	}
+	state.loading = true;
+	var generation = state.generation;
+	var senddata = $.extend({ 'group': group, 'offset': state.offset, 'limit': RESULTS_PAGE_SIZE, 'rows': 'html' }, state.query);
+	// Wait for the choices being saved, so that the rows show them
+	choiceRequests.always(function() {
+		$.ajax({
+			url: '/tasks/' + encodeURIComponent(resultsTaskId) + '/results',
+			type: 'GET',
+			dataType: 'json',
+			data: senddata,
+			success: function(data) {
+				if (generation !== state.generation) {
+					return;  // The filters changed while the page was loading
+				}
+				var rows = $('#' + group + '_rows');
+				var loaded = rows.children().length;
+				rows.append(data.html);
+				if (group === 'files_without_dates') {
+					showFileChoices(rows.children().slice(loaded), data.items);
+				}
+				if (data.folders) {
+					var select = $('#' + group + '_filters [data-filter=folder]');
+					select.find('option:not(:first)').remove();
+					data.folders.forEach(function(folder) {
+						select.append($('<option>').val(folder).text(folder));
+					});
+					select.val(state.query.folder || '');
+				}
+				state.offset += data.items.length;
+				state.total = data.total;
+				$('#' + group + '_count').text(data.total == data.count ? data.count + ' files' : data.total + ' of ' + data.count + ' files');
+				state.loading = false;
+				var more = $('#' + group + '_more');
+				if (state.offset >= state.total || data.items.length == 0) {
+					if (resultsObserver) {
+						resultsObserver.unobserve(more[0]);
+					}
+					more.text(state.total ? '' : 'No files found.');
+				} else if (resultsObserver) {
+					// Observe again, so that the next page loads if the end of the table is still in view
+					resultsObserver.unobserve(more[0]);
+					resultsObserver.observe(more[0]);
+				} else {
+					more.html('<button class="btn btn-outline-secondary btn-sm">Load More</button>');
+					more.find('button').on('click', function() {
+						loadResults(group);
+					});
+				}
+			},
+			error: function(xhr, status, error) {
+				state.loading = false;
+				$('#' + group + '_more').text('Unable to load the files: ' + (error || status));
+			}
+		});
+	});
+}
+
+// Save a choice: scope ('file', 'folder' or 'all'), target, type and value
+function saveChoice(choice) {
+	var send = function() {
+		return $.ajax({
+			url: '/tasks/' + encodeURIComponent(resultsTaskId) + '/choices',
+			type: 'POST',
+			dataType: 'json',
+			data: choice,
+			success: function() {
+				$('#choices_error').hide();
+			},
+			error: function(xhr, status, error) {
+				var message = xhr.responseJSON ? xhr.responseJSON.message : (error || status);
+				$('#choices_error').text('Unable to save the choice: ' + message).show();
+			}
+		});
+	};
+	choiceRequests = choiceRequests.then(send, send);
+	return choiceRequests;
+}
+
+function saveFileChoice(file, value) {
+	if (value === 'ignore' || value === 'delete') {
+		return saveChoice({ 'scope': 'file', 'target': file, 'type': value });
+	}
+	return saveChoice({ 'scope': 'file', 'target': file, 'type': 'custom', 'value': value });
+}
+
+// Same rules as apply_bulk_choice() on the server: a selection of a date the file doesn't have leaves its choice
+function applyBulkChoice(options, choice, type, value) {
+	if (type === 'ignore' || type === 'delete') {
+		return type;
+	}
+	if (type === 'custom') {
+		return value || '';
+	}
+	return options[type] || choice;
+}
+
+function showFileChoices(rows, items) {
+	rows.each(function(index) {
+		var file = items[index];
+		var guessed_dates = file.guessed_dates || {};
+		fileOptions[file.path + '/' + file.filename] = {
+			'startdate': file.start_date,
+			'enddate': file.end_date,
+			'filedate': guessed_dates.filedate,
+			'filename': guessed_dates.filename,
+			'pathname': guessed_dates.pathname
+		};
+		showFileChoice(this, file.choice);
+	});
+}
+
+function showFileChoice(row, choice) {
+	var radios = $(row).find('input[type=radio]');
+	var selected = radios.filter(function() {
+		return this.value === choice && !this.id.endsWith('_custom');
+	});
+	if (selected.length) {
+		selected.prop('checked', true);
+	} else {
+		radios.filter(function() {
+			return this.id.endsWith('_custom');
+		}).val(choice).prop('checked', true);
+		$(row).find('input[type=date]').val(choice);
+	}
+}
+
+// Resume an analyze or process task that was stopped part way through
+function resumeTask(kind, task_id) {
+	$('#process_welcome_row').hide();
+	$('#process_unfinished_row').hide();
+	var senddata = {
+		'action' : 'resume',
+		'task_id' : task_id
+	};
+	$('#process_working_row').load(kind == 'analyze' ? '/importfolder' : '/finish', senddata).fadeIn(500);
+}
+
 function postProcess(action) {
 	$('#process_welcome_row').hide();
 	var senddata = { 
@@ -60,59 +263,155 @@ function postProcess(action) {
 	$('#process_working_row').load('/postproc', senddata).fadeIn(500);
 }
 
-// function that finds all radio buttons on the page that are selected and returns their ID and value
-function getRadioValues() {
-	var radio_values = {};
-	$('input[type=radio]:checked').each(function() {
-		radio_values[$(this).attr('name')] = $(this).val();
-	});
-	//console.log(radio_values);
-	return radio_values;
-} 
-
 function updateCustomDate(fileId) {
 	var dateInput = document.getElementById('fileid_' + fileId + '_custom_date');
 	var radioInput = document.getElementById('fileid_' + fileId + '_custom');
 	radioInput.value = dateInput.value;
+	if (radioInput.checked && radioInput.value) {
+		saveFileChoice(fileId, radioInput.value);
+	}
 }
 
+// Bulk selections apply to every file in the folder chosen in the filters (or every file), including those that 
+// haven't been loaded yet.  The rows shown are all in that folder, so they are updated here rather than reloaded.
 function setAllRadio(type) {
-	var radios = document.querySelectorAll('.form-check-input');
-	radios.forEach(function(radio) {
-		if (type === 'ignore' && radio.value === 'ignore') {
-			radio.checked = true;
-		} else if (type === 'delete' && radio.value === 'delete') {
-			radio.checked = true;
-		} else if (type === 'custom' && radio.id.includes('_custom')) {
-			radio.checked = true;
-			var custom_date = document.getElementById('selectDateModalBulk');
-			radio.value = custom_date.value;
-			var update_date = document.getElementById(radio.id + '_date');
-			update_date.value = custom_date.value;
-		} else if (type === 'startdate' && radio.id.includes('_startdate')) {
-			radio.checked = true;
-		} else if (type === 'enddate' && radio.id.includes('_enddate')) {
-			radio.checked = true;
-		} else if (type === 'filedate' && radio.id.includes('_filedate')) {
-			radio.checked = true;
-		} else if (type === 'filename' && radio.id.includes('_filename')) {
-			radio.checked = true;
-		} else if (type === 'pathname' && radio.id.includes('_pathname')) {
-			radio.checked = true;
+	var value = null;
+	if (type === 'custom') {
+		value = document.getElementById('selectDateModalBulk').value;
+		if (!value) {
+			return;
 		}
+	}
+	var folder = $('#files_without_dates_filters [data-filter=folder]').val();
+	saveChoice({ 'scope': folder ? 'folder' : 'all', 'target': folder, 'type': type, 'value': value });
+	$('#files_without_dates_rows > tr').each(function() {
+		var choice = $(this).find('input[type=radio]:checked').val() || 'ignore';
+		showFileChoice(this, applyBulkChoice(fileOptions[$(this).attr('data-file')], choice, type, value));
+	});
+}
+
+// Summary of what processing will do, from a dry run with the choices saved so far
+function showProcessPlan() {
+	var plan = $('#process_plan');
+	plan.html('<i class="fa-solid fa-spinner fa-spin"></i>&nbsp; Checking the files...');
+	choiceRequests.always(function() {
+		$.ajax({
+			url: '/tasks/' + encodeURIComponent(resultsTaskId) + '/plan',
+			type: 'GET',
+			dataType: 'json',
+			data: { 'summary': 1 },
+			success: function(data) {
+				var megabytes = function(bytes) {
+					return (bytes / 1048576).toFixed(1) + ' MB';
+				};
+				var text = data.counts.edit + ' dates will be written, ' + data.counts.delete + ' files deleted and ' + 
+					data.counts.move + ' files moved to the export folder (' + megabytes(data.bytes.move);
+				if (data.bytes.copy) {
+					text += ', ' + megabytes(data.bytes.copy) + ' of it copied';
+				}
+				plan.text(text + ').');
+			},
+			error: function() {
+				plan.text('');
+			}
+		});
 	});
 }
 
 function submitAllSelected() {
-	var radio_values = getRadioValues();
 	var task_id = document.getElementById('task_id').value;
-	radio_values = JSON.stringify(radio_values);
 	var senddata = {
 		'action' : 'process',
-		'radio_values' : radio_values,
 		'task_id' : task_id
 	};
-	$('#process_working_row').load('/finish', senddata).fadeIn(500);
+	// The choices are read on the server, once the last of them has been saved
+	choiceRequests.always(function() {
+		$('#process_working_row').load('/finish', senddata).fadeIn(500);
+	});
+}
+
+// Follow the progress of a background task (copy, analyze or process).  Progress is pushed by the server
+// through /tasks/<task_id>/events, falling back to polling the progress action of the page if server-sent
+// events aren't available.  Handlers: progress(data), completed(data), failed(error), requestFailed(error)
+var activeTaskEvents = null;
+
+function watchTask(task_id, poll_url, poll_action, handlers) {
+	if (activeTaskEvents) {
+		activeTaskEvents.close();
+		activeTaskEvents = null;
+	}
+	if (!window.EventSource) {
+		pollTask(task_id, poll_url, poll_action, handlers);
+		return;
+	}
+	var source = new EventSource('/tasks/' + encodeURIComponent(task_id) + '/events');
+	activeTaskEvents = source;
+	source.addEventListener('progress', function(event) {
+		handlers.progress(JSON.parse(event.data));
+	});
+	source.addEventListener('completed', function(event) {
+		var data = JSON.parse(event.data);
+		source.close();
+		activeTaskEvents = null;
+		handlers.progress(data);
+		handlers.completed(data);
+	});
+	source.addEventListener('failed', function(event) {
+		source.close();
+		activeTaskEvents = null;
+		handlers.failed(JSON.parse(event.data).error);
+	});
+	source.onerror = function() {
+		// The browser reconnects on its own (i.e. when the server closes a long running stream), unless the 
+		// stream couldn't be opened at all
+		if (source.readyState === EventSource.CLOSED) {
+			activeTaskEvents = null;
+			pollTask(task_id, poll_url, poll_action, handlers);
+		}
+	};
+}
+
+// Show the progress of a task on a progress bar, or its place in the queue while it waits to start
+function showTaskProgress(bar, data) {
+	if (data.status === 'queued') {
+		$(bar).css("width", "100%");
+		$(bar).text(data.queue_position ? "Queued (position " + data.queue_position + ")" : "Queued");
+		return;
+	}
+	var progress = Math.floor(data.progress || 0);
+	$(bar).css("width", progress + "%");
+	$(bar).text(progress + "%");
+}
+
+function pollTask(task_id, poll_url, poll_action, handlers) {
+	var senddata = {
+		'action' : poll_action,
+		'task_id' : task_id
+	};
+	var poll_interval = setInterval(function() {
+		$.ajax({
+			url: poll_url,
+			type: 'POST',
+			dataType: 'json',
+			data: senddata,
+			success: function(data) {
+				if (data.status === 'error' || data.status === 'cancelled' || data.status === 'not_found') {
+					clearInterval(poll_interval);
+					handlers.failed(data.error || '');
+					return;
+				}
+				handlers.progress(data);
+				if (data.status === 'completed') {
+					clearInterval(poll_interval);
+					handlers.completed(data);
+				}
+			},
+			error: function(xhr, status, error) {
+				clearInterval(poll_interval);
+				handlers.requestFailed(error || status || 'Unknown request error');
+			}
+		});
+	}, 500);
 }
 
 function showResultsPage(task_id) {
@@ -124,12 +423,14 @@ function showResultsPage(task_id) {
 }
 
 function cancelAction(task_id) {
-	var senddata = {
-		'action' : 'cancel',
-		'task_id' : task_id
-	};
-	$('#process_working_row').load('/cancel', senddata);
-	window.location.replace('/');
+	// The task stops at its next progress update, there's no need to wait for it
+	$.ajax({
+		url: '/tasks/' + encodeURIComponent(task_id) + '/cancel',
+		type: 'POST',
+		complete: function() {
+			window.location.replace('/');
+		}
+	});
 }
 
 // Select Originals to Process 
@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+
+"""
+ *****************************************
+ 	Immich Uploader Tests
+ *****************************************
+
+ Description: Runs the Immich uploader against a local stub of the API,
+  served by http.server on a random port.
+
+    python -m unittest discover tests
+
+ *****************************************
+"""
+
+import contextlib
+import hashlib
+import http.server
+import io
+import json
+import os
+import shutil
+import tempfile
+import threading
+import time
+import unittest
+from unittest import mock
+from immich import immich
+
+"""
+Stub Server
+"""
+
+class StubImmich(http.server.ThreadingHTTPServer):
+	""" Stub of the Immich upload and bulk upload check endpoints, which records what it receives """
+
+	def __init__(self):
+		super().__init__(('127.0.0.1', 0), StubHandler)
+		self.lock = threading.Lock()
+		self.assets = {}  # checksum -> asset id
+		self.upload_attempts = 0
+		self.fail_uploads = 0  # Next uploads answered with a 500
+		self.drop_uploads = 0  # Next uploads dropped without a response
+		self.broken = set()  # Checksums of files always answered with a 500
+		self.upload_delay = 0
+		self.active = 0
+		self.max_active = 0
+		self.base_url = f'http://127.0.0.1:{self.server_address[1]}/api'
+
+class StubHandler(http.server.BaseHTTPRequestHandler):
+	protocol_version = 'HTTP/1.1'
+
+	def log_message(self, *args):
+		pass
+
+	def send_json(self, status, data):
+		body = json.dumps(data).encode()
+		self.send_response(status)
+		self.send_header('Content-Type', 'application/json')
+		self.send_header('Content-Length', str(len(body)))
+		self.end_headers()
+		self.wfile.write(body)
+
+	def do_POST(self):
+		body = self.rfile.read(int(self.headers['Content-Length']))
+		if self.path == '/api/assets/bulk-upload-check':
+			self.bulk_upload_check(json.loads(body))
+		elif self.path == '/api/assets':
+			self.upload(body)
+		else:
+			self.send_json(404, {})
+
+	def bulk_upload_check(self, data):
+		results = []
+		with self.server.lock:
+			for asset in data['assets']:
+				if asset['checksum'] in self.server.assets:
+					results.append({'id': asset['id'], 'action': 'reject', 'reason': 'duplicate', 'assetId': self.server.assets[asset['checksum']]})
+				else:
+					results.append({'id': asset['id'], 'action': 'accept'})
+		self.send_json(200, {'results': results})
+
+	def upload(self, body):
+		server = self.server
+		with server.lock:
+			server.upload_attempts += 1
+			if server.drop_uploads:
+				server.drop_uploads -= 1
+				self.close_connection = True
+				return
+			if server.fail_uploads:
+				server.fail_uploads -= 1
+				self.send_json(500, {'message': 'Internal server error'})
+				return
+			server.active += 1
+			server.max_active = max(server.max_active, server.active)
+		time.sleep(server.upload_delay)
+
+		# The file is the part after the headers of the assetData part, up to the closing boundary
+		boundary = self.headers['Content-Type'].split('boundary=')[1].encode()
+		part = body.split(b'name="assetData"', 1)[1]
+		data = part.split(b'\r\n\r\n', 1)[1].rsplit(b'\r\n--' + boundary + b'--', 1)[0]
+		checksum = hashlib.sha1(data).hexdigest()
+		with server.lock:
+			server.active -= 1
+			if checksum in server.broken:
+				self.send_json(500, {'message': 'Internal server error'})
+				return
+			if checksum in server.assets:
+				self.send_json(200, {'id': server.assets[checksum], 'status': 'duplicate'})
+				return
+			server.assets[checksum] = f'asset-{len(server.assets) + 1}'
+			self.send_json(201, {'id': server.assets[checksum], 'status': 'created'})
+
+"""
+Tests
+"""
+
+class ImmichUploadTests(unittest.TestCase):
+
+	def setUp(self):
+		self.server = StubImmich()
+		threading.Thread(target=self.server.serve_forever, daemon=True).start()
+		self.config = {'api_key': 'test', 'base_url': self.server.base_url}
+		self.folder = tempfile.mkdtemp()
+		self.session = immich.create_session(self.config)
+
+	def tearDown(self):
+		self.session.close()
+		self.server.shutdown()
+		self.server.server_close()
+		shutil.rmtree(self.folder)
+
+	def write_file(self, name, content):
+		path = os.path.join(self.folder, name)
+		with open(path, 'wb') as f:
+			f.write(content)
+		return path
+
+	def run_upload(self, **kwargs):
+		""" Run process_path on the test folder, and return the summary counts it prints """
+		output = io.StringIO()
+		with mock.patch.object(immich, 'DEFAULT_BACKOFF', 0), contextlib.redirect_stdout(output):
+			immich.process_path(self.folder, self.config, **kwargs)
+		summary = {}
+		for line in output.getvalue().splitlines():
+			for label in ['Total files processed', 'Successful uploads', 'Skipped duplicates', 'Failed uploads']:
+				if line.startswith(f'{label}: '):
+					summary[label] = int(line.split(': ')[1])
+		return summary
+
+	def test_upload_sends_file_and_checksum(self):
+		content = os.urandom(200 * 1024)
+		path = self.write_file('IMG_0001.jpg', content)
+		response, checksum = immich.upload_file(path, self.config, self.session, backoff=0)
+		self.assertEqual(response['status'], 'created')
+		self.assertEqual(checksum, hashlib.sha1(content).hexdigest())
+		self.assertIn(checksum, self.server.assets)
+
+	def test_retry_after_server_error(self):
+		path = self.write_file('IMG_0001.jpg', b'photo')
+		self.server.fail_uploads = 2
+		response, _ = immich.upload_file(path, self.config, self.session, retries=3, backoff=0)
+		self.assertEqual(response['status'], 'created')
+		self.assertEqual(self.server.upload_attempts, 3)
+
+	def test_retry_after_dropped_connection(self):
+		path = self.write_file('IMG_0001.jpg', b'photo')
+		self.server.drop_uploads = 1
+		response, _ = immich.upload_file(path, self.config, self.session, retries=3, backoff=0)
+		self.assertEqual(response['status'], 'created')
+		self.assertEqual(self.server.upload_attempts, 2)
+
+	def test_gives_up_after_retries(self):
+		path = self.write_file('IMG_0001.jpg', b'photo')
+		self.server.fail_uploads = 10
+		with self.assertRaises(IOError):
+			immich.upload_file(path, self.config, self.session, retries=2, backoff=0)
+		self.assertEqual(self.server.upload_attempts, 3)
+
+	def test_concurrency_cap(self):
+		for index in range(8):
+			self.write_file(f'IMG_{index:04}.jpg', os.urandom(1024))
+		self.server.upload_delay = 0.2
+		summary = self.run_upload(workers=2)
+		self.assertEqual(summary['Successful uploads'], 8)
+		self.assertEqual(self.server.max_active, 2)
+
+	def test_summary_counts(self):
+		self.write_file('IMG_0001.jpg', b'first')
+		self.write_file('IMG_0002.jpg', b'second')
+		self.write_file('IMG_0003.jpg', b'first')
+		self.server.broken.add(hashlib.sha1(b'second').hexdigest())
+		summary = self.run_upload(workers=1, retries=0)
+		self.assertEqual(summary, {'Total files processed': 3, 'Successful uploads': 1, 'Skipped duplicates': 1, 'Failed uploads': 1})
+
+	def test_rerun_skips_files_on_server(self):
+		cache = os.path.join(tempfile.mkdtemp(), 'checksums.db')
+		self.addCleanup(shutil.rmtree, os.path.dirname(cache))
+		for index in range(3):
+			self.write_file(f'IMG_{index:04}.jpg', os.urandom(1024))
+		summary = self.run_upload(checksum_cache=cache)
+		self.assertEqual(summary['Successful uploads'], 3)
+
+		self.write_file('IMG_0003.jpg', os.urandom(1024))
+		attempts = self.server.upload_attempts
+		summary = self.run_upload(checksum_cache=cache)
+		self.assertEqual(summary, {'Total files processed': 4, 'Successful uploads': 1, 'Skipped duplicates': 3, 'Failed uploads': 0})
+		self.assertEqual(self.server.upload_attempts, attempts + 1)
+
+if __name__ == '__main__':
+	unittest.main()